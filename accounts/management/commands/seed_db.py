@@ -7,7 +7,6 @@ from zoneinfo import ZoneInfo
 from django.core.files import File
 from django.core.files.storage import default_storage
 from django.conf import settings
-from django.db import models
 from faker import Faker
 import random
 import os
@@ -17,7 +16,7 @@ import shutil
 # Import all models
 from accounts.models import User, StudentProfile, StaffProfile
 from student_portal.models import ServiceRequest, RequestDocument, StudentDocument, SupportTicket, TicketResponse
-from financial.models import FeeType, StudentFee, PaymentProvider, Payment, PaymentReceipt, FinancialReport
+from financial.models import FeeType, StudentFee, PaymentProvider, Payment, PaymentReceipt, DailyFinancialRollup, FinancialReport
 from notifications.models import Notification, Announcement, NotificationTemplate, NotificationPreference
 from staff_panel.models import DashboardStats, StaffActivity, WorkflowTemplate, QuickAction, SystemConfiguration
 
@@ -104,7 +103,10 @@ class Command(BaseCommand):
         for fee_data in fee_types:
             FeeType.objects.get_or_create(
                 name=fee_data['name'],
-                defaults={'description': fee_data['description']}
+                defaults={
+                    'description': fee_data['description'],
+                    'category': FeeType.classify_name(fee_data['name'])
+                }
             )
         
         self.stdout.write(f'Created {len(fee_types)} fee types')
@@ -476,6 +478,10 @@ class Command(BaseCommand):
         
         self.stdout.write(f'Created {payments_created} payments')
         
+        # Payments are created directly, so sync the stored fee balances and rollups
+        StudentFee.recompute_balances()
+        DailyFinancialRollup.rebuild()
+        
         # Create payment receipts for verified payments
         self.create_payment_receipts()
 
@@ -794,92 +800,17 @@ class Command(BaseCommand):
             else:
                 month_end_date = report_date.replace(month=report_date.month + 1, day=1) - timedelta(days=1)
             
-            # Convert to timezone-aware datetimes
-            month_start = timezone.make_aware(datetime.combine(month_start_date, datetime.min.time()))
-            month_end = timezone.make_aware(datetime.combine(month_end_date, datetime.max.time()))
-            
-            # Calculate totals for the month
-            monthly_payments = Payment.objects.filter(
-                payment_date__range=[month_start, month_end],
-                status='verified'
-            )
-            
-            total_collected = sum(payment.amount for payment in monthly_payments)
-            total_fees = StudentFee.objects.filter(
-                created_at__date__range=[month_start, month_end]
-            ).aggregate(total=models.Sum('amount'))['total'] or Decimal('0')
-            
-            outstanding_fees = StudentFee.objects.filter(
-                status__in=['pending', 'overdue', 'partial'],
-                created_at__date__lte=month_end
-            ).aggregate(total=models.Sum('amount'))['total'] or Decimal('0')
-            
             try:
-                FinancialReport.objects.create(
-                    report_type='monthly',
-                    start_date=month_start_date,
-                    end_date=month_end_date,
-                    total_fees_issued=total_fees,
-                    total_payments_received=total_collected,
-                    total_pending_verification=outstanding_fees,
-                    report_data={
-                        'summary': f'Monthly financial report for {month_start.strftime("%B %Y")}',
-                        'number_of_transactions': monthly_payments.count(),
-                        'payment_methods': {
-                            'online': random.randint(50, 80),
-                            'bank_transfer': random.randint(10, 30),
-                            'cash': random.randint(5, 15)
-                        },
-                        'fee_types': {
-                            'tuition': float(total_collected * Decimal('0.7')),
-                            'library': float(total_collected * Decimal('0.1')),
-                            'lab': float(total_collected * Decimal('0.1')),
-                            'other': float(total_collected * Decimal('0.1'))
-                        }
-                    }
-                )
+                FinancialReport.generate('monthly', month_start_date, month_end_date)
                 reports_created += 1
             except Exception as e:
-                self.stdout.write(f'Error creating financial report for {month_start}: {e}')
+                self.stdout.write(f'Error creating financial report for {month_start_date}: {e}')
         
         # Create one annual report
         try:
             year_start = timezone.now().date().replace(month=1, day=1)
             year_end = timezone.now().date().replace(month=12, day=31)
-            
-            # Convert to timezone-aware datetimes for payment filtering
-            year_start_dt = timezone.make_aware(datetime.combine(year_start, datetime.min.time()))
-            year_end_dt = timezone.make_aware(datetime.combine(year_end, datetime.max.time()))
-            
-            yearly_payments = Payment.objects.filter(
-                payment_date__range=[year_start_dt, year_end_dt],
-                status='verified'
-            )
-            
-            total_yearly_collected = sum(payment.amount for payment in yearly_payments)
-            total_yearly_fees = StudentFee.objects.filter(
-                created_at__date__range=[year_start, year_end]
-            ).aggregate(total=models.Sum('amount'))['total'] or Decimal('0')
-            
-            FinancialReport.objects.create(
-                report_type='yearly',
-                start_date=year_start,
-                end_date=year_end,
-                total_fees_issued=total_yearly_fees,
-                total_payments_received=total_yearly_collected,
-                total_pending_verification=total_yearly_fees - total_yearly_collected,
-                report_data={
-                    'summary': f'Annual financial report for {year_start.year}',
-                    'number_of_transactions': yearly_payments.count(),
-                    'quarterly_breakdown': {
-                        'Q1': float(total_yearly_collected * Decimal('0.25')),
-                        'Q2': float(total_yearly_collected * Decimal('0.30')),
-                        'Q3': float(total_yearly_collected * Decimal('0.20')),
-                        'Q4': float(total_yearly_collected * Decimal('0.25'))
-                    },
-                    'growth_rate': random.uniform(5.0, 15.0)
-                }
-            )
+            FinancialReport.generate('yearly', year_start, year_end)
             reports_created += 1
         except Exception as e:
             self.stdout.write(f'Error creating annual financial report: {e}')
@@ -95,12 +95,35 @@ class User(AbstractUser):
         verbose_name = _('مستخدم')
         verbose_name_plural = _('المستخدمون')
         ordering = ['university_id']
+        indexes = [
+            models.Index(fields=['user_type', 'date_joined', 'id'], name='user_type_joined_idx'),
+        ]
     
     def __str__(self):
         return f"{self.university_id} - {self.get_full_name()}"
     
+    # Fields copied into the search documents of a student's payments
+    PAYMENT_SEARCH_FIELDS = ('first_name', 'last_name', 'university_id')
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._payment_search_state = self._current_payment_search_state()
+    
+    def _current_payment_search_state(self):
+        # Read from __dict__ so deferred fields are not loaded
+        if self.pk is None or any(name not in self.__dict__ for name in self.PAYMENT_SEARCH_FIELDS):
+            return None
+        return tuple(self.__dict__[name] for name in self.PAYMENT_SEARCH_FIELDS)
+    
     def save(self, *args, **kwargs):
+        previous = self._payment_search_state
         super().save(*args, **kwargs)
+        current = self._current_payment_search_state()
+        if self.is_student and previous is not None and current != previous:
+            # Payment search documents carry the student's name and university ID
+            from financial.models import Payment
+            Payment.refresh_search_documents(self)
+        self._payment_search_state = current
         # Temporarily disabled QR code generation to avoid recursion error
         # self.generate_qr_code()
     
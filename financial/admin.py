@@ -2,21 +2,21 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.db.models import Sum
 from decimal import Decimal
-from .models import FeeType, StudentFee, PaymentProvider, Payment, PaymentReceipt, FinancialReport
+from .models import FeeType, StudentFee, OverdueSweep, FeeAssignment, PaymentProvider, Payment, PaymentReceipt, StudentStatement, DailyFinancialRollup, FinancialReport, IdempotencyKey, FactExportWatermark
 
 
 @admin.register(FeeType)
 class FeeTypeAdmin(admin.ModelAdmin):
     """Admin for Fee Types with university branding"""
     
-    list_display = ('name', 'get_active_badge', 'created_at')
-    list_filter = ('is_active', 'created_at')
+    list_display = ('name', 'category', 'get_active_badge', 'created_at')
+    list_filter = ('category', 'is_active', 'created_at')
     search_fields = ('name', 'description')
     ordering = ('name',)
     
     fieldsets = (
         ('معلومات نوع الرسوم', {
-            'fields': ('name', 'description', 'is_active'),
+            'fields': ('name', 'description', 'category', 'is_active'),
             'classes': ('wide',)
         }),
         ('البيانات الوصفية', {
@@ -55,7 +55,7 @@ class StudentFeeAdmin(admin.ModelAdmin):
             'classes': ('wide',)
         }),
         ('الحالة والمعالجة', {
-            'fields': ('status', 'created_by'),
+            'fields': ('status', 'amount_paid', 'remaining_balance', 'created_by'),
             'classes': ('wide',)
         }),
         ('البيانات الوصفية', {
@@ -64,7 +64,7 @@ class StudentFeeAdmin(admin.ModelAdmin):
         }),
     )
     
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'amount_paid', 'remaining_balance')
     
     def get_student_id(self, obj):
         return obj.student.university_id
@@ -104,7 +104,7 @@ class PaymentAdmin(admin.ModelAdmin):
     """Admin for Payments"""
     
     list_display = ('get_student_info', 'get_fee_info', 'get_amount', 'get_status_badge', 'payment_date')
-    list_filter = ('status', 'payment_date', 'payment_provider')
+    list_filter = ('status', 'is_possible_duplicate', 'payment_date', 'payment_provider')
     search_fields = ('student__university_id', 'student__first_name', 'student__last_name', 'transaction_reference')
     ordering = ('-payment_date',)
     date_hierarchy = 'payment_date'
@@ -163,20 +163,18 @@ class PaymentAdmin(admin.ModelAdmin):
     
     def verify_payments(self, request, queryset):
         """Bulk verify payments"""
-        updated = 0
-        for payment in queryset.filter(status='pending'):
-            payment.verify_payment(request.user)
-            updated += 1
-        self.message_user(request, f'تم التحقق من {updated} دفعة بنجاح.')
+        from staff_panel.models import StaffActivity
+        payments = Payment.bulk_verify(queryset.values_list('pk', flat=True), request.user)
+        StaffActivity.log_payment_decisions(request.user, payments, 'payment_verified')
+        self.message_user(request, f'تم التحقق من {len(payments)} دفعة بنجاح.')
     verify_payments.short_description = "التحقق من المدفوعات المحددة"
     
     def reject_payments(self, request, queryset):
         """Bulk reject payments"""
-        updated = 0
-        for payment in queryset.filter(status='pending'):
-            payment.reject_payment(request.user, "Bulk rejection")
-            updated += 1
-        self.message_user(request, f'تم رفض {updated} دفعة.')
+        from staff_panel.models import StaffActivity
+        payments = Payment.bulk_reject(queryset.values_list('pk', flat=True), request.user, "Bulk rejection")
+        StaffActivity.log_payment_decisions(request.user, payments, 'payment_rejected')
+        self.message_user(request, f'تم رفض {len(payments)} دفعة.')
     reject_payments.short_description = "رفض المدفوعات المحددة"
 
 
@@ -251,6 +249,99 @@ class PaymentReceiptAdmin(admin.ModelAdmin):
     get_payment_amount.admin_order_field = 'payment__amount'
 
 
+@admin.register(StudentStatement)
+class StudentStatementAdmin(admin.ModelAdmin):
+    """Read-only list of rendered statements of account"""
+    
+    list_display = ('student', 'statement_file', 'generated_at')
+    search_fields = ('student__university_id', 'student__first_name', 'student__last_name')
+    list_select_related = ('student',)
+    date_hierarchy = 'generated_at'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OverdueSweep)
+class OverdueSweepAdmin(admin.ModelAdmin):
+    """Read-only history of overdue sweeps"""
+    
+    list_display = ('ran_at', 'cutoff_date', 'updated_count', 'duration')
+    date_hierarchy = 'ran_at'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    """Read-only view of stored payment submission responses"""
+    
+    list_display = ('key', 'user', 'response_status', 'created_at')
+    search_fields = ('key', 'user__university_id')
+    list_select_related = ('user',)
+    date_hierarchy = 'created_at'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(FeeAssignment)
+class FeeAssignmentAdmin(admin.ModelAdmin):
+    """Admin for cohort fee assignments"""
+    
+    list_display = ('fee_type', 'amount', 'due_date', 'criteria', 'status', 'get_progress', 'created_fees', 'created_at')
+    list_filter = ('status', 'fee_type')
+    list_select_related = ('fee_type',)
+    readonly_fields = ('assignment_key', 'status', 'total_students', 'processed_students', 'created_fees',
+                       'error_message', 'created_at', 'started_at', 'completed_at')
+    actions = ['run_assignments']
+    
+    def has_add_permission(self, request):
+        # Assignments are created from the staff panel so their key is always computed
+        return False
+    
+    def get_progress(self, obj):
+        return f"{obj.progress}%"
+    get_progress.short_description = 'التقدم'
+    
+    def run_assignments(self, request, queryset):
+        """Queue the selected assignments to fill in missing fees"""
+        from .tasks import enqueue_fee_assignment
+        queued = 0
+        for assignment in queryset.exclude(status='running'):
+            enqueue_fee_assignment(assignment.pk)
+            queued += 1
+        self.message_user(request, f'تمت جدولة {queued} تخصيص للتنفيذ في الخلفية.')
+    run_assignments.short_description = "تنفيذ التخصيصات المحددة"
+
+
+@admin.register(DailyFinancialRollup)
+class DailyFinancialRollupAdmin(admin.ModelAdmin):
+    """Read-only admin for the daily financial rollups"""
+    
+    list_display = ('date', 'fee_type', 'payment_provider', 'fees_issued_amount', 'verified_count', 'verified_amount', 'rejected_count')
+    list_filter = ('fee_type', 'payment_provider')
+    date_hierarchy = 'date'
+    ordering = ('-date',)
+    list_select_related = ('fee_type', 'payment_provider')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(FinancialReport)
 class FinancialReportAdmin(admin.ModelAdmin):
     """Admin for Financial Reports"""
@@ -286,3 +377,16 @@ class FinancialReportAdmin(admin.ModelAdmin):
         return f"${obj.total_payments_received:,.2f}" if obj.total_payments_received else '-'
     get_total_amount_display.short_description = 'إجمالي المبلغ'
     get_total_amount_display.admin_order_field = 'total_payments_received'
+
+
+@admin.register(FactExportWatermark)
+class FactExportWatermarkAdmin(admin.ModelAdmin):
+    """Read-only progress of the incremental BI export"""
+    
+    list_display = ('table', 'last_updated_at', 'last_id', 'rows_exported', 'last_run_at')
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,130 @@
+"""
+Split a student's payment across their outstanding fees.
+
+Shared by the web pay-fees form and the mobile create-payment API. The
+selected fees are locked in one query. The amount is then spread over them
+in due-date order, or taken from the per-fee amounts the client chose. The
+resulting payments are inserted together in a single transaction.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Payment, StudentFee
+
+
+OUTSTANDING_STATUSES = ('pending', 'partial', 'overdue')
+
+
+class AllocationError(ValueError):
+    """A payment that cannot be allocated; details are passed back to the client"""
+
+    def __init__(self, message, **details):
+        super().__init__(message)
+        self.message = message
+        self.details = details
+
+
+def lock_outstanding_fees(student, fee_ids):
+    """Lock the student's selected outstanding fees, earliest due first"""
+    fee_ids = {int(fee_id) for fee_id in fee_ids}
+    fees = list(StudentFee.objects.select_for_update().filter(
+        pk__in=fee_ids,
+        student=student,
+        status__in=OUTSTANDING_STATUSES
+    ).select_related('fee_type').order_by('due_date', 'pk'))
+    invalid = fee_ids - {fee.pk for fee in fees}
+    if invalid:
+        raise AllocationError(
+            'Some fees are invalid, already paid, or do not belong to you',
+            invalid_fee_ids=sorted(invalid)
+        )
+    return fees
+
+
+def allocate_in_due_date_order(fees, amount):
+    """Spread amount over fees, paying off the earliest due fee first"""
+    if amount <= 0:
+        raise AllocationError('Payment amount must be greater than zero')
+    total_remaining = sum((fee.remaining_balance for fee in fees), Decimal('0.00'))
+    if amount > total_remaining:
+        raise AllocationError(
+            f'Payment amount (${amount}) cannot exceed the total of selected fees (${total_remaining}).',
+            total_remaining=str(total_remaining)
+        )
+
+    allocations = []
+    left = amount
+    for fee in fees:
+        portion = min(left, fee.remaining_balance)
+        if portion > 0:
+            allocations.append((fee, portion))
+            left -= portion
+        if left <= 0:
+            break
+    return allocations
+
+
+def allocate_fee_amounts(fees, fee_amounts):
+    """Use the amount chosen for each fee, checking it against the remaining balance"""
+    validation_errors = []
+    for fee in fees:
+        amount = fee_amounts[fee.pk]
+        if amount > fee.remaining_balance:
+            validation_errors.append({
+                'fee_id': fee.pk,
+                'fee_name': fee.fee_type.name,
+                'error': f'Payment amount {amount} exceeds remaining balance {fee.remaining_balance}'
+            })
+        elif amount <= 0:
+            validation_errors.append({
+                'fee_id': fee.pk,
+                'fee_name': fee.fee_type.name,
+                'error': 'Payment amount must be greater than zero'
+            })
+    if validation_errors:
+        raise AllocationError('Invalid payment amounts', validation_errors=validation_errors)
+    return [(fee, fee_amounts[fee.pk]) for fee in fees]
+
+
+def submit_payment(student, payment_provider, fee_ids, amount=None, fee_amounts=None,
+                   transaction_reference='', sender_name='', sender_phone='', transfer_notes='', proof=None):
+    """Create pending payments for a student's transfer and return them
+
+    Pass either ``amount``, which is allocated across the fees in due-date
+    order, or ``fee_amounts``, a mapping of fee ID to the amount for that fee.
+    ``proof`` is a ProcessedProof; its files are stored once and shared by
+    every payment the transfer is split into.
+    Raises AllocationError without writing anything if the payment does not fit.
+    """
+    with transaction.atomic():
+        fees = lock_outstanding_fees(student, fee_ids)
+        if fee_amounts is not None:
+            allocations = allocate_fee_amounts(fees, {int(fee_id): value for fee_id, value in fee_amounts.items()})
+        else:
+            allocations = allocate_in_due_date_order(fees, amount)
+
+        proof_image, proof_thumbnail = proof.save() if proof is not None else ('', '')
+        payment_date = timezone.now()
+        payments = Payment.bulk_submit([
+            Payment(
+                student=student,
+                fee=fee,
+                payment_provider=payment_provider,
+                amount=portion,
+                transaction_reference=transaction_reference,
+                payment_date=payment_date,
+                status='pending',
+                sender_name=sender_name,
+                sender_phone=sender_phone,
+                transfer_notes=transfer_notes,
+                proof_image=proof_image,
+                proof_thumbnail=proof_thumbnail
+            )
+            for fee, portion in allocations
+        ])
+
+        # Flag a bank transfer that was already submitted for staff review
+        Payment.flag_possible_duplicates(payments)
+    return payments
@@ -9,7 +9,7 @@ class FeeTypeSerializer(serializers.ModelSerializer):
     """Serializer for fee types"""
     class Meta:
         model = FeeType
-        fields = ['id', 'name', 'description', 'is_active', 'created_at']
+        fields = ['id', 'name', 'description', 'category', 'is_active', 'created_at']
         read_only_fields = ['id', 'created_at']
 
 
@@ -60,11 +60,12 @@ class PaymentSerializer(serializers.ModelSerializer):
             'id', 'student', 'student_name', 'student_id', 'fee', 'payment_provider',
             'amount', 'transaction_reference', 'payment_date', 'status', 'status_display',
             'sender_name', 'sender_phone', 'transfer_notes', 'verification_notes',
-            'verified_by', 'verified_by_name', 'verified_at', 'created_at', 'can_view_receipt'
+            'verified_by', 'verified_by_name', 'verified_at', 'created_at', 'can_view_receipt',
+            'proof_image', 'proof_thumbnail'
         ]
         read_only_fields = [
             'id', 'student', 'status', 'verification_notes', 'verified_by', 
-            'verified_at', 'created_at', 'can_view_receipt'
+            'verified_at', 'created_at', 'can_view_receipt', 'proof_image', 'proof_thumbnail'
         ]
     
     def get_can_view_receipt(self, obj):
@@ -83,6 +84,10 @@ class PaymentCreateSerializer(serializers.Serializer):
     sender_name = serializers.CharField(max_length=200, required=False, allow_blank=True)
     sender_phone = serializers.CharField(max_length=20, required=False, allow_blank=True)
     transfer_notes = serializers.CharField(required=False, allow_blank=True)
+    proof_image = serializers.FileField(
+        required=False,
+        help_text="Screenshot or photo of the transfer; send the request as multipart with fees[0].id, fees[0].amount, ..."
+    )
     
     def validate_fees(self, value):
         if not value:
@@ -24,4 +24,7 @@ urlpatterns = [
     # Receipts
     path('receipts/<int:payment_id>/view/', views.view_receipt, name='view_receipt'),
     path('receipts/<int:payment_id>/download/', views.download_receipt, name='download_receipt'),
+    
+    # Statement of account
+    path('statement/download/', views.download_statement, name='download_statement'),
 ]
\ No newline at end of file
@@ -4,20 +4,25 @@ from rest_framework import status, generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.db.models import Sum, Q, Count, F, Case, When, Value
-from django.db import transaction
+from django.db import IntegrityError, transaction
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
-from django.http import HttpResponse, Http404
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from decimal import Decimal
 from datetime import datetime, timedelta
-from ..models import FeeType, StudentFee, PaymentProvider, Payment, PaymentReceipt, FinancialReport
+from ..models import FeeType, StudentFee, PaymentProvider, Payment, PaymentReceipt, FinancialReport, IdempotencyKey
 from .serializers import (
     FeeTypeSerializer, StudentFeeSerializer, PaymentProviderSerializer,
     PaymentSerializer, PaymentCreateSerializer, PaymentReceiptSerializer,
     FinancialSummarySerializer, FinancialReportSerializer, EnhancedStudentFeeSerializer,
     MobilePaymentSerializer, PaymentStatisticsSerializer
 )
-from ..views import generate_receipt_pdf
+from ..allocation import AllocationError, submit_payment
+from ..proofs import ProofImageError, process_proof_image
+from ..receipts import get_or_render_receipt, receipt_file_response, stored_pdf_response
+from ..statements import get_current_statement
+from ..tasks import enqueue_statement
 import logging
 
 logger = logging.getLogger(__name__)
@@ -46,18 +51,16 @@ def financial_summary(request):
         # Get all fees for the student with optimized queries
         student_fees = StudentFee.objects.filter(
             student=user
-        ).select_related('fee_type').prefetch_related('payments')
+        ).select_related('fee_type')
         
         # Calculate totals with database aggregation
         fee_aggregates = student_fees.aggregate(
             total_fees=Sum('amount'),
-            total_count=Count('id')
+            total_count=Count('id'),
+            pending_payments=Sum('remaining_balance', filter=~Q(status='paid'))
         )
         total_fees = fee_aggregates['total_fees'] or Decimal('0.00')
-        
-        # Calculate pending payments more efficiently
-        pending_fees = student_fees.exclude(status='paid')
-        pending_payments = sum(fee.remaining_balance for fee in pending_fees)
+        pending_payments = fee_aggregates['pending_payments'] or Decimal('0.00')
         
         # Calculate paid amounts with better date filtering
         current_semester_start = timezone.now() - timedelta(days=180)
@@ -67,12 +70,8 @@ def financial_summary(request):
             verified_at__gte=current_semester_start
         ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
         
-        # Count overdue fees with proper status handling
-        today = timezone.now().date()
-        overdue_count = student_fees.filter(
-            due_date__lt=today,
-            status__in=['pending', 'partial', 'overdue']
-        ).count()
+        # Overdue status is maintained by the mark_overdue_fees sweeper
+        overdue_count = student_fees.filter(status='overdue').count()
         
         # Get recent transactions with better serialization
         recent_transactions = Payment.objects.filter(
@@ -129,21 +128,12 @@ class StudentFeeListView(generics.ListAPIView):
         # Base queryset with optimized relations
         queryset = StudentFee.objects.filter(
             student=user
-        ).select_related('fee_type').prefetch_related('payments')
-        
-        # Use model properties instead of annotations
-        today = timezone.now().date()
+        ).select_related('fee_type')
         
         # Filter by status
         status_filter = self.request.query_params.get('status')
         if status_filter:
-            if status_filter == 'overdue':
-                queryset = queryset.filter(
-                    due_date__lt=today,
-                    status__in=['pending', 'partial', 'overdue']
-                )
-            else:
-                queryset = queryset.filter(status=status_filter)
+            queryset = queryset.filter(status=status_filter)
         
         # Filter by fee type
         fee_type = self.request.query_params.get('fee_type')
@@ -155,6 +145,14 @@ class StudentFeeListView(generics.ListAPIView):
         if outstanding_only and outstanding_only.lower() == 'true':
             queryset = queryset.exclude(status='paid')
         
+        # Filter by minimum remaining balance
+        min_balance = self.request.query_params.get('min_balance')
+        if min_balance:
+            try:
+                queryset = queryset.filter(remaining_balance__gte=Decimal(min_balance))
+            except (ArithmeticError, ValueError):
+                pass
+        
         # Filter by semester/academic year
         semester = self.request.query_params.get('semester')
         if semester:
@@ -173,7 +171,10 @@ class StudentFeeListView(generics.ListAPIView):
         ordering = self.request.query_params.get('ordering', '-created_at')
         if ordering:
             # Validate ordering fields to prevent database errors
-            valid_fields = ['created_at', '-created_at', 'due_date', '-due_date', 'amount', '-amount', 'status', '-status']
+            valid_fields = [
+                'created_at', '-created_at', 'due_date', '-due_date', 'amount', '-amount',
+                'status', '-status', 'remaining_balance', '-remaining_balance'
+            ]
             if ordering in valid_fields:
                 queryset = queryset.order_by(ordering)
             else:
@@ -189,11 +190,7 @@ class StudentFeeListView(generics.ListAPIView):
             # Get summary statistics
             total_fees = queryset.count()
             # Calculate overdue fees using database fields
-            today = timezone.now().date()
-            overdue_fees = queryset.filter(
-                due_date__lt=today,
-                status__in=['pending', 'partial', 'overdue']
-            ).count()
+            overdue_fees = queryset.filter(status='overdue').count()
             paid_fees = queryset.filter(status='paid').count()
             pending_fees = queryset.exclude(status='paid').count()
             
@@ -309,15 +306,46 @@ class PaymentDetailView(generics.RetrieveAPIView):
         ).select_related('fee', 'payment_provider', 'verified_by')
 
 
+def replay_idempotent_response(user, idempotency_key, request_hash):
+    """Return the stored response for a retried request, or None if the key is new"""
+    record = IdempotencyKey.lookup(user, idempotency_key)
+    if record is None:
+        return None
+    if record.request_hash != request_hash:
+        return Response({
+            'error': 'Idempotency-Key has already been used with a different request'
+        }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = Response(record.response_body, status=record.response_status)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_payment(request):
     """
     Create a new payment for selected fees with enhanced validation and transaction management
+    
+    Clients may send an Idempotency-Key header; retries with the same key and
+    body get the original response back without creating more payments.
     """
     user = request.user
     logger.info(f"Payment creation request from user {user.id}: {request.data}")
     
+    idempotency_key = request.headers.get('Idempotency-Key', '').strip()
+    request_hash = None
+    if idempotency_key:
+        if len(idempotency_key) > 255:
+            return Response({
+                'error': 'Idempotency-Key must be at most 255 characters'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        request_hash = IdempotencyKey.hash_request(request.data)
+        # Answer retries before validation or taking any fee locks
+        replay = replay_idempotent_response(user, idempotency_key, request_hash)
+        if replay is not None:
+            logger.info(f"Replayed payment creation for user {user.id} with Idempotency-Key {idempotency_key}")
+            return replay
+    
     try:
         # Validate request data
         serializer = PaymentCreateSerializer(data=request.data)
@@ -331,6 +359,21 @@ def create_payment(request):
         validated_data = serializer.validated_data
         logger.info(f"Validated payment data: {validated_data}")
         
+        # Compress the proof image before taking any fee locks
+        proof = None
+        if validated_data.get('proof_image'):
+            try:
+                proof = process_proof_image(validated_data['proof_image'])
+            except ProofImageError as e:
+                logger.warning(f"Rejected proof image from user {user.id}: {str(e)}")
+                return Response({
+                    'error': str(e)
+                }, status=status.HTTP_400_BAD_REQUEST)
+            logger.info(
+                f"Proof image from user {user.id} reduced from {proof.original_size} "
+                f"to {len(proof.image_content)} bytes"
+            )
+        
         # Use database transaction for atomicity
         with transaction.atomic():
             # Get and validate payment provider
@@ -347,58 +390,16 @@ def create_payment(request):
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # Extract and validate fee data
-            fee_ids = [int(fee_data['id']) for fee_data in validated_data['fees']]
-            logger.info(f"Requested fee IDs: {fee_ids}")
-            
-            # Get student fees with proper validation
-            student_fees = StudentFee.objects.select_for_update().filter(
-                id__in=fee_ids,
-                student=user,
-                status__in=['pending', 'partial', 'overdue']
-            ).select_related('fee_type')
-            
-            # Validate all requested fees exist and belong to user
-            if len(student_fees) != len(fee_ids):
-                invalid_fees = set(fee_ids) - set(fee.id for fee in student_fees)
-                logger.error(f"Invalid fee IDs for user {user.id}: {invalid_fees}")
-                return Response({
-                    'error': 'Some fees are invalid, already paid, or do not belong to you',
-                    'invalid_fee_ids': list(invalid_fees)
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Build fee amounts mapping and validate
             fee_amounts = {}
-            calculated_total = Decimal('0.00')
-            validation_errors = []
-            
             for fee_data in validated_data['fees']:
-                fee_id = int(fee_data['id'])
-                amount = Decimal(str(fee_data['amount']))
-                fee_amounts[fee_id] = amount
-                calculated_total += amount
-                
-                # Find corresponding student fee
-                student_fee = next((f for f in student_fees if f.id == fee_id), None)
-                if student_fee:
-                    if amount > student_fee.remaining_balance:
-                        validation_errors.append({
-                            'fee_id': fee_id,
-                            'fee_name': student_fee.fee_type.name,
-                            'error': f'Payment amount {amount} exceeds remaining balance {student_fee.remaining_balance}'
-                        })
-                    elif amount <= 0:
-                        validation_errors.append({
-                            'fee_id': fee_id,
-                            'fee_name': student_fee.fee_type.name,
-                            'error': 'Payment amount must be greater than zero'
-                        })
+                fee_amounts[int(fee_data['id'])] = Decimal(str(fee_data['amount']))
+            calculated_total = sum(fee_amounts.values(), Decimal('0.00'))
+            logger.info(f"Requested fee IDs: {list(fee_amounts)}")
             
-            # Check for validation errors
-            if validation_errors:
-                logger.error(f"Fee amount validation errors for user {user.id}: {validation_errors}")
+            if len(fee_amounts) != len(validated_data['fees']):
                 return Response({
-                    'error': 'Invalid payment amounts',
-                    'validation_errors': validation_errors
+                    'error': 'Each fee can only be paid once per payment',
+                    'invalid_fee_ids': []
                 }, status=status.HTTP_400_BAD_REQUEST)
             
             # Validate total amount
@@ -410,27 +411,27 @@ def create_payment(request):
                     'provided_total': str(validated_data['total_amount'])
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # Create payments for each fee
-            created_payments = []
-            payment_date = timezone.now()
-            
-            for student_fee in student_fees:
-                payment_amount = fee_amounts[student_fee.id]
-                
-                payment = Payment.objects.create(
-                    student=user,
-                    fee=student_fee,
-                    payment_provider=payment_provider,
-                    amount=payment_amount,
+            # Lock the fees, check each amount and create the payments together
+            try:
+                created_payments = submit_payment(
+                    user,
+                    payment_provider,
+                    fee_amounts.keys(),
+                    fee_amounts=fee_amounts,
                     transaction_reference=validated_data.get('transaction_reference', ''),
-                    payment_date=payment_date,
                     sender_name=validated_data.get('sender_name', ''),
                     sender_phone=validated_data.get('sender_phone', ''),
                     transfer_notes=validated_data.get('transfer_notes', ''),
-                    status='pending'
+                    proof=proof
                 )
-                created_payments.append(payment)
-                logger.info(f"Created payment {payment.id} for fee {student_fee.id} with amount {payment_amount}")
+            except AllocationError as e:
+                logger.error(f"Payment allocation failed for user {user.id}: {e.message} {e.details}")
+                return Response({'error': e.message, **e.details}, status=status.HTTP_400_BAD_REQUEST)
+            payment_date = created_payments[0].payment_date
+            
+            duplicates = [payment.id for payment in created_payments if payment.is_possible_duplicate]
+            if duplicates:
+                logger.warning(f"Possible duplicate transfer reference from user {user.id}: payments {duplicates}")
             
             # Prepare response data
             payment_serializer = PaymentSerializer(created_payments, many=True)
@@ -446,10 +447,18 @@ def create_payment(request):
                 'created_at': payment_date.isoformat()
             }
             
+            if idempotency_key:
+                IdempotencyKey.store(user, idempotency_key, request_hash, status.HTTP_201_CREATED, response_data)
+            
             logger.info(f"Successfully created {len(created_payments)} payments for user {user.id}")
             return Response(response_data, status=status.HTTP_201_CREATED)
             
     except Exception as e:
+        if idempotency_key and isinstance(e, IntegrityError):
+            # A concurrent retry with the same key committed first; our writes were rolled back
+            replay = replay_idempotent_response(user, idempotency_key, request_hash)
+            if replay is not None:
+                return replay
         logger.error(f"Unexpected error creating payment for user {user.id}: {str(e)}")
         return Response({
             'error': 'فشل في إنشاء الدفع',
@@ -474,9 +483,14 @@ def outstanding_fees(request):
         ).select_related('fee_type').order_by('due_date', 'fee_type__name')
         
         # Calculate totals
-        total_outstanding = sum(fee.remaining_balance for fee in outstanding_fees)
-        overdue_count = sum(1 for fee in outstanding_fees if fee.due_date and fee.due_date < timezone.now().date())
-        overdue_amount = sum(fee.remaining_balance for fee in outstanding_fees if fee.due_date and fee.due_date < timezone.now().date())
+        totals = outstanding_fees.aggregate(
+            total_outstanding=Sum('remaining_balance'),
+            overdue_count=Count('id', filter=Q(status='overdue')),
+            overdue_amount=Sum('remaining_balance', filter=Q(status='overdue'))
+        )
+        total_outstanding = totals['total_outstanding'] or Decimal('0.00')
+        overdue_count = totals['overdue_count']
+        overdue_amount = totals['overdue_amount'] or Decimal('0.00')
         
         # Serialize fees
         serializer = StudentFeeSerializer(outstanding_fees, many=True)
@@ -518,92 +532,73 @@ def payment_statistics(request):
         # Get date ranges
         now = timezone.now()
         current_year = now.year
-        current_month = now.month
         twelve_months_ago = now - timedelta(days=365)
         thirty_days_ago = now - timedelta(days=30)
         
-        # Total payments made (verified only)
-        total_payments = Payment.objects.filter(
-            student=user,
-            status='verified'
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        
-        # Payments by status with amounts
-        payment_stats = Payment.objects.filter(student=user).values('status').annotate(
-            count=Count('id'),
-            total_amount=Sum('amount')
+        payments = Payment.objects.filter(student=user)
+        verified = Q(status='verified')
+        
+        # Totals, 30-day window, current year and per-status figures in one query
+        status_aggregates = {}
+        for status_value, _label in Payment.STATUS_CHOICES:
+            status_aggregates[f'{status_value}_count'] = Count('id', filter=Q(status=status_value))
+            status_aggregates[f'{status_value}_amount'] = Sum('amount', filter=Q(status=status_value))
+        totals = payments.aggregate(
+            total_payments=Sum('amount', filter=verified),
+            total_transactions=Count('id'),
+            recent_payments_count=Count('id', filter=Q(payment_date__gte=thirty_days_ago)),
+            recent_payments_amount=Sum('amount', filter=verified & Q(verified_at__gte=thirty_days_ago)),
+            current_year_total=Sum('amount', filter=verified & Q(verified_at__year=current_year)),
+            current_year_count=Count('id', filter=verified & Q(verified_at__year=current_year)),
+            **status_aggregates
         )
-        
-        # Recent payments (last 30 days)
-        recent_payments_count = Payment.objects.filter(
-            student=user,
-            payment_date__gte=thirty_days_ago
-        ).count()
-        
-        recent_payments_amount = Payment.objects.filter(
-            student=user,
-            status='verified',
-            verified_at__gte=thirty_days_ago
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        total_payments = totals['total_payments'] or Decimal('0.00')
         
         # Monthly payment summary (last 12 months)
-        monthly_payments = Payment.objects.filter(
-            student=user,
+        monthly_payments = payments.filter(
             status='verified',
             verified_at__gte=twelve_months_ago
-        ).extra({
-            'month': "strftime('%Y-%m', verified_at)"
-        }).values('month').annotate(
+        ).annotate(
+            month=TruncMonth('verified_at')
+        ).values('month').annotate(
             total=Sum('amount'),
             count=Count('id')
         ).order_by('month')
         
         # Payment provider usage
-        provider_stats = Payment.objects.filter(
-            student=user,
-            status='verified'
-        ).select_related('payment_provider').values(
+        provider_stats = payments.filter(status='verified').values(
             'payment_provider__name'
         ).annotate(
             count=Count('id'),
             total_amount=Sum('amount')
         ).order_by('-total_amount')
         
-        # Current year statistics
-        current_year_payments = Payment.objects.filter(
-            student=user,
-            status='verified',
-            verified_at__year=current_year
-        ).aggregate(
-            total=Sum('amount'),
-            count=Count('id')
-        )
-        
-        # Format response data
+        # Format response data, listing only statuses the student has used
         payment_counts = {}
         payment_amounts = {}
-        for stat in payment_stats:
-            payment_counts[stat['status']] = stat['count']
-            payment_amounts[stat['status']] = str(stat['total_amount'] or Decimal('0.00'))
+        for status_value, _label in Payment.STATUS_CHOICES:
+            if totals[f'{status_value}_count']:
+                payment_counts[status_value] = totals[f'{status_value}_count']
+                payment_amounts[status_value] = str(totals[f'{status_value}_amount'] or Decimal('0.00'))
         
         response_data = {
             'success': True,
             'summary': {
                 'total_payments': str(total_payments),
-                'total_transactions': Payment.objects.filter(student=user).count(),
-                'recent_payments_count': recent_payments_count,
-                'recent_payments_amount': str(recent_payments_amount)
+                'total_transactions': totals['total_transactions'],
+                'recent_payments_count': totals['recent_payments_count'],
+                'recent_payments_amount': str(totals['recent_payments_amount'] or Decimal('0.00'))
             },
             'payment_counts': payment_counts,
             'payment_amounts': payment_amounts,
             'current_year': {
-                'total_amount': str(current_year_payments['total'] or Decimal('0.00')),
-                'transaction_count': current_year_payments['count'] or 0,
+                'total_amount': str(totals['current_year_total'] or Decimal('0.00')),
+                'transaction_count': totals['current_year_count'],
                 'year': current_year
             },
             'monthly_summary': [
                 {
-                    'month': item['month'],
+                    'month': timezone.localtime(item['month']).strftime('%Y-%m'),
                     'total': str(item['total']),
                     'count': item['count']
                 } for item in monthly_payments
@@ -640,30 +635,20 @@ def view_receipt(request, payment_id):
     try:
         # Validate payment exists and belongs to user
         payment = get_object_or_404(
-            Payment.objects.select_related('fee__fee_type', 'payment_provider'),
+            Payment.objects.select_related('student', 'fee__fee_type', 'payment_provider'),
             id=payment_id,
             student=user,
             status='verified'
         )
         
-        logger.info(f"Generating PDF receipt for payment {payment.id}")
-        
-        # Generate PDF receipt
-        pdf_content = generate_receipt_pdf(payment)
-        
-        if not pdf_content:
-            logger.error(f"Failed to generate PDF for payment {payment.id}")
-            return Response({
-                'error': 'Receipt generation failed',
-                'detail': 'Unable to generate receipt PDF. Please try again later.'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Reuse the stored PDF unless the payment changed since it was rendered
+        receipt = get_or_render_receipt(payment, user)
         
-        response = HttpResponse(pdf_content, content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="receipt_{payment.id}.pdf"'
+        response = receipt_file_response(request, receipt, f"receipt_{payment.id}.pdf")
         response['X-Payment-ID'] = str(payment.id)
         response['X-Payment-Amount'] = str(payment.amount)
         
-        logger.info(f"Successfully generated receipt for payment {payment.id}")
+        logger.info(f"Served receipt for payment {payment.id} (status {response.status_code})")
         return response
         
     except Payment.DoesNotExist:
@@ -692,34 +677,24 @@ def download_receipt(request, payment_id):
     try:
         # Validate payment exists and belongs to user
         payment = get_object_or_404(
-            Payment.objects.select_related('fee__fee_type', 'payment_provider'),
+            Payment.objects.select_related('student', 'fee__fee_type', 'payment_provider'),
             id=payment_id,
             student=user,
             status='verified'
         )
         
-        logger.info(f"Generating PDF receipt for download - payment {payment.id}")
-        
-        # Generate PDF receipt
-        pdf_content = generate_receipt_pdf(payment)
-        
-        if not pdf_content:
-            logger.error(f"Failed to generate PDF for payment {payment.id}")
-            return Response({
-                'error': 'Receipt generation failed',
-                'detail': 'Unable to generate receipt PDF. Please try again later.'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        # Reuse the stored PDF unless the payment changed since it was rendered
+        receipt = get_or_render_receipt(payment, user)
         
         # Format filename with payment details
         filename = f"receipt_{payment.id}_{payment.payment_date.strftime('%Y%m%d')}.pdf"
         
-        response = HttpResponse(pdf_content, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response = receipt_file_response(request, receipt, filename, as_attachment=True)
         response['X-Payment-ID'] = str(payment.id)
         response['X-Payment-Amount'] = str(payment.amount)
         response['X-Payment-Date'] = payment.payment_date.isoformat()
         
-        logger.info(f"Successfully generated receipt download for payment {payment.id}")
+        logger.info(f"Served receipt download for payment {payment.id} (status {response.status_code})")
         return response
         
     except Payment.DoesNotExist:
@@ -733,4 +708,46 @@ def download_receipt(request, payment_id):
         return Response({
             'error': 'Receipt download failed',
             'detail': 'An unexpected error occurred while downloading the receipt.'
-        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def download_statement(request):
+    """
+    Download the student's statement of account as PDF
+    
+    The statement is rendered in the background. Until it is ready the
+    response is 202 with a Retry-After header; the stored PDF is then reused
+    until one of the student's fees or payments changes.
+    """
+    user = request.user
+    logger.info(f"Statement download request from user {user.id}")
+    
+    try:
+        statement = get_current_statement(user)
+        if statement is None:
+            enqueue_statement(user.pk)
+            response = Response({
+                'status': 'processing',
+                'detail': 'Your statement is being prepared. Please try again shortly.'
+            }, status=status.HTTP_202_ACCEPTED)
+            response['Retry-After'] = '5'
+            return response
+        
+        response = stored_pdf_response(
+            request,
+            statement.statement_file,
+            statement.content_hash,
+            f"statement_{user.university_id}.pdf",
+            as_attachment=True
+        )
+        logger.info(f"Served statement for user {user.id} (status {response.status_code})")
+        return response
+        
+    except Exception as e:
+        logger.error(f"Error downloading statement for user {user.id}: {str(e)}")
+        return Response({
+            'error': 'Statement download failed',
+            'detail': 'An unexpected error occurred while downloading the statement.'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
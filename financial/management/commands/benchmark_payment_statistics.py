@@ -0,0 +1,83 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+from django.db.models.functions import TruncMonth
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import User
+from financial.financial_api.views import payment_statistics
+from financial.models import Payment
+
+
+def legacy_statistics(user):
+    """The previous one-aggregate-per-metric query plan, kept for comparison"""
+    now = timezone.now()
+    payments = Payment.objects.filter(student=user)
+    verified = payments.filter(status='verified')
+    verified.aggregate(total=models.Sum('amount'))
+    list(payments.values('status').annotate(count=models.Count('id'), total_amount=models.Sum('amount')))
+    payments.filter(payment_date__gte=now - timedelta(days=30)).count()
+    verified.filter(verified_at__gte=now - timedelta(days=30)).aggregate(total=models.Sum('amount'))
+    list(verified.filter(verified_at__gte=now - timedelta(days=365)).annotate(
+        month=TruncMonth('verified_at')
+    ).values('month').annotate(total=models.Sum('amount'), count=models.Count('id')).order_by('month'))
+    list(verified.values('payment_provider__name').annotate(
+        count=models.Count('id'), total_amount=models.Sum('amount')
+    ).order_by('-total_amount'))
+    verified.filter(verified_at__year=now.year).aggregate(total=models.Sum('amount'), count=models.Count('id'))
+    payments.count()
+
+
+class Command(BaseCommand):
+    help = 'Compare query counts and timings of payment_statistics against the previous per-metric queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--students',
+            type=int,
+            default=20,
+            help='Number of students with payments to sample (default: 20)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=5,
+            help='Calls per student for each implementation (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        students = list(User.objects.filter(
+            user_type='student', payments__isnull=False
+        ).distinct()[:options['students']])
+        if not students:
+            raise CommandError('No students with payments found. Run seed_db first.')
+
+        factory = APIRequestFactory()
+
+        def call_endpoint(user):
+            request = factory.get('/api/financial/payments/statistics/')
+            force_authenticate(request, user=user)
+            response = payment_statistics(request)
+            if response.status_code != 200:
+                raise CommandError(f'payment_statistics returned {response.status_code} for user {user.pk}')
+
+        for label, run in (('legacy per-metric queries', legacy_statistics), ('payment_statistics', call_endpoint)):
+            queries = 0
+            started = time.perf_counter()
+            for user in students:
+                for _ in range(options['iterations']):
+                    with CaptureQueriesContext(connection) as captured:
+                        run(user)
+                    queries += len(captured.captured_queries)
+            elapsed = time.perf_counter() - started
+            calls = len(students) * options['iterations']
+            self.stdout.write(
+                f'{label:<28} {queries / calls:5.1f} queries/call  '
+                f'{elapsed * 1000 / calls:7.2f} ms/call  ({calls} calls)'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete.'))
@@ -0,0 +1,106 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, models, transaction
+
+from financial.models import Payment, PaymentReceipt
+from financial.receipts import attach_receipt_pdf, render_receipt_pdf, warm_receipt_renderer
+
+
+def init_worker():
+    """Prepare a render process: Django apps for unpickling, then fonts and styles once"""
+    import django
+    django.setup()
+    warm_receipt_renderer()
+
+
+def render_receipt(receipt):
+    """Render one receipt in a worker and return (receipt pk, PDF bytes, content hash)"""
+    return receipt.pk, render_receipt_pdf(receipt.payment, receipt), receipt.compute_content_hash()
+
+
+class Command(BaseCommand):
+    help = 'Pre-render PDF receipts for verified payments that have no stored receipt file'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since',
+            help='Only payments verified on or after this date (YYYY-MM-DD)',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Render processes to run (default: number of CPUs, 1 renders in-process)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Receipts rendered and saved per batch (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        payments = Payment.objects.filter(status='verified').filter(
+            models.Q(receipt__isnull=True) | models.Q(receipt__receipt_file='') | models.Q(receipt__receipt_file__isnull=True)
+        )
+        if options['since']:
+            try:
+                since = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+            payments = payments.filter(verified_at__date__gte=since)
+
+        executor = None
+        if options['workers'] > 1:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker)
+        else:
+            warm_receipt_renderer()
+
+        rendered = 0
+        started = time.perf_counter()
+        last_pk = 0
+        try:
+            while True:
+                batch = list(payments.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1]
+
+                PaymentReceipt.create_missing(Payment.objects.filter(pk__in=batch))
+                receipts = list(PaymentReceipt.objects.filter(payment_id__in=batch).select_related(
+                    'payment__student', 'payment__fee__fee_type', 'payment__payment_provider'
+                ))
+                by_pk = {receipt.pk: receipt for receipt in receipts}
+
+                if executor is not None:
+                    chunksize = max(1, len(receipts) // (options['workers'] * 4))
+                    results = executor.map(render_receipt, receipts, chunksize=chunksize)
+                else:
+                    results = map(render_receipt, receipts)
+
+                for receipt_pk, pdf_content, content_hash in results:
+                    attach_receipt_pdf(by_pk[receipt_pk], pdf_content, content_hash)
+                with transaction.atomic():
+                    PaymentReceipt.objects.bulk_update(receipts, ['receipt_file', 'content_hash'])
+
+                rendered += len(receipts)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{rendered} receipts rendered ({rendered / elapsed:.1f}/s)')
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        elapsed = time.perf_counter() - started
+        rate = rendered / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {rendered} receipts in {elapsed:.1f}s ({rate:.1f} receipts/s, {options["workers"]} workers).'
+        ))
@@ -0,0 +1,146 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from accounts.models import User
+from financial.models import FeeAssignment, StudentStatement
+from financial.receipts import warm_receipt_renderer
+from financial.statements import (
+    attach_statement_pdf, build_statement, compute_statement_hash, load_statement_rows, render_statement_pdf
+)
+
+
+def init_worker():
+    """Prepare a render process: Django apps, then fonts and styles once"""
+    import django
+    django.setup()
+    warm_receipt_renderer()
+
+
+def render_statement(task):
+    """Load and render one student's statement in a worker
+
+    Returns (student pk, PDF bytes, content hash); the bytes are None when the
+    stored statement already matches the student's fees and payments.
+    """
+    student, stored_hash = task
+    rows = load_statement_rows(student)
+    content_hash = compute_statement_hash(student, rows)
+    if content_hash == stored_hash:
+        return student.pk, None, content_hash
+    return student.pk, render_statement_pdf(student, build_statement(rows)), content_hash
+
+
+class Command(BaseCommand):
+    help = 'Render statement of account PDFs for a cohort of students, skipping statements that are still current'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--major', help='Only students in this major')
+        parser.add_argument('--enrollment-year', type=int, help='Only students enrolled in this year')
+        parser.add_argument('--academic-level', help='Only students at this academic level')
+        parser.add_argument(
+            '--student',
+            action='append',
+            dest='students',
+            help='University ID of a student to include (repeatable)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Render every statement even if the stored one is current',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Render processes to run (default: number of CPUs, 1 renders in-process)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Statements rendered and saved per batch (default: 200)',
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        students = User.objects.filter(user_type='student')
+        filters = {
+            field: options[field] for field in FeeAssignment.COHORT_FIELDS if options[field] not in (None, '')
+        }
+        if filters:
+            students = students.filter(**filters)
+        if options['students']:
+            students = students.filter(university_id__in=options['students'])
+
+        executor = None
+        if options['workers'] > 1:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker)
+        else:
+            warm_receipt_renderer()
+
+        checked = rendered = 0
+        started = time.perf_counter()
+        last_pk = 0
+        try:
+            while True:
+                batch = list(students.filter(pk__gt=last_pk).order_by('pk')[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+
+                StudentStatement.create_missing([student.pk for student in batch])
+                statements = {
+                    statement.student_id: statement
+                    for statement in StudentStatement.objects.filter(student__in=batch).select_related('student')
+                }
+                # Workers skip rendering when the rows still hash to the stored file's hash
+                tasks = [
+                    (student, None if options['force'] else self.stored_hash(statements[student.pk]))
+                    for student in batch
+                ]
+
+                if executor is not None:
+                    chunksize = max(1, len(tasks) // (options['workers'] * 4))
+                    results = executor.map(render_statement, tasks, chunksize=chunksize)
+                else:
+                    results = map(render_statement, tasks)
+
+                changed = []
+                now = timezone.now()
+                for student_pk, pdf_content, content_hash in results:
+                    if pdf_content is None:
+                        continue
+                    statement = statements[student_pk]
+                    attach_statement_pdf(statement, pdf_content, content_hash)
+                    statement.generated_at = now
+                    changed.append(statement)
+                with transaction.atomic():
+                    StudentStatement.objects.bulk_update(changed, ['statement_file', 'content_hash', 'generated_at'])
+
+                checked += len(batch)
+                rendered += len(changed)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{checked} students checked, {rendered} statements rendered ({checked / elapsed:.1f}/s)')
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} of {checked} statements in {elapsed:.1f}s ({options["workers"]} workers).'
+        ))
+
+    def stored_hash(self, statement):
+        """Hash of the stored statement, or None when it has no file to reuse"""
+        if statement.statement_file and statement.statement_file.storage.exists(statement.statement_file.name):
+            return statement.content_hash or None
+        return None
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from financial.models import OverdueSweep, StudentFee
+
+
+class Command(BaseCommand):
+    help = 'Move past-due pending/partial fees to the overdue status'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Primary key range covered by each UPDATE (default: 5000)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report how many fees are past due without updating them',
+        )
+        parser.add_argument(
+            '--schedule',
+            action='store_true',
+            help='Keep running, sweeping every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=3600,
+            help='Seconds between sweeps in --schedule mode (default: 3600)',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            from django.utils import timezone
+            count = StudentFee.objects.filter(
+                status__in=['pending', 'partial'],
+                due_date__lt=timezone.localdate()
+            ).count()
+            self.stdout.write(self.style.WARNING(f'{count} fees would be marked overdue.'))
+            return
+
+        if not options['schedule']:
+            self.sweep(options['batch_size'])
+            return
+
+        self.stdout.write(f'Sweeping overdue fees every {options["interval"]} seconds. Press Ctrl+C to stop.')
+        try:
+            while True:
+                close_old_connections()
+                self.sweep(options['batch_size'])
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped.')
+
+    def sweep(self, batch_size):
+        sweep = OverdueSweep.run(batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'[{sweep.ran_at:%Y-%m-%d %H:%M:%S}] Marked {sweep.updated_count} fees overdue in {sweep.duration}s.'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from financial.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete payment submission idempotency keys older than their replay window'
+
+    def handle(self, *args, **options):
+        deleted = IdempotencyKey.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired idempotency keys.'))
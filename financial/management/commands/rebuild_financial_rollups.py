@@ -0,0 +1,35 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from financial.models import DailyFinancialRollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyFinancialRollup table from payments and fees'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            help='Only rebuild the last N days (default: rebuild everything)',
+        )
+        parser.add_argument(
+            '--since',
+            help='Only rebuild from this date onwards (YYYY-MM-DD)',
+        )
+
+    def handle(self, *args, **options):
+        start_date = None
+        if options['since']:
+            try:
+                start_date = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since must be a date in YYYY-MM-DD format')
+        elif options['days']:
+            start_date = timezone.localdate() - timedelta(days=options['days'] - 1)
+
+        rows = DailyFinancialRollup.rebuild(start_date=start_date)
+        period = f'since {start_date}' if start_date else 'for all dates'
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} daily rollup rows {period}.'))
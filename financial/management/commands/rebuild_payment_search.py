@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from financial.models import Payment
+from financial.search import clear_payment_index, rebuild_payment_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the payment search documents and the full-text index staff search reads from'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Number of payments rewritten per batch (default: 2000)',
+        )
+        parser.add_argument(
+            '--student',
+            help='Only rebuild payments for the student with this university ID',
+        )
+
+    def handle(self, *args, **options):
+        payments = Payment.objects.order_by('pk')
+        with transaction.atomic():
+            if options['student']:
+                payments = payments.filter(student__university_id=options['student'])
+            else:
+                # A full rebuild also drops index rows left behind by deleted payments
+                clear_payment_index()
+            processed = rebuild_payment_index(payments, batch_size=options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(f'Reindexed {processed} payments.'))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from financial.models import StudentFee
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored amount_paid/remaining_balance columns and status on StudentFee from verified payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of fees checked per UPDATE batch (default: 5000)',
+        )
+        parser.add_argument(
+            '--student',
+            help='Only recompute fees for the student with this university ID',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report how many fees have drifted without updating them',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fees = StudentFee.objects.all()
+        if options['student']:
+            fees = fees.filter(student__university_id=options['student'])
+
+        bounds = fees.aggregate(low=models.Min('pk'), high=models.Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write('No fees to recompute.')
+            return
+
+        drifted = 0
+        start = bounds['low']
+        while start <= bounds['high']:
+            batch = fees.filter(pk__gte=start, pk__lt=start + batch_size)
+            if options['dry_run']:
+                drifted += StudentFee.drifted_balances(batch).count()
+            else:
+                with transaction.atomic():
+                    drifted += StudentFee.recompute_balances(batch)
+            start += batch_size
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'{drifted} fees have drifted balances.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Recomputed balances for {drifted} drifted fees.'))
@@ -0,0 +1,116 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import User
+from financial.models import Payment, PaymentProvider
+from financial.reconciliation import (
+    DEFAULT_WINDOW_DAYS, StatementError, read_statement, reconcile_statement, write_report
+)
+
+
+# Payments verified per bulk_verify call
+VERIFY_BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = 'Match a provider statement export (CSV, JSON or JSON lines) against pending payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('statement', help='Path to the statement export')
+        parser.add_argument(
+            '--provider',
+            required=True,
+            help='Payment provider ID or name the statement belongs to',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'json', 'jsonl'],
+            help='Statement format (default: taken from the file extension)',
+        )
+        parser.add_argument(
+            '--window-days',
+            type=int,
+            default=DEFAULT_WINDOW_DAYS,
+            help=f'Days a statement date may differ from the payment date (default: {DEFAULT_WINDOW_DAYS})',
+        )
+        parser.add_argument(
+            '--output',
+            help='Write a CSV report of every outcome to this path ("-" for stdout)',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Verify exactly matched payments',
+        )
+        parser.add_argument(
+            '--staff',
+            help='Username of the staff member recorded as verifier (required with --verify)',
+        )
+
+    def handle(self, *args, **options):
+        provider = self.get_provider(options['provider'])
+        staff = None
+        if options['verify']:
+            if not options['staff']:
+                raise CommandError('--verify requires --staff')
+            try:
+                staff = User.objects.get(username=options['staff'], user_type__in=['staff', 'admin'])
+            except User.DoesNotExist:
+                raise CommandError(f'No staff user named {options["staff"]}')
+
+        statement_format = options['format'] or os.path.splitext(options['statement'])[1].lstrip('.').lower()
+        if statement_format == 'ndjson':
+            statement_format = 'jsonl'
+        if statement_format not in ('csv', 'json', 'jsonl'):
+            raise CommandError('Cannot tell the statement format from its extension, pass --format')
+
+        started = time.perf_counter()
+        try:
+            with open(options['statement'], newline='', encoding='utf-8-sig') as statement:
+                result = reconcile_statement(
+                    read_statement(statement, statement_format), provider, window_days=options['window_days']
+                )
+        except OSError as e:
+            raise CommandError(f'Cannot read statement: {e}')
+        except StatementError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{result.lines_read} statement lines matched in {elapsed:.2f}s: '
+            f'{len(result.exact)} exact, {len(result.candidates)} candidates, {len(result.orphans)} orphans; '
+            f'{len(result.unmatched_payment_ids)} pending payments had no statement line.'
+        )
+
+        if options['output']:
+            if options['output'] == '-':
+                write_report(result, self.stdout)
+            else:
+                with open(options['output'], 'w', newline='', encoding='utf-8') as report:
+                    write_report(result, report)
+                self.stdout.write(f'Report written to {options["output"]}.')
+
+        if staff is not None:
+            from staff_panel.models import StaffActivity
+
+            notes = f'Reconciled against statement {os.path.basename(options["statement"])}'
+            payment_ids = result.exact_payment_ids
+            verified = 0
+            for start in range(0, len(payment_ids), VERIFY_BATCH_SIZE):
+                payments = Payment.bulk_verify(payment_ids[start:start + VERIFY_BATCH_SIZE], staff, notes)
+                StaffActivity.log_payment_decisions(staff, payments, 'payment_verified')
+                verified += len(payments)
+            self.stdout.write(self.style.SUCCESS(f'Verified {verified} exactly matched payments.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Reconciliation complete.'))
+
+    def get_provider(self, value):
+        providers = PaymentProvider.objects.all()
+        try:
+            if value.isdigit():
+                return providers.get(pk=int(value))
+            return providers.get(name=value)
+        except PaymentProvider.DoesNotExist:
+            raise CommandError(f'Unknown payment provider: {value}')
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from financial.models import FeeAssignment
+
+
+class Command(BaseCommand):
+    help = 'Create the fees for pending (or selected) cohort fee assignments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--assignment',
+            type=int,
+            action='append',
+            help='Run this assignment ID (can be repeated); re-running only fills in missing fees',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Also run assignments whose last run failed',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Take over assignments left in the running state by a dead worker',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of fees inserted per bulk_create batch (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        if options['assignment']:
+            assignments = FeeAssignment.objects.filter(pk__in=options['assignment'])
+            missing = set(options['assignment']) - set(assignments.values_list('pk', flat=True))
+            if missing:
+                raise CommandError(f'Unknown assignment IDs: {sorted(missing)}')
+        else:
+            statuses = ['pending', 'failed'] if options['retry_failed'] else ['pending']
+            assignments = FeeAssignment.objects.filter(status__in=statuses)
+
+        for assignment in assignments.select_related('fee_type').order_by('created_at'):
+            self.stdout.write(f'Running assignment #{assignment.pk}: {assignment.fee_type.name} {assignment.criteria}')
+            if not assignment.run(batch_size=options['batch_size'], force=options['force']):
+                self.stdout.write(self.style.WARNING(f'  Assignment #{assignment.pk} is already running, skipped.'))
+                continue
+            self.stdout.write(self.style.SUCCESS(
+                f'  Processed {assignment.processed_students} students '
+                f'({assignment.created_fees} fees created by this assignment in total).'
+            ))
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-16 22:32
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_balances(apps, schema_editor):
+    StudentFee = apps.get_model('financial', 'StudentFee')
+    Payment = apps.get_model('financial', 'Payment')
+    verified_total = Coalesce(
+        models.Subquery(
+            Payment.objects.filter(
+                fee=models.OuterRef('pk'),
+                status='verified'
+            ).order_by().values('fee').annotate(
+                total=models.Sum('amount')
+            ).values('total')[:1],
+            output_field=models.DecimalField(max_digits=10, decimal_places=2)
+        ),
+        Decimal('0.00'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2)
+    )
+    StudentFee.objects.update(
+        amount_paid=verified_total,
+        remaining_balance=models.F('amount') - verified_total
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financial', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentfee',
+            name='amount_paid',
+            field=models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, help_text='إجمالي المدفوعات المتحقق منها لهذه الرسوم', max_digits=10, verbose_name='المبلغ المدفوع'),
+        ),
+        migrations.AddField(
+            model_name='studentfee',
+            name='remaining_balance',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=Decimal('0.00'), editable=False, help_text='المبلغ المتبقي للدفع', max_digits=10, verbose_name='الرصيد المتبقي'),
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
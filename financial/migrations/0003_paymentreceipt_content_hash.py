@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-16 22:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financial', '0002_studentfee_balance_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymentreceipt',
+            name='content_hash',
+            field=models.CharField(blank=True, help_text='Hash of the payment fields rendered into receipt_file', max_length=64),
+        ),
+    ]
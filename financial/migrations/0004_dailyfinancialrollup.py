@@ -0,0 +1,82 @@
+# Generated by Django 5.2.4 on 2026-10-16 22:37
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_rollups(apps, schema_editor):
+    DailyFinancialRollup = apps.get_model('financial', 'DailyFinancialRollup')
+    Payment = apps.get_model('financial', 'Payment')
+    StudentFee = apps.get_model('financial', 'StudentFee')
+    verified = models.Q(status='verified')
+    rejected = models.Q(status='rejected')
+    rows = [
+        DailyFinancialRollup(
+            date=row['day'],
+            fee_type_id=row['fee__fee_type'],
+            payment_provider_id=row['payment_provider'],
+            verified_count=row['verified_count'],
+            verified_amount=row['verified_amount'] or Decimal('0.00'),
+            rejected_count=row['rejected_count'],
+            rejected_amount=row['rejected_amount'] or Decimal('0.00'),
+        )
+        for row in Payment.objects.filter(
+            status__in=['verified', 'rejected'], verified_at__isnull=False
+        ).annotate(day=TruncDate('verified_at')).values(
+            'day', 'fee__fee_type', 'payment_provider'
+        ).annotate(
+            verified_count=models.Count('pk', filter=verified),
+            verified_amount=models.Sum('amount', filter=verified),
+            rejected_count=models.Count('pk', filter=rejected),
+            rejected_amount=models.Sum('amount', filter=rejected),
+        ).order_by()
+    ]
+    rows += [
+        DailyFinancialRollup(
+            date=row['day'],
+            fee_type_id=row['fee_type'],
+            fees_issued_count=row['fees_issued_count'],
+            fees_issued_amount=row['fees_issued_amount'],
+        )
+        for row in StudentFee.objects.annotate(day=TruncDate('created_at')).values(
+            'day', 'fee_type'
+        ).annotate(
+            fees_issued_count=models.Count('pk'),
+            fees_issued_amount=models.Sum('amount'),
+        ).order_by()
+    ]
+    DailyFinancialRollup.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financial', '0003_paymentreceipt_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyFinancialRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(help_text='اليوم الذي يغطيه الملخص', verbose_name='التاريخ')),
+                ('fees_issued_count', models.PositiveIntegerField(default=0, verbose_name='عدد الرسوم المصدرة')),
+                ('fees_issued_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='مبلغ الرسوم المصدرة')),
+                ('verified_count', models.PositiveIntegerField(default=0, verbose_name='عدد المدفوعات المتحقق منها')),
+                ('verified_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='مبلغ المدفوعات المتحقق منها')),
+                ('rejected_count', models.PositiveIntegerField(default=0, verbose_name='عدد المدفوعات المرفوضة')),
+                ('rejected_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=15, verbose_name='مبلغ المدفوعات المرفوضة')),
+                ('fee_type', models.ForeignKey(help_text='نوع الرسوم المجمعة', on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='financial.feetype', verbose_name='نوع الرسوم')),
+                ('payment_provider', models.ForeignKey(blank=True, help_text='مقدم خدمة الدفع، فارغ لصفوف إصدار الرسوم', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='financial.paymentprovider', verbose_name='مقدم خدمة الدفع')),
+            ],
+            options={
+                'verbose_name': 'ملخص مالي يومي',
+                'verbose_name_plural': 'الملخصات المالية اليومية',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('payment_provider__isnull', False)), fields=('date', 'fee_type', 'payment_provider'), name='unique_rollup_per_provider'), models.UniqueConstraint(condition=models.Q(('payment_provider__isnull', True)), fields=('date', 'fee_type'), name='unique_rollup_fees_issued')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-16 22:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financial', '0004_dailyfinancialrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeAssignment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, help_text='مبلغ الرسوم لكل طالب', max_digits=10, verbose_name='المبلغ')),
+                ('due_date', models.DateField(help_text='تاريخ استحقاق الرسوم', verbose_name='تاريخ الاستحقاق')),
+                ('description', models.TextField(blank=True, help_text='وصف الرسوم', verbose_name='الوصف')),
+                ('criteria', models.JSONField(blank=True, default=dict, help_text='التخصص وسنة التسجيل والمستوى الأكاديمي أو قائمة معرفات الطلاب', verbose_name='معايير الاستهداف')),
+                ('assignment_key', models.CharField(editable=False, help_text='بصمة نوع الرسوم والمبلغ والتاريخ والمعايير', max_length=64, unique=True, verbose_name='مفتاح التخصيص')),
+                ('status', models.CharField(choices=[('pending', 'في الانتظار'), ('running', 'قيد التنفيذ'), ('completed', 'مكتمل'), ('failed', 'فشل')], default='pending', max_length=10, verbose_name='الحالة')),
+                ('total_students', models.PositiveIntegerField(default=0, help_text='عدد الطلاب الذين تنقصهم الرسوم عند بدء التنفيذ', verbose_name='عدد الطلاب المستهدفين')),
+                ('processed_students', models.PositiveIntegerField(default=0, verbose_name='عدد الطلاب المعالجين')),
+                ('created_fees', models.PositiveIntegerField(default=0, verbose_name='عدد الرسوم المنشأة')),
+                ('error_message', models.TextField(blank=True, verbose_name='رسالة الخطأ')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='تاريخ بدء التنفيذ')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='تاريخ انتهاء التنفيذ')),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fee_assignments', to=settings.AUTH_USER_MODEL, verbose_name='أنشأ بواسطة')),
+                ('fee_type', models.ForeignKey(help_text='نوع الرسوم المخصصة', on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='financial.feetype', verbose_name='نوع الرسوم')),
+            ],
+            options={
+                'verbose_name': 'تخصيص رسوم جماعي',
+                'verbose_name_plural': 'تخصيصات الرسوم الجماعية',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='studentfee',
+            name='assignment',
+            field=models.ForeignKey(blank=True, help_text='عملية التخصيص الجماعي التي أنشأت هذه الرسوم', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fees', to='financial.feeassignment', verbose_name='التخصيص الجماعي'),
+        ),
+        migrations.AddConstraint(
+            model_name='studentfee',
+            constraint=models.UniqueConstraint(condition=models.Q(('assignment__isnull', False)), fields=('assignment', 'student'), name='unique_fee_per_assignment_student'),
+        ),
+    ]
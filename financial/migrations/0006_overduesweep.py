@@ -0,0 +1,34 @@
+# Generated by Django 5.2.4 on 2026-10-16 22:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financial', '0005_feeassignment'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueSweep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ran_at', models.DateTimeField(auto_now_add=True, verbose_name='وقت التشغيل')),
+                ('cutoff_date', models.DateField(help_text='الرسوم المستحقة قبل هذا التاريخ تعتبر متأخرة', verbose_name='تاريخ القطع')),
+                ('updated_count', models.PositiveIntegerField(default=0, verbose_name='عدد الرسوم المحدثة')),
+                ('duration', models.FloatField(default=0, verbose_name='المدة (ثانية)')),
+            ],
+            options={
+                'verbose_name': 'تحديث الرسوم المتأخرة',
+                'verbose_name_plural': 'عمليات تحديث الرسوم المتأخرة',
+                'ordering': ['-ran_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='studentfee',
+            index=models.Index(fields=['status', 'due_date'], name='studentfee_status_due_idx'),
+        ),
+    ]
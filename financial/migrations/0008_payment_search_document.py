@@ -0,0 +1,84 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:05
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+FTS_TABLE = 'financial_payment_fts'
+TRGM_INDEX = 'payment_search_document_trgm_idx'
+
+
+def build_document(payment):
+    student = payment.student
+    text = unicodedata.normalize('NFKD', ' '.join([
+        student.first_name,
+        student.last_name,
+        student.university_id or '',
+        payment.sender_name or '',
+        payment.sender_phone or '',
+        payment.transaction_reference or '',
+    ]).casefold())
+    text = ''.join(char for char in text if unicodedata.category(char) != 'Mn')
+    return ' '.join(text.replace('\u0640', '').split())
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"search_document, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {TRGM_INDEX} ON financial_payment '
+            f'USING gin (search_document gin_trgm_ops)'
+        )
+
+    Payment = apps.get_model('financial', 'Payment')
+    batch = []
+    for payment in Payment.objects.select_related('student').order_by('pk').iterator(chunk_size=2000):
+        payment.search_document = build_document(payment)
+        batch.append(payment)
+        if len(batch) >= 2000:
+            Payment.objects.bulk_update(batch, ['search_document'])
+            batch = []
+    if batch:
+        Payment.objects.bulk_update(batch, ['search_document'])
+
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE}(rowid, search_document) '
+            f'SELECT id, search_document FROM financial_payment'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TRGM_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financial', '0007_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='transaction_reference',
+            field=models.CharField(db_index=True, max_length=200),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
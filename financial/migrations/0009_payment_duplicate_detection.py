@@ -0,0 +1,62 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:20
+
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def normalize_reference(value):
+    chars = []
+    for char in value or '':
+        if char.isdigit():
+            chars.append(str(unicodedata.digit(char, char)))
+        elif char.isalnum():
+            chars.append(char.upper())
+    return ''.join(chars)
+
+
+def backfill_duplicates(apps, schema_editor):
+    Payment = apps.get_model('financial', 'Payment')
+    batch = []
+    for payment in Payment.objects.only('pk', 'transaction_reference').order_by('pk').iterator(chunk_size=2000):
+        payment.normalized_reference = normalize_reference(payment.transaction_reference)
+        batch.append(payment)
+        if len(batch) >= 2000:
+            Payment.objects.bulk_update(batch, ['normalized_reference'])
+            batch = []
+    if batch:
+        Payment.objects.bulk_update(batch, ['normalized_reference'])
+
+    candidates = Payment.objects.filter(status__in=['pending', 'verified']).exclude(normalized_reference='')
+    for group in candidates.values(
+        'normalized_reference', 'payment_provider', 'amount'
+    ).annotate(count=models.Count('pk')).filter(count__gt=1).order_by():
+        del group['count']
+        candidates.filter(**group).update(is_possible_duplicate=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financial', '0008_payment_search_document'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='is_possible_duplicate',
+            field=models.BooleanField(default=False, help_text='Reference, amount and provider match another pending or verified payment'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='normalized_reference',
+            field=models.CharField(blank=True, default='', editable=False, max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['normalized_reference', 'payment_provider', 'amount'], name='payment_duplicate_idx'),
+        ),
+        migrations.RunPython(backfill_duplicates, migrations.RunPython.noop),
+    ]
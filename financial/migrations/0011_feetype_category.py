@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:55
+
+from django.db import migrations, models
+
+
+CATEGORY_KEYWORDS = (
+    ('tuition', ('tuition', 'رسوم دراسية', 'دراسي')),
+    ('library', ('library', 'مكتب')),
+    ('lab', ('lab', 'مختبر', 'معمل')),
+    ('sports', ('sport', 'رياض')),
+)
+
+
+def classify_fee_types(apps, schema_editor):
+    FeeType = apps.get_model('financial', 'FeeType')
+    for fee_type in FeeType.objects.all():
+        name = fee_type.name.casefold()
+        for category, keywords in CATEGORY_KEYWORDS:
+            if any(keyword in name for keyword in keywords):
+                fee_type.category = category
+                fee_type.save(update_fields=['category'])
+                break
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financial', '0010_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feetype',
+            name='category',
+            field=models.CharField(choices=[('tuition', 'رسوم دراسية'), ('library', 'مكتبة'), ('lab', 'مختبر'), ('sports', 'رياضة'), ('other', 'أخرى')], db_index=True, default='other', help_text='فئة الرسوم المستخدمة في التقارير والتصفية', max_length=20, verbose_name='الفئة'),
+        ),
+        migrations.RunPython(classify_fee_types, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.4 on 2026-10-16 22:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financial', '0011_feetype_category'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentStatement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('statement_file', models.FileField(blank=True, null=True, upload_to='statements/', verbose_name='ملف الكشف')),
+                ('content_hash', models.CharField(blank=True, help_text='بصمة الرسوم والمدفوعات الواردة في الملف', max_length=64, verbose_name='بصمة المحتوى')),
+                ('generated_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ الإنشاء')),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statement', to=settings.AUTH_USER_MODEL, verbose_name='الطالب')),
+            ],
+            options={
+                'verbose_name': 'كشف حساب',
+                'verbose_name_plural': 'كشوف الحسابات',
+            },
+        ),
+    ]
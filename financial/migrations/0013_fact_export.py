@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-16 22:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financial', '0012_studentstatement'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FactExportWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table', models.CharField(max_length=50, unique=True, verbose_name='الجدول')),
+                ('last_updated_at', models.DateTimeField(blank=True, help_text='قيمة updated_at لآخر صف تم تصديره', null=True, verbose_name='آخر تاريخ تحديث مصدر')),
+                ('last_id', models.BigIntegerField(default=0, help_text='معرف آخر صف تم تصديره بنفس تاريخ التحديث', verbose_name='آخر معرف مصدر')),
+                ('rows_exported', models.PositiveIntegerField(default=0, verbose_name='عدد الصفوف في آخر تشغيل')),
+                ('last_run_at', models.DateTimeField(blank=True, null=True, verbose_name='تاريخ آخر تشغيل')),
+            ],
+            options={
+                'verbose_name': 'علامة التصدير',
+                'verbose_name_plural': 'علامات التصدير',
+            },
+        ),
+        migrations.AddField(
+            model_name='feetype',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, help_text='آخر تعديل، يستخدم في التصدير التزايدي', verbose_name='تاريخ التحديث'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Last change, used by the incremental fact export'),
+        ),
+        migrations.AddField(
+            model_name='studentfee',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='آخر تعديل، يستخدم في التصدير التزايدي', verbose_name='تاريخ التحديث'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['updated_at', 'id'], name='payment_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentfee',
+            index=models.Index(fields=['updated_at', 'id'], name='studentfee_updated_idx'),
+        ),
+    ]
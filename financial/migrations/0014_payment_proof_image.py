@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('financial', '0013_fact_export'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='proof_image',
+            field=models.ImageField(blank=True, help_text='Transfer screenshot or photo, downscaled and stripped of metadata', upload_to='payment_proofs/'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='proof_thumbnail',
+            field=models.ImageField(blank=True, help_text='Small copy of the proof for the verification list', upload_to='payment_proofs/thumbnails/'),
+        ),
+    ]
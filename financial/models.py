@@ -1,4 +1,15 @@
-from django.db import models
+import hashlib
+import json
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Coalesce, TruncDate
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.conf import settings
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -7,6 +18,23 @@ from decimal import Decimal
 
 class FeeType(models.Model):
     """أنواع مختلفة من الرسوم التي يمكن فرضها"""
+    
+    CATEGORY_CHOICES = (
+        ('tuition', _('رسوم دراسية')),
+        ('library', _('مكتبة')),
+        ('lab', _('مختبر')),
+        ('sports', _('رياضة')),
+        ('other', _('أخرى')),
+    )
+    
+    # Name fragments used to pick a category for new fee types, checked in order
+    CATEGORY_KEYWORDS = (
+        ('tuition', ('tuition', 'رسوم دراسية', 'دراسي')),
+        ('library', ('library', 'مكتب')),
+        ('lab', ('lab', 'مختبر', 'معمل')),
+        ('sports', ('sport', 'رياض')),
+    )
+    
     name = models.CharField(
         max_length=100, 
         unique=True,
@@ -18,6 +46,14 @@ class FeeType(models.Model):
         verbose_name=_('الوصف'),
         help_text=_('وصف نوع الرسوم')
     )
+    category = models.CharField(
+        max_length=20,
+        choices=CATEGORY_CHOICES,
+        default='other',
+        db_index=True,
+        verbose_name=_('الفئة'),
+        help_text=_('فئة الرسوم المستخدمة في التقارير والتصفية')
+    )
     is_active = models.BooleanField(
         default=True,
         verbose_name=_('نشط'),
@@ -28,6 +64,12 @@ class FeeType(models.Model):
         verbose_name=_('تاريخ الإنشاء'),
         help_text=_('تاريخ ووقت إنشاء نوع الرسوم')
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        db_index=True,
+        verbose_name=_('تاريخ التحديث'),
+        help_text=_('آخر تعديل، يستخدم في التصدير التزايدي')
+    )
     
     class Meta:
         verbose_name = _('نوع الرسوم')
@@ -36,6 +78,15 @@ class FeeType(models.Model):
     
     def __str__(self):
         return self.name
+    
+    @classmethod
+    def classify_name(cls, name):
+        """تحديد فئة الرسوم من اسمها"""
+        name = (name or '').casefold()
+        for category, keywords in cls.CATEGORY_KEYWORDS:
+            if any(keyword in name for keyword in keywords):
+                return category
+        return 'other'
 
 
 class StudentFee(models.Model):
@@ -68,6 +119,23 @@ class StudentFee(models.Model):
         verbose_name=_('المبلغ'),
         help_text=_('مبلغ الرسوم')
     )
+    amount_paid = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        verbose_name=_('المبلغ المدفوع'),
+        help_text=_('إجمالي المدفوعات المتحقق منها لهذه الرسوم')
+    )
+    remaining_balance = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        editable=False,
+        db_index=True,
+        verbose_name=_('الرصيد المتبقي'),
+        help_text=_('المبلغ المتبقي للدفع')
+    )
     due_date = models.DateField(
         verbose_name=_('تاريخ الاستحقاق'),
         help_text=_('تاريخ استحقاق الدفع')
@@ -89,6 +157,11 @@ class StudentFee(models.Model):
         verbose_name=_('تاريخ الإنشاء'),
         help_text=_('تاريخ ووقت إنشاء الرسوم')
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('تاريخ التحديث'),
+        help_text=_('آخر تعديل، يستخدم في التصدير التزايدي')
+    )
     created_by = models.ForeignKey(
         settings.AUTH_USER_MODEL, 
         on_delete=models.SET_NULL, 
@@ -97,41 +170,181 @@ class StudentFee(models.Model):
         verbose_name=_('أنشأ بواسطة'),
         help_text=_('الموظف الذي أنشأ الرسوم')
     )
+    assignment = models.ForeignKey(
+        'FeeAssignment',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='fees',
+        verbose_name=_('التخصيص الجماعي'),
+        help_text=_('عملية التخصيص الجماعي التي أنشأت هذه الرسوم')
+    )
     
     class Meta:
         ordering = ['-created_at']
         verbose_name = _('رسوم الطالب')
         verbose_name_plural = _('رسوم الطلاب')
+        indexes = [
+            models.Index(fields=['status', 'due_date'], name='studentfee_status_due_idx'),
+            models.Index(fields=['due_date', 'id'], name='studentfee_keyset_idx'),
+            models.Index(fields=['updated_at', 'id'], name='studentfee_updated_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['assignment', 'student'],
+                condition=models.Q(assignment__isnull=False),
+                name='unique_fee_per_assignment_student'
+            ),
+        ]
     
     def __str__(self):
         return f"{self.student.university_id} - {self.fee_type.name} - ${self.amount}"
     
-    @property
-    def amount_paid(self):
-        """حساب إجمالي المبلغ المدفوع لهذه الرسوم"""
-        return self.payments.filter(status='verified').aggregate(
-            total=models.Sum('amount')
-        )['total'] or Decimal('0.00')
+    # Fields that decide which daily rollup row a fee counts toward, and by how much
+    ROLLUP_FIELDS = ('created_at', 'fee_type_id', 'amount')
     
-    @property
-    def remaining_balance(self):
-        """حساب الرصيد المتبقي"""
-        return self.amount - self.amount_paid
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._rollup_state = self._current_rollup_state()
+    
+    def _current_rollup_state(self):
+        # Read from __dict__ so deferred fields are not loaded
+        if self.pk is None or any(name not in self.__dict__ for name in self.ROLLUP_FIELDS):
+            return None
+        return tuple(self.__dict__[name] for name in self.ROLLUP_FIELDS)
+    
+    def save(self, *args, **kwargs):
+        is_new = self._state.adding
+        previous = self._rollup_state
+        self.remaining_balance = self.amount - self.amount_paid
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'amount', 'amount_paid'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'remaining_balance'}
+        super().save(*args, **kwargs)
+        current = self._current_rollup_state()
+        if is_new:
+            DailyFinancialRollup.record_fees([self])
+        elif previous is not None and current != previous:
+            # Amount or fee type edits move the issued totals, and a new type takes its payments along
+            DailyFinancialRollup.record_change(
+                DailyFinancialRollup.fee_contribution(*previous),
+                DailyFinancialRollup.fee_contribution(*current)
+            )
+            if current[1] != previous[1]:
+                DailyFinancialRollup.move_fee_payments(self.pk, previous[1], current[1])
+        self._rollup_state = current
+    
+    @classmethod
+    def verified_total_subquery(cls):
+        """استعلام فرعي يحسب مجموع المدفوعات المتحقق منها لكل رسوم"""
+        return Coalesce(
+            models.Subquery(
+                Payment.objects.filter(
+                    fee=models.OuterRef('pk'),
+                    status='verified'
+                ).order_by().values('fee').annotate(
+                    total=models.Sum('amount')
+                ).values('total')[:1],
+                output_field=models.DecimalField(max_digits=10, decimal_places=2)
+            ),
+            Decimal('0.00'),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2)
+        )
+    
+    @classmethod
+    def status_case(cls, paid, today=None):
+        """تعبير الحالة المتوقعة للرسوم بناءً على المبلغ المدفوع؛ الرسوم الملغاة تبقى ملغاة"""
+        today = today or timezone.localdate()
+        return models.Case(
+            models.When(status='cancelled', then=models.Value('cancelled')),
+            models.When(GreaterThanOrEqual(paid, models.F('amount')), then=models.Value('paid')),
+            models.When(due_date__lt=today, then=models.Value('overdue')),
+            models.When(GreaterThan(paid, Decimal('0.00')), then=models.Value('partial')),
+            default=models.Value('pending'),
+            output_field=models.CharField(max_length=15)
+        )
+    
+    @classmethod
+    def drifted_balances(cls, queryset=None):
+        """الرسوم التي لا يطابق رصيدها أو حالتها المخزنة مجموع المدفوعات المتحقق منها"""
+        queryset = cls.objects.all() if queryset is None else queryset
+        return queryset.annotate(
+            verified_total=cls.verified_total_subquery()
+        ).annotate(
+            expected_status=cls.status_case(models.F('verified_total'))
+        ).exclude(
+            amount_paid=models.F('verified_total'),
+            remaining_balance=models.F('amount') - models.F('verified_total'),
+            status=models.F('expected_status')
+        )
+    
+    @classmethod
+    def recompute_balances(cls, queryset=None):
+        """إعادة حساب أعمدة الرصيد والحالة لمجموعة من الرسوم
+        
+        Returns the number of fees whose stored balance or status had drifted.
+        """
+        drifted_ids = list(cls.drifted_balances(queryset).values_list('pk', flat=True))
+        if drifted_ids:
+            cls.update_statuses(drifted_ids)
+        return len(drifted_ids)
+    
+    @classmethod
+    def update_statuses(cls, fee_ids):
+        """النسخة الجماعية من update_status: تحديث الأرصدة ثم الحالات لمجموعة رسوم
+        
+        Runs two UPDATE statements regardless of how many fees are affected.
+        """
+        queryset = cls.objects.filter(pk__in=list(fee_ids))
+        verified_total = cls.verified_total_subquery()
+        queryset.update(
+            amount_paid=verified_total,
+            remaining_balance=models.F('amount') - verified_total
+        )
+        return queryset.update(
+            status=cls.status_case(models.F('amount_paid')),
+            updated_at=timezone.now()
+        )
+    
+    @classmethod
+    def mark_overdue(cls, batch_size=5000, today=None):
+        """نقل الرسوم المستحقة غير المدفوعة إلى حالة متأخر على دفعات
+        
+        Each batch is a single UPDATE over a primary key range. Returns the
+        number of fees whose status changed.
+        """
+        today = today or timezone.localdate()
+        past_due = cls.objects.filter(status__in=['pending', 'partial'], due_date__lt=today)
+        bounds = past_due.aggregate(low=models.Min('pk'), high=models.Max('pk'))
+        if bounds['low'] is None:
+            return 0
+        
+        updated = 0
+        start = bounds['low']
+        while start <= bounds['high']:
+            updated += past_due.filter(pk__gte=start, pk__lt=start + batch_size).update(
+                status='overdue', updated_at=timezone.now()
+            )
+            start += batch_size
+        return updated
     
     @property
     def is_overdue(self):
         """التحقق من تأخر الرسوم"""
-        return self.due_date < timezone.now().date() and self.status != 'paid'
+        return self.due_date < timezone.localdate() and self.status != 'paid'
     
     def update_status(self):
         """تحديث حالة الرسوم بناءً على المدفوعات"""
-        paid_amount = self.amount_paid
+        paid_amount = self.payments.filter(status='verified').aggregate(
+            total=models.Sum('amount')
+        )['total'] or Decimal('0.00')
+        self.amount_paid = paid_amount
         if paid_amount >= self.amount:
             self.status = 'paid'
-        elif paid_amount > 0:
-            self.status = 'partial'
         elif self.is_overdue:
             self.status = 'overdue'
+        elif paid_amount > 0:
+            self.status = 'partial'
         else:
             self.status = 'pending'
         self.save()
@@ -215,7 +428,7 @@ class Payment(models.Model):
     fee = models.ForeignKey(StudentFee, on_delete=models.CASCADE, related_name='payments')
     payment_provider = models.ForeignKey(PaymentProvider, on_delete=models.CASCADE, related_name='payments')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
-    transaction_reference = models.CharField(max_length=200)
+    transaction_reference = models.CharField(max_length=200, db_index=True)
     payment_date = models.DateTimeField()
     status = models.CharField(max_length=15, choices=STATUS_CHOICES, default='pending')
     
@@ -223,39 +436,304 @@ class Payment(models.Model):
     sender_name = models.CharField(max_length=200, blank=True, null=True, help_text="Name of person who sent the money")
     sender_phone = models.CharField(max_length=20, blank=True, null=True, help_text="Phone number of sender")
     transfer_notes = models.TextField(blank=True, help_text="Additional notes from student about the transfer")
+    proof_image = models.ImageField(upload_to='payment_proofs/', blank=True, help_text="Transfer screenshot or photo, downscaled and stripped of metadata")
+    proof_thumbnail = models.ImageField(upload_to='payment_proofs/thumbnails/', blank=True, help_text="Small copy of the proof for the verification list")
     
     verification_notes = models.TextField(blank=True)
     verified_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='verified_payments')
     verified_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Last change, used by the incremental fact export")
+    
+    # Student name, university ID, sender details and reference, kept in sync on save for staff search
+    search_document = models.TextField(blank=True, default='', editable=False)
+    
+    # Reference with separators and case removed, used to catch a bank transfer submitted twice
+    normalized_reference = models.CharField(max_length=200, blank=True, default='', editable=False)
+    is_possible_duplicate = models.BooleanField(default=False, help_text="Reference, amount and provider match another pending or verified payment")
+    
+    # Payments in these states count when looking for a reused transfer reference
+    DUPLICATE_CANDIDATE_STATUSES = ('pending', 'verified')
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='payment_keyset_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='payment_status_keyset_idx'),
+            models.Index(fields=['normalized_reference', 'payment_provider', 'amount'], name='payment_duplicate_idx'),
+            models.Index(fields=['updated_at', 'id'], name='payment_updated_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.university_id} - {self.transaction_reference} - ${self.amount}"
     
-    def verify_payment(self, staff_member, notes=""):
-        """Verify the payment"""
-        self.status = 'verified'
-        self.verified_by = staff_member
-        self.verified_at = timezone.now()
-        self.verification_notes = notes
-        self.save()
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._balance_state = self._tracked_state(self.BALANCE_FIELDS)
+        self._rollup_state = self._tracked_state(self.ROLLUP_FIELDS)
+    
+    # Fields that decide what a payment contributes to its fee's balance
+    BALANCE_FIELDS = ('status', 'amount', 'fee_id')
+    # Fields that decide which daily rollup row a decided payment counts toward
+    ROLLUP_FIELDS = ('status', 'amount', 'fee_id', 'payment_provider_id', 'verified_at')
+    
+    def _tracked_state(self, fields):
+        """Current values of fields as a tuple
+        
+        Read from __dict__ so deferred fields are not loaded; None for unsaved
+        payments or when any of them is deferred.
+        """
+        if self.pk is None or any(name not in self.__dict__ for name in fields):
+            return None
+        return tuple(self.__dict__[name] for name in fields)
+    
+    def _rollup_contributions(self, states):
+        """Rollup contributions of ROLLUP_FIELDS states, looking up each fee's type once"""
+        fee_types = {}
+        cached_fee = self._state.fields_cache.get('fee')
+        if cached_fee is not None:
+            fee_types[cached_fee.pk] = cached_fee.fee_type_id
+        missing = {state[2] for state in states if state is not None} - set(fee_types)
+        if missing:
+            fee_types.update(StudentFee.objects.filter(pk__in=missing).values_list('pk', 'fee_type_id'))
+        contributions = []
+        for state in states:
+            if state is None or state[2] not in fee_types:
+                contributions.append(None)
+                continue
+            status, amount, fee_id, provider_id, verified_at = state
+            contributions.append(DailyFinancialRollup.payment_contribution(
+                status, amount, fee_types[fee_id], provider_id, verified_at
+            ))
+        return contributions
+    
+    def _fees_needing_recompute(self, previous):
+        """Fees whose stored balance is affected by moving from previous to the current state"""
+        current = (self.status, self.amount, self.fee_id)
+        if previous == current:
+            return set()
+        if previous is None:
+            return {self.fee_id} if self.status == 'verified' else set()
+        if 'verified' not in (previous[0], current[0]):
+            return set()
+        return {previous[2], current[2]}
+    
+    def save(self, *args, **kwargs):
+        from .search import build_payment_search_document, index_payment, normalize_reference
+        
+        self.search_document = build_payment_search_document(self)
+        self.normalized_reference = normalize_reference(self.transaction_reference)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'search_document', 'normalized_reference'}
+        is_new = self._state.adding
+        previous_rollup = self._rollup_state
+        fee_ids = self._fees_needing_recompute(self._balance_state)
+        super().save(*args, **kwargs)
+        index_payment(self, using=self._state.db)
+        if fee_ids:
+            # Covers admin edits of status, amount or fee, including the fee a payment moved away from
+            StudentFee.update_statuses(fee_ids)
+        self._balance_state = (self.status, self.amount, self.fee_id)
+        
+        current_rollup = self._tracked_state(self.ROLLUP_FIELDS)
+        if (is_new or previous_rollup is not None) and current_rollup != previous_rollup:
+            # Decisions, including admin status edits, move the daily rollup
+            DailyFinancialRollup.record_change(*self._rollup_contributions([previous_rollup, current_rollup]))
+        self._rollup_state = current_rollup
+    
+    def delete(self, *args, **kwargs):
+        fee_id, was_verified = self.fee_id, self.status == 'verified'
+        result = super().delete(*args, **kwargs)
+        if was_verified:
+            StudentFee.update_statuses({fee_id})
+        return result
+    
+    @classmethod
+    def bulk_submit(cls, payments):
+        """Insert new payments in one query, filling in what save() would compute"""
+        from .search import build_payment_search_document, index_payments, normalize_reference
+        
+        for payment in payments:
+            payment.search_document = build_payment_search_document(payment)
+            payment.normalized_reference = normalize_reference(payment.transaction_reference)
+        payments = cls.objects.bulk_create(payments)
+        index_payments(payments)
+        return payments
+    
+    @classmethod
+    def flag_possible_duplicates(cls, payments):
+        """Flag newly submitted payments that reuse an existing transfer
+        
+        A payment is a possible duplicate when its normalized reference,
+        provider and amount match another pending or verified payment outside
+        the same submission. Both sides are flagged. Uses one indexed lookup
+        for the whole submission and returns the new payments that were flagged.
+        """
+        payments = [payment for payment in payments if payment.normalized_reference]
+        if not payments:
+            return []
+        
+        def key(payment):
+            return (payment.normalized_reference, payment.payment_provider_id, payment.amount)
+        
+        condition = models.Q()
+        for payment in payments:
+            condition |= models.Q(
+                normalized_reference=payment.normalized_reference,
+                payment_provider_id=payment.payment_provider_id,
+                amount=payment.amount
+            )
+        matches = list(cls.objects.filter(
+            condition, status__in=cls.DUPLICATE_CANDIDATE_STATUSES
+        ).exclude(pk__in=[payment.pk for payment in payments]).values_list(
+            'pk', 'normalized_reference', 'payment_provider_id', 'amount'
+        ))
+        if not matches:
+            return []
+        
+        matched_keys = {tuple(match[1:]) for match in matches}
+        flagged = [payment for payment in payments if key(payment) in matched_keys]
+        cls.objects.filter(
+            pk__in=[payment.pk for payment in flagged] + [match[0] for match in matches]
+        ).update(is_possible_duplicate=True, updated_at=timezone.now())
+        for payment in flagged:
+            payment.is_possible_duplicate = True
+        return flagged
+    
+    @classmethod
+    def possible_duplicates(cls, queryset):
+        """Payments in queryset sharing a reference, provider and amount with another one
+        
+        Computed with a single windowed query and ordered so that each group
+        of matching payments is listed together, oldest first.
+        """
+        group = ['normalized_reference', 'payment_provider', 'amount']
+        return queryset.filter(
+            status__in=cls.DUPLICATE_CANDIDATE_STATUSES
+        ).exclude(normalized_reference='').annotate(
+            duplicate_count=models.Window(models.Count('pk'), partition_by=[models.F(name) for name in group])
+        ).filter(duplicate_count__gt=1).order_by(*group, 'created_at', 'id')
+    
+    @classmethod
+    def refresh_search_documents(cls, student):
+        """Reindex a student's payments after their name or university ID changes"""
+        from .search import rebuild_payment_index
+        
+        return rebuild_payment_index(cls.objects.filter(student=student))
+    
+    def _transition(self, status, staff_member, notes):
+        """Move this payment from pending to status, once
         
-        # Update fee status
-        self.fee.update_status()
+        The row is re-read under a lock, so two staff members deciding the
+        same payment at once cannot both apply (and count) the decision.
+        Returns False when the payment was no longer pending.
+        """
+        with transaction.atomic():
+            fee = StudentFee.objects.select_for_update().get(pk=self.fee_id)
+            current = Payment.objects.select_for_update().filter(pk=self.pk).values_list('status', flat=True).first()
+            if current != 'pending':
+                if current is not None:
+                    self.status = current
+                return False
+            self.status = status
+            self.verified_by = staff_member
+            self.verified_at = timezone.now()
+            self.verification_notes = notes
+            # save() refreshes the fee's stored balance and status and records the decision
+            self.save()
+            fee.refresh_from_db()
+            self.fee = fee
+        return True
+    
+    def verify_payment(self, staff_member, notes=""):
+        """Verify the payment; returns False if it had already been decided"""
+        return self._transition('verified', staff_member, notes)
     
     def reject_payment(self, staff_member, reason):
-        """Reject the payment"""
-        self.status = 'rejected'
-        self.verified_by = staff_member
-        self.verified_at = timezone.now()
-        self.verification_notes = reason
-        self.save()
+        """Reject the payment; returns False if it had already been decided"""
+        return self._transition('rejected', staff_member, reason)
+    
+    @classmethod
+    def _bulk_transition(cls, payment_ids, status, staff_member, notes):
+        """Move every still-pending payment in payment_ids to status in one transaction
         
-        # Update fee status
-        self.fee.update_status()
+        Fees are locked before payments, matching the order used by
+        verify_payment/reject_payment. Returns the payments that changed state.
+        """
+        payment_ids = list(payment_ids)
+        with transaction.atomic():
+            fee_ids = set(cls.objects.filter(
+                pk__in=payment_ids, status='pending'
+            ).values_list('fee_id', flat=True))
+            if not fee_ids:
+                return []
+            list(StudentFee.objects.select_for_update().filter(
+                pk__in=fee_ids
+            ).order_by('pk').values_list('pk', flat=True))
+            
+            payments = list(cls.objects.select_for_update(of=('self',)).select_related(
+                'student', 'fee'
+            ).filter(pk__in=payment_ids, status='pending', fee_id__in=fee_ids).order_by('pk'))
+            if not payments:
+                return []
+            
+            verified_at = timezone.now()
+            cls.objects.filter(
+                pk__in=[payment.pk for payment in payments], status='pending'
+            ).update(
+                status=status,
+                verified_by=staff_member,
+                verified_at=verified_at,
+                verification_notes=notes,
+                updated_at=verified_at
+            )
+            for payment in payments:
+                payment.status = status
+                payment.verified_by = staff_member
+                payment.verified_at = verified_at
+                payment.verification_notes = notes
+                payment.updated_at = verified_at
+            
+            # Update each affected fee balance and status once
+            StudentFee.update_statuses({payment.fee_id for payment in payments})
+            DailyFinancialRollup.record_payment_decisions(payments)
+        return payments
+    
+    @classmethod
+    def bulk_verify(cls, payment_ids, staff_member, notes=""):
+        """Verify many payments at once"""
+        return cls._bulk_transition(payment_ids, 'verified', staff_member, notes)
+    
+    @classmethod
+    def bulk_reject(cls, payment_ids, staff_member, reason):
+        """Reject many payments at once"""
+        return cls._bulk_transition(payment_ids, 'rejected', staff_member, reason)
+
+
+@receiver(post_delete, sender=Payment)
+def unindex_deleted_payment(sender, instance, using, **kwargs):
+    """Drop a deleted payment's search row, including queryset and cascade deletes"""
+    from .search import unindex_payment
+    
+    unindex_payment(instance.pk, using=using)
+
+
+@receiver(post_delete, sender=Payment)
+def unrecord_deleted_payment(sender, instance, **kwargs):
+    """Take a deleted decided payment out of the daily rollup"""
+    before, = instance._rollup_contributions([instance._rollup_state])
+    DailyFinancialRollup.record_change(before, None)
+
+
+@receiver(post_delete, sender=StudentFee)
+def unrecord_deleted_fee(sender, instance, **kwargs):
+    """Take a deleted fee out of the issued totals of the daily rollup
+    
+    Its payments are deleted first by the cascade and remove themselves.
+    """
+    if instance._rollup_state is not None:
+        DailyFinancialRollup.record_change(DailyFinancialRollup.fee_contribution(*instance._rollup_state), None)
 
 
 class PaymentReceipt(models.Model):
@@ -263,20 +741,652 @@ class PaymentReceipt(models.Model):
     payment = models.OneToOneField(Payment, on_delete=models.CASCADE, related_name='receipt')
     receipt_number = models.CharField(max_length=50, unique=True)
     receipt_file = models.FileField(upload_to='receipts/', null=True, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, help_text="Hash of the payment fields rendered into receipt_file")
     generated_at = models.DateTimeField(auto_now_add=True)
     generated_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     
     def __str__(self):
         return f"Receipt {self.receipt_number} - {self.payment.student.university_id}"
     
+    def compute_content_hash(self):
+        """Hash every payment field that appears on the rendered receipt"""
+        import hashlib
+        payment = self.payment
+        fields = [
+            self.receipt_number,
+            payment.payment_date.isoformat(),
+            payment.student.university_id,
+            payment.student.get_full_name(),
+            payment.fee.fee_type.name,
+            str(payment.amount),
+            payment.payment_provider.name,
+            payment.transaction_reference or '',
+            payment.status,
+        ]
+        return hashlib.sha256('\x1f'.join(fields).encode('utf-8')).hexdigest()
+    
+    @property
+    def has_current_file(self):
+        """Whether the stored PDF still matches the payment it was rendered from"""
+        return bool(
+            self.receipt_file
+            and self.content_hash
+            and self.content_hash == self.compute_content_hash()
+            and self.receipt_file.storage.exists(self.receipt_file.name)
+        )
+    
+    @staticmethod
+    def generate_receipt_number():
+        import uuid
+        return f"RCP-{uuid.uuid4().hex[:8].upper()}"
+    
+    @classmethod
+    def create_missing(cls, payments):
+        """Create receipt rows for payments that have none yet, in one INSERT"""
+        payments = list(payments)
+        existing = set(cls.objects.filter(payment__in=payments).values_list('payment_id', flat=True))
+        cls.objects.bulk_create([
+            cls(
+                payment=payment,
+                receipt_number=cls.generate_receipt_number(),
+                generated_by_id=payment.verified_by_id
+            )
+            for payment in payments if payment.pk not in existing
+        ], ignore_conflicts=True)
+    
     def save(self, *args, **kwargs):
         if not self.receipt_number:
             # Generate unique receipt number
-            import uuid
-            self.receipt_number = f"RCP-{uuid.uuid4().hex[:8].upper()}"
+            self.receipt_number = self.generate_receipt_number()
         super().save(*args, **kwargs)
 
 
+class OverdueSweep(models.Model):
+    """سجل تشغيل عملية تحديث الرسوم المتأخرة"""
+    ran_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('وقت التشغيل')
+    )
+    cutoff_date = models.DateField(
+        verbose_name=_('تاريخ القطع'),
+        help_text=_('الرسوم المستحقة قبل هذا التاريخ تعتبر متأخرة')
+    )
+    updated_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('عدد الرسوم المحدثة')
+    )
+    duration = models.FloatField(
+        default=0,
+        verbose_name=_('المدة (ثانية)')
+    )
+    
+    class Meta:
+        ordering = ['-ran_at']
+        verbose_name = _('تحديث الرسوم المتأخرة')
+        verbose_name_plural = _('عمليات تحديث الرسوم المتأخرة')
+    
+    def __str__(self):
+        return f"{self.ran_at:%Y-%m-%d %H:%M} - {self.updated_count}"
+    
+    @classmethod
+    def run(cls, batch_size=5000):
+        """تشغيل التحديث وتسجيل عدد الرسوم التي تغيرت حالتها"""
+        started = time.monotonic()
+        cutoff_date = timezone.localdate()
+        updated = StudentFee.mark_overdue(batch_size=batch_size, today=cutoff_date)
+        return cls.objects.create(
+            cutoff_date=cutoff_date,
+            updated_count=updated,
+            duration=round(time.monotonic() - started, 3)
+        )
+
+
+class StudentStatement(models.Model):
+    """كشف حساب الطالب المحفوظ بصيغة PDF"""
+    
+    student = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='statement',
+        verbose_name=_('الطالب')
+    )
+    statement_file = models.FileField(
+        upload_to='statements/',
+        null=True,
+        blank=True,
+        verbose_name=_('ملف الكشف')
+    )
+    content_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        verbose_name=_('بصمة المحتوى'),
+        help_text=_('بصمة الرسوم والمدفوعات الواردة في الملف')
+    )
+    generated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name=_('تاريخ الإنشاء')
+    )
+    
+    class Meta:
+        verbose_name = _('كشف حساب')
+        verbose_name_plural = _('كشوف الحسابات')
+    
+    def __str__(self):
+        return f"Statement {self.student_id}"
+    
+    @classmethod
+    def create_missing(cls, student_ids):
+        """إنشاء سجلات الكشوف الناقصة في استعلام واحد"""
+        cls.objects.bulk_create(
+            [cls(student_id=student_id) for student_id in student_ids],
+            ignore_conflicts=True
+        )
+    
+    def is_current(self, content_hash):
+        """هل الملف المحفوظ مطابق لآخر حالة للرسوم والمدفوعات"""
+        return bool(
+            self.statement_file
+            and self.content_hash == content_hash
+            and self.statement_file.storage.exists(self.statement_file.name)
+        )
+
+
+class FeeAssignment(models.Model):
+    """تخصيص رسوم لمجموعة من الطلاب يتم تنفيذه في الخلفية
+    
+    The same fee type, amount, due date and cohort always map to the same
+    assignment, and each student gets at most one fee per assignment, so
+    re-running an assignment only fills in students that are still missing.
+    """
+    
+    STATUS_CHOICES = (
+        ('pending', _('في الانتظار')),
+        ('running', _('قيد التنفيذ')),
+        ('completed', _('مكتمل')),
+        ('failed', _('فشل')),
+    )
+    
+    COHORT_FIELDS = ('major', 'enrollment_year', 'academic_level')
+    
+    fee_type = models.ForeignKey(
+        FeeType,
+        on_delete=models.CASCADE,
+        related_name='assignments',
+        verbose_name=_('نوع الرسوم'),
+        help_text=_('نوع الرسوم المخصصة')
+    )
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name=_('المبلغ'),
+        help_text=_('مبلغ الرسوم لكل طالب')
+    )
+    due_date = models.DateField(
+        verbose_name=_('تاريخ الاستحقاق'),
+        help_text=_('تاريخ استحقاق الرسوم')
+    )
+    description = models.TextField(
+        blank=True,
+        verbose_name=_('الوصف'),
+        help_text=_('وصف الرسوم')
+    )
+    criteria = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name=_('معايير الاستهداف'),
+        help_text=_('التخصص وسنة التسجيل والمستوى الأكاديمي أو قائمة معرفات الطلاب')
+    )
+    assignment_key = models.CharField(
+        max_length=64,
+        unique=True,
+        editable=False,
+        verbose_name=_('مفتاح التخصيص'),
+        help_text=_('بصمة نوع الرسوم والمبلغ والتاريخ والمعايير')
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending',
+        verbose_name=_('الحالة')
+    )
+    total_students = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('عدد الطلاب المستهدفين'),
+        help_text=_('عدد الطلاب الذين تنقصهم الرسوم عند بدء التنفيذ')
+    )
+    processed_students = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('عدد الطلاب المعالجين')
+    )
+    created_fees = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('عدد الرسوم المنشأة')
+    )
+    error_message = models.TextField(
+        blank=True,
+        verbose_name=_('رسالة الخطأ')
+    )
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name='fee_assignments',
+        verbose_name=_('أنشأ بواسطة')
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('تاريخ الإنشاء')
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('تاريخ بدء التنفيذ')
+    )
+    completed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('تاريخ انتهاء التنفيذ')
+    )
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = _('تخصيص رسوم جماعي')
+        verbose_name_plural = _('تخصيصات الرسوم الجماعية')
+    
+    def __str__(self):
+        return f"{self.fee_type.name} - ${self.amount} ({self.get_status_display()})"
+    
+    @classmethod
+    def normalize_criteria(cls, criteria):
+        """إزالة المعايير الفارغة وترتيب قائمة المعرفات"""
+        normalized = {
+            field: criteria[field]
+            for field in cls.COHORT_FIELDS
+            if criteria.get(field) not in (None, '')
+        }
+        if 'enrollment_year' in normalized:
+            normalized['enrollment_year'] = int(normalized['enrollment_year'])
+        if criteria.get('student_ids'):
+            normalized['student_ids'] = sorted({int(pk) for pk in criteria['student_ids']})
+        return normalized
+    
+    @classmethod
+    def compute_key(cls, fee_type_id, amount, due_date, criteria):
+        """بصمة ثابتة تميز التخصيص"""
+        payload = json.dumps(
+            [fee_type_id, str(Decimal(amount).quantize(Decimal('0.01'))), str(due_date), criteria],
+            sort_keys=True
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def get_or_create_for(cls, fee_type, amount, due_date, criteria, description='', created_by=None):
+        """إرجاع التخصيص المطابق أو إنشاؤه، حتى لا يتكرر نفس التخصيص"""
+        criteria = cls.normalize_criteria(criteria)
+        return cls.objects.get_or_create(
+            assignment_key=cls.compute_key(fee_type.pk, amount, due_date, criteria),
+            defaults={
+                'fee_type': fee_type,
+                'amount': amount,
+                'due_date': due_date,
+                'criteria': criteria,
+                'description': description,
+                'created_by': created_by,
+            }
+        )
+    
+    def target_students(self):
+        """الطلاب المطابقون لمعايير التخصيص"""
+        from accounts.models import User
+        
+        students = User.objects.filter(user_type='student')
+        filters = {field: self.criteria[field] for field in self.COHORT_FIELDS if field in self.criteria}
+        if filters:
+            students = students.filter(**filters)
+        if self.criteria.get('student_ids'):
+            students = students.filter(pk__in=self.criteria['student_ids'])
+        return students
+    
+    @property
+    def progress(self):
+        """نسبة التقدم المئوية"""
+        if not self.total_students:
+            return 100 if self.status == 'completed' else 0
+        return round(self.processed_students * 100 / self.total_students, 1)
+    
+    def _create_fees(self, student_ids):
+        """إنشاء رسوم التخصيص للطلاب الذين لا يملكونها وإرجاع الرسوم المنشأة فعلاً
+        
+        bulk_create with ignore_conflicts silently skips rows that already
+        exist, so the rows actually inserted are read back before they are
+        counted.
+        """
+        existing = set(StudentFee.objects.filter(
+            assignment=self, student_id__in=student_ids
+        ).values_list('student_id', flat=True))
+        missing = [student_id for student_id in student_ids if student_id not in existing]
+        if not missing:
+            return []
+        
+        # bulk_create skips save(), so the balance columns are set explicitly
+        StudentFee.objects.bulk_create([
+            StudentFee(
+                student_id=student_id,
+                fee_type_id=self.fee_type_id,
+                amount=self.amount,
+                amount_paid=Decimal('0.00'),
+                remaining_balance=self.amount,
+                due_date=self.due_date,
+                description=self.description,
+                created_by_id=self.created_by_id,
+                assignment=self
+            )
+            for student_id in missing
+        ], ignore_conflicts=True)
+        return list(StudentFee.objects.filter(
+            assignment=self, student_id__in=missing
+        ).only('fee_type_id', 'amount', 'created_at'))
+    
+    def run(self, batch_size=1000, force=False):
+        """إنشاء الرسوم الناقصة على دفعات باستخدام bulk_create
+        
+        Returns False if another worker is already running this assignment.
+        Pass force=True to take over an assignment left in the running state.
+        """
+        claimable = ['pending', 'failed', 'completed'] + (['running'] if force else [])
+        students = self.target_students().exclude(fees__assignment=self)
+        claimed = FeeAssignment.objects.filter(pk=self.pk, status__in=claimable).update(
+            status='running',
+            total_students=students.count(),
+            processed_students=0,
+            error_message='',
+            started_at=timezone.now(),
+            completed_at=None
+        )
+        if not claimed:
+            return False
+        self.refresh_from_db()
+        
+        try:
+            last_pk = 0
+            while True:
+                student_ids = list(students.filter(pk__gt=last_pk).order_by('pk').values_list(
+                    'pk', flat=True
+                )[:batch_size])
+                if not student_ids:
+                    break
+                last_pk = student_ids[-1]
+                
+                with transaction.atomic():
+                    created = self._create_fees(student_ids)
+                    DailyFinancialRollup.record_fees(created)
+                    FeeAssignment.objects.filter(pk=self.pk).update(
+                        processed_students=models.F('processed_students') + len(student_ids),
+                        created_fees=models.F('created_fees') + len(created)
+                    )
+        except Exception as e:
+            FeeAssignment.objects.filter(pk=self.pk).update(
+                status='failed',
+                error_message=str(e),
+                completed_at=timezone.now()
+            )
+            raise
+        
+        FeeAssignment.objects.filter(pk=self.pk).update(
+            status='completed',
+            completed_at=timezone.now()
+        )
+        self.refresh_from_db()
+        return True
+
+
+class DailyFinancialRollup(models.Model):
+    """ملخص مالي يومي لكل نوع رسوم ومقدم خدمة دفع
+    
+    Rows are incremented as fees are issued and payments are verified or
+    rejected, and adjusted when a fee or decided payment is edited or
+    deleted, so revenue over any date range is a single range scan.
+    Fee issuance rows have no payment provider.
+    """
+    date = models.DateField(
+        verbose_name=_('التاريخ'),
+        help_text=_('اليوم الذي يغطيه الملخص')
+    )
+    fee_type = models.ForeignKey(
+        FeeType,
+        on_delete=models.CASCADE,
+        related_name='daily_rollups',
+        verbose_name=_('نوع الرسوم'),
+        help_text=_('نوع الرسوم المجمعة')
+    )
+    payment_provider = models.ForeignKey(
+        PaymentProvider,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='daily_rollups',
+        verbose_name=_('مقدم خدمة الدفع'),
+        help_text=_('مقدم خدمة الدفع، فارغ لصفوف إصدار الرسوم')
+    )
+    fees_issued_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('عدد الرسوم المصدرة')
+    )
+    fees_issued_amount = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name=_('مبلغ الرسوم المصدرة')
+    )
+    verified_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('عدد المدفوعات المتحقق منها')
+    )
+    verified_amount = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name=_('مبلغ المدفوعات المتحقق منها')
+    )
+    rejected_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('عدد المدفوعات المرفوضة')
+    )
+    rejected_amount = models.DecimalField(
+        max_digits=15,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name=_('مبلغ المدفوعات المرفوضة')
+    )
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name = _('ملخص مالي يومي')
+        verbose_name_plural = _('الملخصات المالية اليومية')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'fee_type', 'payment_provider'],
+                condition=models.Q(payment_provider__isnull=False),
+                name='unique_rollup_per_provider'
+            ),
+            models.UniqueConstraint(
+                fields=['date', 'fee_type'],
+                condition=models.Q(payment_provider__isnull=True),
+                name='unique_rollup_fees_issued'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.date} - {self.fee_type.name} - ${self.verified_amount}"
+    
+    @classmethod
+    def record(cls, date, fee_type_id, payment_provider_id=None, **deltas):
+        """إضافة القيم إلى صف اليوم، مع إنشائه إذا لم يكن موجوداً"""
+        filters = {
+            'date': date,
+            'fee_type_id': fee_type_id,
+            'payment_provider_id': payment_provider_id,
+        }
+        updates = {field: models.F(field) + value for field, value in deltas.items()}
+        if cls.objects.filter(**filters).update(**updates):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(**filters, **deltas)
+        except IntegrityError:
+            # Another transaction created the row first
+            cls.objects.filter(**filters).update(**updates)
+    
+    @classmethod
+    def record_fees(cls, fees):
+        """تسجيل الرسوم المصدرة مجمعة حسب اليوم ونوع الرسوم"""
+        totals = defaultdict(lambda: [0, Decimal('0.00')])
+        for fee in fees:
+            key = (timezone.localdate(fee.created_at), fee.fee_type_id)
+            totals[key][0] += 1
+            totals[key][1] += fee.amount
+        for (date, fee_type_id), (count, amount) in totals.items():
+            cls.record(date, fee_type_id, fees_issued_count=count, fees_issued_amount=amount)
+    
+    @classmethod
+    def record_payment_decisions(cls, payments):
+        """تسجيل المدفوعات المتحقق منها أو المرفوضة مجمعة حسب اليوم والنوع والمقدم"""
+        totals = defaultdict(lambda: [0, Decimal('0.00')])
+        for payment in payments:
+            if payment.status not in ('verified', 'rejected'):
+                continue
+            key = (
+                timezone.localdate(payment.verified_at),
+                payment.fee.fee_type_id,
+                payment.payment_provider_id,
+                payment.status,
+            )
+            totals[key][0] += 1
+            totals[key][1] += payment.amount
+        for (date, fee_type_id, provider_id, status), (count, amount) in totals.items():
+            cls.record(date, fee_type_id, provider_id, **{
+                f'{status}_count': count,
+                f'{status}_amount': amount,
+            })
+    
+    @staticmethod
+    def fee_contribution(created_at, fee_type_id, amount):
+        """The rollup row and amount a fee counts toward"""
+        return (timezone.localdate(created_at), fee_type_id, None, 'fees_issued'), amount
+    
+    @staticmethod
+    def payment_contribution(status, amount, fee_type_id, payment_provider_id, verified_at):
+        """The rollup row and amount a payment counts toward, or None while it is undecided"""
+        if status not in ('verified', 'rejected') or verified_at is None:
+            return None
+        return (timezone.localdate(verified_at), fee_type_id, payment_provider_id, status), amount
+    
+    @classmethod
+    def record_deltas(cls, deltas):
+        """إضافة فروقات موقعة إلى صفوف الملخص، مع دمج الفروقات الواقعة على نفس الصف
+        
+        Each delta is (key, count, amount) where key is (date, fee_type_id,
+        payment_provider_id, column prefix) as returned by fee_contribution and
+        payment_contribution.
+        """
+        totals = defaultdict(lambda: [0, Decimal('0.00')])
+        for key, count, amount in deltas:
+            totals[key][0] += count
+            totals[key][1] += amount
+        for (date, fee_type_id, provider_id, prefix), (count, amount) in totals.items():
+            if count or amount:
+                cls.record(date, fee_type_id, provider_id, **{
+                    f'{prefix}_count': count,
+                    f'{prefix}_amount': amount,
+                })
+    
+    @classmethod
+    def record_change(cls, before, after):
+        """نقل مساهمة صف معدل أو محذوف من before إلى after
+        
+        Either side is a contribution, or None when the row did not count.
+        """
+        deltas = []
+        if before is not None:
+            deltas.append((before[0], -1, -before[1]))
+        if after is not None:
+            deltas.append((after[0], 1, after[1]))
+        cls.record_deltas(deltas)
+    
+    @classmethod
+    def move_fee_payments(cls, fee_id, old_fee_type_id, new_fee_type_id):
+        """نقل المدفوعات المقررة لرسوم تغير نوعها إلى صفوف النوع الجديد"""
+        deltas = []
+        for row in Payment.objects.filter(
+            fee_id=fee_id, status__in=['verified', 'rejected'], verified_at__isnull=False
+        ).annotate(day=TruncDate('verified_at')).values(
+            'day', 'payment_provider', 'status'
+        ).annotate(count=models.Count('pk'), total=models.Sum('amount')).order_by():
+            for fee_type_id, sign in ((old_fee_type_id, -1), (new_fee_type_id, 1)):
+                key = (row['day'], fee_type_id, row['payment_provider'], row['status'])
+                deltas.append((key, sign * row['count'], sign * row['total']))
+        cls.record_deltas(deltas)
+    
+    @classmethod
+    def rebuild(cls, start_date=None, end_date=None):
+        """إعادة بناء الملخصات من جداول المدفوعات والرسوم لفترة محددة أو لكامل البيانات
+        
+        Returns the number of rollup rows written.
+        """
+        rollups = cls.objects.all()
+        payments = Payment.objects.filter(
+            status__in=['verified', 'rejected'],
+            verified_at__isnull=False
+        )
+        fees = StudentFee.objects.all()
+        if start_date:
+            rollups = rollups.filter(date__gte=start_date)
+            payments = payments.filter(verified_at__date__gte=start_date)
+            fees = fees.filter(created_at__date__gte=start_date)
+        if end_date:
+            rollups = rollups.filter(date__lte=end_date)
+            payments = payments.filter(verified_at__date__lte=end_date)
+            fees = fees.filter(created_at__date__lte=end_date)
+        
+        verified = models.Q(status='verified')
+        rejected = models.Q(status='rejected')
+        rows = []
+        for row in payments.annotate(day=TruncDate('verified_at')).values(
+            'day', 'fee__fee_type', 'payment_provider'
+        ).annotate(
+            verified_count=models.Count('pk', filter=verified),
+            verified_amount=models.Sum('amount', filter=verified),
+            rejected_count=models.Count('pk', filter=rejected),
+            rejected_amount=models.Sum('amount', filter=rejected),
+        ).order_by():
+            rows.append(cls(
+                date=row['day'],
+                fee_type_id=row['fee__fee_type'],
+                payment_provider_id=row['payment_provider'],
+                verified_count=row['verified_count'],
+                verified_amount=row['verified_amount'] or Decimal('0.00'),
+                rejected_count=row['rejected_count'],
+                rejected_amount=row['rejected_amount'] or Decimal('0.00'),
+            ))
+        for row in fees.annotate(day=TruncDate('created_at')).values(
+            'day', 'fee_type'
+        ).annotate(
+            fees_issued_count=models.Count('pk'),
+            fees_issued_amount=models.Sum('amount'),
+        ).order_by():
+            rows.append(cls(
+                date=row['day'],
+                fee_type_id=row['fee_type'],
+                fees_issued_count=row['fees_issued_count'],
+                fees_issued_amount=row['fees_issued_amount'],
+            ))
+        
+        with transaction.atomic():
+            rollups.delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
 class FinancialReport(models.Model):
     """Financial reports and summaries"""
     
@@ -302,3 +1412,178 @@ class FinancialReport(models.Model):
     
     def __str__(self):
         return f"{self.get_report_type_display()} - {self.start_date} to {self.end_date}"
+    
+    @classmethod
+    def generate(cls, report_type, start_date, end_date, generated_by=None):
+        """Create a report for the period from the daily rollups"""
+        rollups = DailyFinancialRollup.objects.filter(date__range=(start_date, end_date))
+        totals = rollups.aggregate(
+            fees_issued=models.Sum('fees_issued_amount'),
+            received=models.Sum('verified_amount'),
+            transactions=models.Sum('verified_count'),
+            rejected=models.Sum('rejected_amount'),
+        )
+        pending = Payment.objects.filter(
+            status='pending',
+            payment_date__date__range=(start_date, end_date)
+        ).aggregate(total=models.Sum('amount'))['total'] or Decimal('0.00')
+        
+        fee_types = {
+            row['fee_type__name']: float(row['received'])
+            for row in rollups.values('fee_type__name').annotate(
+                received=models.Sum('verified_amount')
+            ).order_by('fee_type__name')
+        }
+        payment_methods = {
+            row['payment_provider__name']: row['count']
+            for row in rollups.filter(payment_provider__isnull=False).values(
+                'payment_provider__name'
+            ).annotate(
+                count=models.Sum('verified_count')
+            ).order_by('payment_provider__name')
+        }
+        
+        return cls.objects.create(
+            report_type=report_type,
+            start_date=start_date,
+            end_date=end_date,
+            total_fees_issued=totals['fees_issued'] or Decimal('0.00'),
+            total_payments_received=totals['received'] or Decimal('0.00'),
+            total_pending_verification=pending,
+            generated_by=generated_by,
+            report_data={
+                'summary': f'{dict(cls.REPORT_TYPES)[report_type]} for {start_date} to {end_date}',
+                'number_of_transactions': totals['transactions'] or 0,
+                'total_rejected': float(totals['rejected'] or 0),
+                'payment_methods': payment_methods,
+                'fee_types': fee_types,
+            }
+        )
+
+
+class IdempotencyKey(models.Model):
+    """مفتاح منع التكرار لطلبات إنشاء الدفع المعادة من التطبيق"""
+    
+    # Replays are honoured for this long after the original request
+    TTL = timedelta(hours=24)
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys',
+        verbose_name=_('المستخدم')
+    )
+    key = models.CharField(
+        max_length=255,
+        verbose_name=_('المفتاح')
+    )
+    request_hash = models.CharField(
+        max_length=64,
+        verbose_name=_('بصمة الطلب'),
+        help_text=_('SHA-256 لمحتوى الطلب الأصلي')
+    )
+    response_status = models.PositiveSmallIntegerField(
+        verbose_name=_('رمز الاستجابة')
+    )
+    response_body = models.JSONField(
+        encoder=DjangoJSONEncoder,
+        verbose_name=_('الاستجابة المحفوظة')
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name=_('تاريخ الإنشاء')
+    )
+    
+    class Meta:
+        verbose_name = _('مفتاح منع التكرار')
+        verbose_name_plural = _('مفاتيح منع التكرار')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.key}"
+    
+    @staticmethod
+    def hash_request(data):
+        """بصمة ثابتة لمحتوى الطلب بغض النظر عن ترتيب الحقول"""
+        def file_digest(value):
+            # Uploaded files are hashed by content so a retried upload matches the original
+            if not hasattr(value, 'chunks'):
+                return value
+            digest = hashlib.sha256()
+            for chunk in value.chunks():
+                digest.update(chunk)
+            value.seek(0)
+            return digest.hexdigest()
+        
+        if hasattr(data, 'lists'):
+            data = {key: [file_digest(value) for value in values] for key, values in data.lists()}
+        payload = json.dumps(data, sort_keys=True, separators=(',', ':'), cls=DjangoJSONEncoder)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    @classmethod
+    def lookup(cls, user, key):
+        """إرجاع المفتاح المحفوظ إذا لم تنته صلاحيته"""
+        return cls.objects.filter(
+            user=user, key=key, created_at__gte=timezone.now() - cls.TTL
+        ).first()
+    
+    @classmethod
+    def store(cls, user, key, request_hash, response_status, response_body):
+        """حفظ الاستجابة ضمن معاملة الطلب الأصلي
+        
+        A concurrent request with the same key fails here with IntegrityError,
+        rolling back its own writes so the caller can replay the winner.
+        """
+        cls.objects.filter(user=user, key=key, created_at__lt=timezone.now() - cls.TTL).delete()
+        return cls.objects.create(
+            user=user,
+            key=key,
+            request_hash=request_hash,
+            response_status=response_status,
+            response_body=response_body
+        )
+    
+    @classmethod
+    def purge_expired(cls):
+        """حذف المفاتيح المنتهية الصلاحية"""
+        return cls.objects.filter(created_at__lt=timezone.now() - cls.TTL).delete()[0]
+
+
+class FactExportWatermark(models.Model):
+    """آخر نقطة وصل إليها التصدير التزايدي لكل جدول"""
+    
+    table = models.CharField(
+        max_length=50,
+        unique=True,
+        verbose_name=_('الجدول')
+    )
+    last_updated_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('آخر تاريخ تحديث مصدر'),
+        help_text=_('قيمة updated_at لآخر صف تم تصديره')
+    )
+    last_id = models.BigIntegerField(
+        default=0,
+        verbose_name=_('آخر معرف مصدر'),
+        help_text=_('معرف آخر صف تم تصديره بنفس تاريخ التحديث')
+    )
+    rows_exported = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_('عدد الصفوف في آخر تشغيل')
+    )
+    last_run_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name=_('تاريخ آخر تشغيل')
+    )
+    
+    class Meta:
+        verbose_name = _('علامة التصدير')
+        verbose_name_plural = _('علامات التصدير')
+    
+    def __str__(self):
+        return f"{self.table} @ {self.last_updated_at}"
@@ -0,0 +1,148 @@
+"""
+Weekly cash-flow projection from outstanding fees.
+
+Outstanding balances are summed in SQL per fee type and due date, and
+historical payment behaviour is summed in SQL per fee type and payment lag.
+Each of these is a few hundred rows however many fees exist, so the
+projection itself is a small convolution done in Python.
+
+For each fee type the model uses two things:
+
+* a collection rate: the share of matured fee amounts (due before today)
+  that has been paid;
+* a lag distribution: how many weeks after the due date verified payments
+  arrive, weighted by amount.
+
+Expected inflow in week ``w`` is the sum, over fee types and due weeks
+``d``, of ``outstanding[d] * rate * lag[w - d]``. Fees already overdue count
+as due this week. The confidence band treats each fee as paid or not
+independently in each week. Its variance is
+``sum(balance ** 2) * p * (1 - p)`` with ``p = rate * lag[k]``, and the band
+is the expected value plus or minus ``Z_SCORE`` standard deviations.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import models
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Payment, StudentFee
+
+
+DEFAULT_WEEKS = 12
+MAX_WEEKS = 52
+
+# Payments arriving this many weeks or more after the due date share the last lag bucket
+MAX_LAG_WEEKS = 12
+
+# Fee types with less matured history than this fall back to the all-types rate and lags
+MIN_HISTORY_AMOUNT = Decimal('1000.00')
+
+# 95% confidence band
+Z_SCORE = 1.96
+
+
+def _lag_distributions():
+    """Share of paid amounts arriving k weeks after the due date, per fee type and overall"""
+    lag_days = models.ExpressionWrapper(
+        TruncDate('verified_at') - models.F('fee__due_date'),
+        output_field=models.DurationField()
+    )
+    totals = defaultdict(lambda: [0.0] * (MAX_LAG_WEEKS + 1))
+    overall = [0.0] * (MAX_LAG_WEEKS + 1)
+    for row in Payment.objects.filter(
+        status='verified', verified_at__isnull=False
+    ).annotate(lag=lag_days).values('fee__fee_type', 'lag').annotate(
+        total=models.Sum('amount')
+    ).order_by():
+        weeks = min(max(row['lag'].days // 7, 0), MAX_LAG_WEEKS)
+        totals[row['fee__fee_type']][weeks] += float(row['total'])
+        overall[weeks] += float(row['total'])
+
+    def normalize(buckets):
+        total = sum(buckets)
+        if not total:
+            # No history at all: assume fees are paid in the week they fall due
+            return [1.0] + [0.0] * MAX_LAG_WEEKS
+        return [value / total for value in buckets]
+
+    return {
+        fee_type: normalize(buckets)
+        for fee_type, buckets in totals.items() if sum(buckets) >= float(MIN_HISTORY_AMOUNT)
+    }, normalize(overall)
+
+
+def _collection_rates(today):
+    """Share of matured fee amounts that has been paid, per fee type and overall"""
+    rows = list(StudentFee.objects.filter(due_date__lt=today).exclude(status='cancelled').values(
+        'fee_type'
+    ).annotate(
+        issued=models.Sum('amount'),
+        paid=models.Sum('amount_paid')
+    ).order_by())
+
+    def rate(issued, paid):
+        return min(max(float(paid) / float(issued), 0.0), 1.0) if issued else 1.0
+
+    issued = sum((row['issued'] for row in rows), Decimal('0.00'))
+    paid = sum((row['paid'] for row in rows), Decimal('0.00'))
+    overall = rate(issued, paid) if issued >= MIN_HISTORY_AMOUNT else 1.0
+    return {
+        row['fee_type']: rate(row['issued'], row['paid'])
+        for row in rows if row['issued'] >= MIN_HISTORY_AMOUNT
+    }, overall
+
+
+def project_cash_flow(weeks=DEFAULT_WEEKS, today=None):
+    """Expected weekly inflow from outstanding fees over the next ``weeks`` weeks
+
+    Returns one dict per week with its start date, the expected amount, the
+    lower and upper confidence bounds and the cumulative expected amount.
+    """
+    weeks = max(1, min(int(weeks), MAX_WEEKS))
+    today = today or timezone.localdate()
+
+    lags, overall_lags = _lag_distributions()
+    rates, overall_rate = _collection_rates(today)
+
+    expected = [0.0] * weeks
+    variance = [0.0] * weeks
+    horizon_end = today + timedelta(weeks=weeks)
+    for row in StudentFee.objects.filter(
+        status__in=['pending', 'partial', 'overdue'],
+        remaining_balance__gt=0,
+        due_date__lt=horizon_end
+    ).values('fee_type', 'due_date').annotate(
+        outstanding=models.Sum('remaining_balance'),
+        outstanding_squared=models.Sum(models.F('remaining_balance') * models.F('remaining_balance'))
+    ).order_by():
+        due_week = max((row['due_date'] - today).days // 7, 0)
+        lag = lags.get(row['fee_type'], overall_lags)
+        collection_rate = rates.get(row['fee_type'], overall_rate)
+        outstanding = float(row['outstanding'])
+        outstanding_squared = float(row['outstanding_squared'])
+        for lag_weeks, share in enumerate(lag):
+            week = due_week + lag_weeks
+            if week >= weeks:
+                break
+            probability = collection_rate * share
+            expected[week] += outstanding * probability
+            variance[week] += outstanding_squared * probability * (1 - probability)
+
+    projection = []
+    cumulative = 0.0
+    for week in range(weeks):
+        spread = Z_SCORE * math.sqrt(variance[week])
+        cumulative += expected[week]
+        projection.append({
+            'week_start': today + timedelta(weeks=week),
+            'expected': round(expected[week], 2),
+            'lower': round(max(expected[week] - spread, 0.0), 2),
+            'upper': round(expected[week] + spread, 2),
+            'cumulative': round(cumulative, 2),
+        })
+    return projection
+
@@ -0,0 +1,118 @@
+"""
+Proof-of-payment images attached to submitted transfers.
+
+Phone screenshots and photos arrive at several megabytes with EXIF metadata
+and camera orientation. Each upload is decoded once with Pillow, reduced
+during decoding where the format allows it, rotated upright, stripped of
+metadata and re-encoded within MAX_DIMENSION. A small thumbnail for the
+staff verification list is made from the same decoded image.
+"""
+import uuid
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+
+ACCEPTED_FORMATS = ('JPEG', 'PNG', 'WEBP', 'GIF', 'BMP')
+MAX_UPLOAD_SIZE = 15 * 1024 * 1024
+
+# Longest side of the stored image and of the thumbnail, in pixels
+MAX_DIMENSION = 1600
+THUMBNAIL_DIMENSION = 320
+
+# Quality steps tried in turn until the stored image fits MAX_STORED_SIZE
+QUALITY_STEPS = (80, 70, 60, 50)
+THUMBNAIL_QUALITY = 70
+MAX_STORED_SIZE = 400 * 1024
+
+# Refuse decompression bombs well before Pillow's own limit
+MAX_PIXELS = 50_000_000
+
+PROOF_DIRECTORY = 'payment_proofs'
+
+
+class ProofImageError(ValueError):
+    """An upload that cannot be used as a proof of payment"""
+
+
+def _output_format():
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def _encode(image, quality):
+    image_format, extension = _output_format()
+    buffer = BytesIO()
+    # No exif or icc_profile is passed, so none of the original metadata is written
+    if image_format == 'WEBP':
+        image.save(buffer, image_format, quality=quality, method=4)
+    else:
+        image.save(buffer, image_format, quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+class ProcessedProof:
+    """A proof image and its thumbnail, encoded and ready to store"""
+
+    def __init__(self, image_content, thumbnail_content, extension, original_size):
+        self.image_content = image_content
+        self.thumbnail_content = thumbnail_content
+        self.extension = extension
+        self.original_size = original_size
+
+    def save(self, storage=None):
+        """Write both files to storage and return their (image, thumbnail) names"""
+        storage = storage or default_storage
+        name = uuid.uuid4().hex
+        image_name = storage.save(
+            f'{PROOF_DIRECTORY}/{name}.{self.extension}', ContentFile(self.image_content)
+        )
+        thumbnail_name = storage.save(
+            f'{PROOF_DIRECTORY}/thumbnails/{name}.{self.extension}', ContentFile(self.thumbnail_content)
+        )
+        return image_name, thumbnail_name
+
+
+def process_proof_image(uploaded_file):
+    """Decode, orient, strip, downscale and re-encode an uploaded proof image
+
+    Raises ProofImageError for files that are too large or are not images.
+    """
+    if uploaded_file.size > MAX_UPLOAD_SIZE:
+        raise ProofImageError(f'Proof image must be at most {MAX_UPLOAD_SIZE // (1024 * 1024)} MB')
+
+    try:
+        uploaded_file.seek(0)
+        image = Image.open(uploaded_file)
+        if image.format not in ACCEPTED_FORMATS:
+            raise ProofImageError('Proof must be a JPEG, PNG, WebP, GIF or BMP image')
+        if image.width * image.height > MAX_PIXELS:
+            raise ProofImageError('Proof image dimensions are too large')
+
+        # JPEG can decode straight to a smaller scale, skipping most of the full-size work
+        image.draft('RGB', (MAX_DIMENSION, MAX_DIMENSION))
+        image = ImageOps.exif_transpose(image)
+
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            # Screenshots with transparency are flattened onto white
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        for quality in QUALITY_STEPS:
+            image_content = _encode(image, quality)
+            if len(image_content) <= MAX_STORED_SIZE:
+                break
+
+        thumbnail = image.copy()
+        thumbnail.thumbnail((THUMBNAIL_DIMENSION, THUMBNAIL_DIMENSION), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        thumbnail_content = _encode(thumbnail, THUMBNAIL_QUALITY)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise ProofImageError('Proof image could not be read') from e
+
+    return ProcessedProof(image_content, thumbnail_content, _output_format()[1], uploaded_file.size)
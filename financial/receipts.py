@@ -0,0 +1,155 @@
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+from .models import PaymentReceipt
+
+
+_styles = None
+
+
+def get_receipt_styles():
+    """Load the reportlab stylesheet once per process"""
+    global _styles
+    if _styles is None:
+        _styles = getSampleStyleSheet()
+    return _styles
+
+
+def warm_receipt_renderer():
+    """Load the stylesheet and the fonts receipts use ahead of the first render"""
+    get_receipt_styles()
+    for font_name in ('Helvetica', 'Helvetica-Bold', 'Helvetica-Oblique'):
+        pdfmetrics.getFont(font_name)
+
+
+def render_receipt_pdf(payment, receipt):
+    """Render the PDF receipt for a payment and return its bytes"""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles = get_receipt_styles()
+    story = []
+
+    # Header
+    title = Paragraph("PAYMENT RECEIPT", styles['Title'])
+    story.append(title)
+    story.append(Spacer(1, 20))
+
+    # University Info
+    university_info = Paragraph(
+        "<b>University Services Portal</b><br/>"
+        "Financial Services Department<br/>"
+        "123 University Avenue<br/>"
+        "University City, UC 12345",
+        styles['Normal']
+    )
+    story.append(university_info)
+    story.append(Spacer(1, 20))
+
+    # Receipt Details
+    receipt_data = [
+        ['Receipt Number:', receipt.receipt_number],
+        ['Date:', payment.payment_date.strftime('%B %d, %Y')],
+        ['Student ID:', payment.student.university_id],
+        ['Student Name:', payment.student.get_full_name()],
+        ['Fee Type:', payment.fee.fee_type.name],
+        ['Amount Paid:', f'${payment.amount}'],
+        ['Payment Method:', payment.payment_provider.name],
+        ['Transaction Reference:', payment.transaction_reference or 'N/A'],
+        ['Status:', 'Verified'],
+    ]
+
+    receipt_table = Table(receipt_data, colWidths=[2*72, 3*72])
+    receipt_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
+    ]))
+
+    story.append(receipt_table)
+    story.append(Spacer(1, 30))
+
+    # Footer
+    footer = Paragraph(
+        "<i>This is an official receipt for payment made to the University Services Portal. "
+        "Please keep this receipt for your records.</i>",
+        styles['Normal']
+    )
+    story.append(footer)
+
+    # Build PDF
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def attach_receipt_pdf(receipt, pdf_content, content_hash):
+    """Write rendered content to storage and point the receipt at it, without saving the row"""
+    if receipt.receipt_file:
+        receipt.receipt_file.delete(save=False)
+    receipt.receipt_file.save(
+        f"receipt_{receipt.receipt_number}.pdf",
+        ContentFile(pdf_content),
+        save=False
+    )
+    receipt.content_hash = content_hash
+
+
+def store_receipt_pdf(receipt, pdf_content, content_hash):
+    """Replace the stored receipt file with freshly rendered content"""
+    attach_receipt_pdf(receipt, pdf_content, content_hash)
+    receipt.save(update_fields=['receipt_file', 'content_hash'])
+
+
+def get_or_render_receipt(payment, user):
+    """
+    Return the receipt for a payment, rendering the PDF only when no stored
+    file matches the current payment fields
+    """
+    receipt, created = PaymentReceipt.objects.get_or_create(
+        payment=payment,
+        defaults={
+            'generated_by': user
+        }
+    )
+    receipt.payment = payment
+
+    if not receipt.has_current_file:
+        content_hash = receipt.compute_content_hash()
+        store_receipt_pdf(receipt, render_receipt_pdf(payment, receipt), content_hash)
+
+    return receipt
+
+
+def stored_pdf_response(request, file, content_hash, filename, as_attachment=False):
+    """Stream a stored PDF with a strong ETag, answering 304 when unchanged"""
+    etag = f'"{content_hash}"'
+    conditional = get_conditional_response(request, etag=etag)
+    if conditional is not None:
+        conditional['ETag'] = etag
+        return conditional
+
+    response = FileResponse(
+        file.open('rb'),
+        as_attachment=as_attachment,
+        filename=filename,
+        content_type='application/pdf'
+    )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def receipt_file_response(request, receipt, filename, as_attachment=False):
+    """Stream a stored receipt with a strong ETag, answering 304 when unchanged"""
+    return stored_pdf_response(request, receipt.receipt_file, receipt.content_hash, filename, as_attachment)
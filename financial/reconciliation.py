@@ -0,0 +1,297 @@
+"""
+Reconcile provider statement exports against pending payments.
+
+Statement files (CSV, JSON arrays or JSON lines) are read one line at a
+time. Pending payments for the provider are loaded once and indexed in
+memory by normalized reference and amount, so matching a statement of any
+length takes a single database query and no per-line lookups.
+
+Each statement line ends up as one of:
+
+* an exact match: same normalized reference and amount, dated within the
+  window of the payment date. A transfer split across several fees counts
+  with the summed amount of its payments;
+* a fuzzy candidate: same reference but a different amount, or same amount
+  and date window with a reference that shares its trailing digits, left
+  for staff to review;
+* an orphan: nothing pending looks like it.
+"""
+import csv
+import json
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+
+from .search import normalize_reference
+
+
+DEFAULT_WINDOW_DAYS = 3
+
+# Trailing characters two references must share to be offered as a fuzzy candidate
+FUZZY_SUFFIX_LENGTH = 6
+
+# Accepted header names for each statement field, checked in order
+COLUMN_ALIASES = {
+    'reference': ('reference', 'transaction_reference', 'ref', 'transaction_id'),
+    'amount': ('amount', 'credit', 'value'),
+    'date': ('date', 'value_date', 'transaction_date', 'posted_at'),
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d')
+
+
+class StatementError(ValueError):
+    pass
+
+
+class StatementLine:
+    """One credit from a provider statement"""
+
+    __slots__ = ('line_number', 'reference', 'normalized_reference', 'amount', 'date')
+
+    def __init__(self, line_number, reference, amount, date):
+        self.line_number = line_number
+        self.reference = reference
+        self.normalized_reference = normalize_reference(reference)
+        self.amount = amount
+        self.date = date
+
+
+class ReconciliationResult:
+    """Outcome of matching one statement against pending payments"""
+
+    def __init__(self):
+        self.lines_read = 0
+        self.exact = []          # (line, [payment_id, ...]) for every row of the transfer
+        self.candidates = []     # (line, [payment_id, ...], reason)
+        self.orphans = []        # line
+        self.unmatched_payment_ids = []
+
+    @property
+    def exact_payment_ids(self):
+        return [payment_id for _, payment_ids in self.exact for payment_id in payment_ids]
+
+
+def parse_amount(value):
+    try:
+        return Decimal(str(value).replace(',', '').strip()).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise StatementError(f'Invalid amount: {value!r}')
+
+
+def parse_date(value):
+    text = str(value).strip()
+    try:
+        # ISO dates and datetimes, with or without a time part
+        return datetime.fromisoformat(text.replace('Z', '+00:00')).date()
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    raise StatementError(f'Invalid date: {value!r}')
+
+
+def _resolve_columns(keys):
+    columns = {}
+    lowered = {key.strip().lower(): key for key in keys}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in lowered:
+                columns[field] = lowered[alias]
+                break
+        else:
+            raise StatementError(f'Statement has no {field} column (expected one of: {", ".join(aliases)})')
+    return columns
+
+
+def _iter_json_array(fileobj, chunk_size=64 * 1024):
+    """Yield the objects of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started:
+            if buffer:
+                if buffer[0] != '[':
+                    raise StatementError('JSON statement must be an array of objects')
+                buffer = buffer[1:]
+                started = True
+                continue
+        elif buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        elif buffer.startswith(']'):
+            return
+        elif buffer:
+            try:
+                obj, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise StatementError('Truncated JSON statement')
+            else:
+                yield obj
+                buffer = buffer[end:]
+                continue
+        if eof:
+            raise StatementError('Truncated JSON statement')
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+
+def iter_statement_records(fileobj, statement_format):
+    """Yield raw statement records as dicts from an open text file"""
+    if statement_format == 'csv':
+        yield from csv.DictReader(fileobj)
+    elif statement_format == 'jsonl':
+        for line in fileobj:
+            if line.strip():
+                yield json.loads(line)
+    elif statement_format == 'json':
+        yield from _iter_json_array(fileobj)
+    else:
+        raise StatementError(f'Unknown statement format: {statement_format}')
+
+
+def read_statement(fileobj, statement_format):
+    """Yield StatementLine objects from an open statement file"""
+    columns = None
+    for line_number, record in enumerate(iter_statement_records(fileobj, statement_format), start=1):
+        if columns is None:
+            columns = _resolve_columns(record.keys())
+        try:
+            yield StatementLine(
+                line_number,
+                str(record[columns['reference']] or '').strip(),
+                parse_amount(record[columns['amount']]),
+                parse_date(record[columns['date']]),
+            )
+        except StatementError as e:
+            raise StatementError(f'Line {line_number}: {e}')
+
+
+class PaymentIndex:
+    """Pending payments indexed for constant-time statement lookups
+
+    One bank transfer paying several fees is stored as several Payment rows
+    sharing the student, reference and payment date. Those rows are grouped
+    and matched as one transfer with their summed amount, so a statement
+    line for the whole transfer matches exactly and verifies every row.
+    """
+
+    def __init__(self, payments):
+        transfers = {}
+        for payment_id, student_id, reference, amount, payment_date in payments:
+            key = (student_id, reference, payment_date) if reference else ('payment', payment_id)
+            transfer = transfers.get(key)
+            if transfer is None:
+                if timezone.is_aware(payment_date):
+                    payment_date = timezone.localtime(payment_date)
+                transfer = transfers[key] = {
+                    'reference': reference,
+                    'amount': Decimal('0.00'),
+                    'date': payment_date.date(),
+                    'payment_ids': [],
+                }
+            transfer['amount'] += amount
+            transfer['payment_ids'].append(payment_id)
+
+        self.transfers = list(transfers.values())
+        self.by_reference_amount = defaultdict(list)
+        self.by_reference = defaultdict(list)
+        self.by_amount_suffix = defaultdict(list)
+        for number, transfer in enumerate(self.transfers):
+            reference, amount = transfer['reference'], transfer['amount']
+            if reference:
+                self.by_reference_amount[(reference, amount)].append(number)
+                self.by_reference[reference].append(number)
+                if len(reference) >= FUZZY_SUFFIX_LENGTH:
+                    self.by_amount_suffix[(amount, reference[-FUZZY_SUFFIX_LENGTH:])].append(number)
+        self.claimed = set()
+
+    def _in_window(self, number, line_date, window):
+        return abs(self.transfers[number]['date'] - line_date) <= window
+
+    def _payment_ids(self, numbers):
+        return [payment_id for number in numbers for payment_id in self.transfers[number]['payment_ids']]
+
+    def match(self, line, window):
+        """Return (outcome, payment_ids, reason) for a statement line, claiming exact matches"""
+        if line.normalized_reference:
+            for number in self.by_reference_amount.get((line.normalized_reference, line.amount), ()):
+                if number not in self.claimed and self._in_window(number, line.date, window):
+                    self.claimed.add(number)
+                    return 'exact', self._payment_ids([number]), ''
+
+            same_reference = [
+                number for number in self.by_reference.get(line.normalized_reference, ())
+                if number not in self.claimed
+            ]
+            if same_reference:
+                return 'candidate', self._payment_ids(same_reference), 'reference matches, amount or date differs'
+
+        suffix = line.normalized_reference[-FUZZY_SUFFIX_LENGTH:]
+        if len(suffix) == FUZZY_SUFFIX_LENGTH:
+            similar = [
+                number for number in self.by_amount_suffix.get((line.amount, suffix), ())
+                if number not in self.claimed and self._in_window(number, line.date, window)
+            ]
+            if similar:
+                return 'candidate', self._payment_ids(similar), 'amount and date match, reference ends the same'
+
+        return 'orphan', [], ''
+
+    def unclaimed(self):
+        return self._payment_ids(number for number in range(len(self.transfers)) if number not in self.claimed)
+
+
+def reconcile_statement(lines, provider, window_days=DEFAULT_WINDOW_DAYS):
+    """Match an iterable of StatementLine against the provider's pending payments in one pass"""
+    from .models import Payment
+
+    index = PaymentIndex(Payment.objects.filter(
+        payment_provider=provider, status='pending'
+    ).order_by('payment_date', 'pk').values_list(
+        'pk', 'student_id', 'normalized_reference', 'amount', 'payment_date'
+    ).iterator(chunk_size=5000))
+
+    window = timedelta(days=window_days)
+    result = ReconciliationResult()
+    for line in lines:
+        result.lines_read += 1
+        outcome, payment_ids, reason = index.match(line, window)
+        if outcome == 'exact':
+            result.exact.append((line, payment_ids))
+        elif outcome == 'candidate':
+            result.candidates.append((line, payment_ids, reason))
+        else:
+            result.orphans.append(line)
+    result.unmatched_payment_ids = index.unclaimed()
+    return result
+
+
+def write_report(result, fileobj):
+    """Write a CSV with one row per statement line outcome and per unmatched payment"""
+    writer = csv.writer(fileobj)
+    writer.writerow(['result', 'line', 'reference', 'amount', 'date', 'payment_ids', 'note'])
+    for line, payment_ids in result.exact:
+        writer.writerow([
+            'exact', line.line_number, line.reference, line.amount, line.date, ' '.join(map(str, payment_ids)), ''
+        ])
+    for line, payment_ids, reason in result.candidates:
+        writer.writerow([
+            'candidate', line.line_number, line.reference, line.amount, line.date,
+            ' '.join(map(str, payment_ids)), reason
+        ])
+    for line in result.orphans:
+        writer.writerow(['orphan', line.line_number, line.reference, line.amount, line.date, '', ''])
+    for payment_id in result.unmatched_payment_ids:
+        writer.writerow(['unmatched_payment', '', '', '', '', payment_id, 'no statement line'])
@@ -0,0 +1,183 @@
+"""
+Staff search over payments.
+
+Each Payment keeps a denormalized ``search_document`` holding the student
+name, university ID, sender name, sender phone and transaction reference.
+On SQLite the documents are mirrored into an FTS5 table; on PostgreSQL they
+are covered by a pg_trgm GIN index. Identifier-like queries (university IDs,
+transaction references) first try an exact-prefix match on the indexed
+columns before falling back to full-text search.
+"""
+import re
+import unicodedata
+
+from django.db import connections
+from django.db.models import Q, Value
+from django.db.models.expressions import RawSQL
+
+
+PAYMENT_FTS_TABLE = 'financial_payment_fts'
+
+IDENTIFIER_RE = re.compile(r'^(?=.*\d)[\w\-/.]{3,}$')
+
+
+def normalize_search_text(value):
+    """Casefold, strip diacritics (including Arabic harakat) and collapse whitespace"""
+    text = unicodedata.normalize('NFKD', str(value or '').casefold())
+    text = ''.join(char for char in text if unicodedata.category(char) != 'Mn')
+    return ' '.join(text.replace('\u0640', '').split())
+
+
+def normalize_reference(value):
+    """Canonical form of a transfer reference: ASCII digits, uppercase, no separators"""
+    chars = []
+    for char in str(value or ''):
+        if char.isdigit():
+            chars.append(str(unicodedata.digit(char, char)))
+        elif char.isalnum():
+            chars.append(char.upper())
+    return ''.join(chars)
+
+
+def build_payment_search_document(payment):
+    """Text indexed for a payment"""
+    student = payment.student
+    return normalize_search_text(' '.join([
+        student.first_name,
+        student.last_name,
+        student.university_id or '',
+        payment.sender_name or '',
+        payment.sender_phone or '',
+        payment.transaction_reference or '',
+    ]))
+
+
+def index_payments(payments, using='default'):
+    """Mirror payments' search documents into the FTS5 table on SQLite"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not payments:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {PAYMENT_FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(payments))})',
+            [payment.pk for payment in payments]
+        )
+        cursor.executemany(
+            f'INSERT INTO {PAYMENT_FTS_TABLE}(rowid, search_document) VALUES (%s, %s)',
+            [(payment.pk, payment.search_document) for payment in payments]
+        )
+
+
+def index_payment(payment, using='default'):
+    """Mirror one payment's search document into the FTS5 table on SQLite"""
+    index_payments([payment], using=using)
+
+
+def unindex_payment(payment_id, using='default'):
+    """Remove one payment from the FTS5 table on SQLite"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {PAYMENT_FTS_TABLE} WHERE rowid = %s', [payment_id])
+
+
+def clear_payment_index(using='default'):
+    """Drop every row from the FTS5 table on SQLite"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {PAYMENT_FTS_TABLE}')
+
+
+def rebuild_payment_index(queryset, batch_size=2000):
+    """Recompute search documents for a queryset of payments and reindex them
+
+    Returns the number of payments processed.
+    """
+    from .models import Payment
+
+    processed = 0
+    batch = []
+    for payment in queryset.select_related('student').iterator(chunk_size=batch_size):
+        payment.search_document = build_payment_search_document(payment)
+        batch.append(payment)
+        if len(batch) >= batch_size:
+            Payment.objects.bulk_update(batch, ['search_document'])
+            index_payments(batch, using=queryset.db)
+            processed += len(batch)
+            batch = []
+    if batch:
+        Payment.objects.bulk_update(batch, ['search_document'])
+        index_payments(batch, using=queryset.db)
+        processed += len(batch)
+    return processed
+
+
+def search_terms(query):
+    """Normalized terms of a query, leaving out those with no letters or digits"""
+    return [term for term in normalize_search_text(query).split() if re.search(r'\w', term)]
+
+
+def _fts_match_expression(terms):
+    """Every term must match, each as a prefix"""
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def _identifier_prefix_filter(query):
+    """Index-friendly prefix match on university ID and transaction reference"""
+    condition = Q()
+    for prefix in {query, query.upper()}:
+        upper_bound = prefix + '\U0010ffff'
+        condition |= Q(student__university_id__gte=prefix, student__university_id__lt=upper_bound)
+        condition |= Q(transaction_reference__gte=prefix, transaction_reference__lt=upper_bound)
+    return condition
+
+
+def search_payments(queryset, query):
+    """Filter a Payment queryset by a staff search string, best matches first
+
+    The result is annotated with ``search_rank`` (higher is better) and
+    ordered by it, then by newest payment.
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+
+    if IDENTIFIER_RE.match(query):
+        exact = queryset.filter(_identifier_prefix_filter(query))
+        if exact.exists():
+            return exact.annotate(search_rank=Value(1.0)).order_by('-created_at', '-id')
+
+    # A query of only tatweel, diacritics or punctuation leaves nothing to match
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        match = _fts_match_expression(terms)
+        # bm25() is lower for better matches, so negate it for a descending rank
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {PAYMENT_FTS_TABLE} WHERE {PAYMENT_FTS_TABLE} MATCH %s', [match])
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({PAYMENT_FTS_TABLE}) FROM {PAYMENT_FTS_TABLE} '
+                f'WHERE {PAYMENT_FTS_TABLE} MATCH %s AND rowid = financial_payment.id',
+                [match]
+            )
+        ).order_by('-search_rank', '-created_at', '-id')
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(search_document__contains=term)
+    queryset = queryset.filter(condition)
+
+    if vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramSimilarity
+        return queryset.annotate(
+            search_rank=TrigramSimilarity('search_document', ' '.join(terms))
+        ).order_by('-search_rank', '-created_at', '-id')
+
+    return queryset.annotate(search_rank=Value(0.0)).order_by('-created_at', '-id')
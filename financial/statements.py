@@ -0,0 +1,213 @@
+"""
+Per-student statement of account.
+
+A statement lists every fee charged to a student, every payment made against
+those fees and the running balance. The fees and their payments are loaded in
+one joined query per student. Rendered PDFs are kept in StudentStatement with
+a hash of the rows they were built from, so a statement is only rendered again
+after a fee or payment for that student changes.
+"""
+import hashlib
+import json
+from decimal import Decimal
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+from .models import StudentFee, StudentStatement
+from .receipts import get_receipt_styles
+
+
+STATEMENT_FIELDS = (
+    'pk', 'fee_type__name', 'description', 'amount', 'amount_paid', 'remaining_balance',
+    'due_date', 'status', 'payments__pk', 'payments__amount', 'payments__status',
+    'payments__payment_date', 'payments__verified_at', 'payments__transaction_reference',
+    'payments__payment_provider__name',
+)
+
+
+def load_statement_rows(student):
+    """One row per fee and payment pair; fees without payments have empty payment columns"""
+    return list(StudentFee.objects.filter(student=student).values_list(*STATEMENT_FIELDS).order_by(
+        'due_date', 'pk', 'payments__payment_date', 'payments__pk'
+    ))
+
+
+def compute_statement_hash(student, rows):
+    """Hash the student details and every row that appears on the statement"""
+    payload = json.dumps(
+        [student.university_id, student.get_full_name(), rows],
+        cls=DjangoJSONEncoder,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def build_statement(rows):
+    """Group the joined rows into fees with their payments, plus the statement totals"""
+    fees = {}
+    for (fee_pk, fee_name, description, amount, amount_paid, remaining_balance, due_date, status,
+         payment_pk, payment_amount, payment_status, payment_date, verified_at, reference, provider) in rows:
+        fee = fees.get(fee_pk)
+        if fee is None:
+            fee = fees[fee_pk] = {
+                'name': fee_name,
+                'description': description,
+                'amount': amount,
+                'amount_paid': amount_paid,
+                'remaining_balance': remaining_balance,
+                'due_date': due_date,
+                'status': status,
+                'payments': [],
+            }
+        if payment_pk is not None:
+            fee['payments'].append({
+                'amount': payment_amount,
+                'status': payment_status,
+                'date': verified_at or payment_date,
+                'reference': reference,
+                'provider': provider,
+            })
+
+    charged_fees = [fee for fee in fees.values() if fee['status'] != 'cancelled']
+    return {
+        'fees': list(fees.values()),
+        'total_charged': sum((fee['amount'] for fee in charged_fees), Decimal('0.00')),
+        'total_paid': sum((fee['amount_paid'] for fee in charged_fees), Decimal('0.00')),
+        'balance': sum((fee['remaining_balance'] for fee in charged_fees), Decimal('0.00')),
+        'pending': sum(
+            (payment['amount'] for fee in charged_fees for payment in fee['payments'] if payment['status'] == 'pending'),
+            Decimal('0.00')
+        ),
+    }
+
+
+def render_statement_pdf(student, statement):
+    """Render a statement of account and return its bytes"""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    styles = get_receipt_styles()
+    story = []
+
+    story.append(Paragraph("STATEMENT OF ACCOUNT", styles['Title']))
+    story.append(Spacer(1, 20))
+    story.append(Paragraph(
+        "<b>University Services Portal</b><br/>"
+        "Financial Services Department<br/>"
+        "123 University Avenue<br/>"
+        "University City, UC 12345",
+        styles['Normal']
+    ))
+    story.append(Spacer(1, 20))
+
+    details = Table([
+        ['Student ID:', student.university_id],
+        ['Student Name:', student.get_full_name()],
+        ['Statement Date:', timezone.localdate().strftime('%B %d, %Y')],
+    ], colWidths=[2*72, 4*72])
+    details.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ]))
+    story.append(details)
+    story.append(Spacer(1, 20))
+
+    # Ledger: each fee as a charge followed by the payments made against it
+    ledger = [['Date', 'Description', 'Charges', 'Payments', 'Balance']]
+    shaded_rows = []
+    balance = Decimal('0.00')
+    for fee in statement['fees']:
+        if fee['status'] == 'cancelled':
+            ledger.append([fee['due_date'].strftime('%Y-%m-%d'), f"{fee['name']} (cancelled)", '', '', f'${balance}'])
+            continue
+        balance += fee['amount']
+        ledger.append([fee['due_date'].strftime('%Y-%m-%d'), fee['name'], f"${fee['amount']}", '', f'${balance}'])
+        for payment in fee['payments']:
+            description = f"{payment['provider']} {payment['reference'] or ''}".strip()
+            if payment['status'] == 'verified':
+                balance -= payment['amount']
+                ledger.append([payment['date'].strftime('%Y-%m-%d'), description, '', f"${payment['amount']}", f'${balance}'])
+            else:
+                # Pending and rejected transfers are listed but do not change the balance
+                shaded_rows.append(len(ledger))
+                ledger.append([
+                    payment['date'].strftime('%Y-%m-%d'),
+                    f"{description} ({payment['status']})",
+                    '', f"(${payment['amount']})", f'${balance}'
+                ])
+
+    ledger_table = Table(ledger, colWidths=[1*72, 2.75*72, 1*72, 1*72, 1*72], repeatRows=1)
+    ledger_style = [
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+    ]
+    for row in shaded_rows:
+        ledger_style.append(('TEXTCOLOR', (0, row), (-1, row), colors.grey))
+    ledger_table.setStyle(TableStyle(ledger_style))
+    story.append(ledger_table)
+    story.append(Spacer(1, 20))
+
+    summary = Table([
+        ['Total Charged:', f"${statement['total_charged']}"],
+        ['Total Paid:', f"${statement['total_paid']}"],
+        ['Pending Verification:', f"${statement['pending']}"],
+        ['Balance Due:', f"${statement['balance']}"],
+    ], colWidths=[2*72, 1.5*72])
+    summary.setStyle(TableStyle([
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black),
+    ]))
+    story.append(summary)
+    story.append(Spacer(1, 30))
+    story.append(Paragraph(
+        "<i>Payments shown in brackets are awaiting verification or were rejected "
+        "and are not included in the balance.</i>",
+        styles['Normal']
+    ))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def attach_statement_pdf(statement, pdf_content, content_hash):
+    """Write rendered content to storage and point the statement at it, without saving the row"""
+    if statement.statement_file:
+        statement.statement_file.delete(save=False)
+    statement.statement_file.save(
+        f"statement_{statement.student.university_id}.pdf",
+        ContentFile(pdf_content),
+        save=False
+    )
+    statement.content_hash = content_hash
+
+
+def get_current_statement(student):
+    """Return the stored statement if it still matches the student's fees and payments, else None"""
+    content_hash = compute_statement_hash(student, load_statement_rows(student))
+    statement = StudentStatement.objects.filter(student=student).first()
+    if statement is not None and statement.is_current(content_hash):
+        return statement
+    return None
+
+
+def generate_statement(student):
+    """Render and store the student's statement unless the stored one is still current"""
+    rows = load_statement_rows(student)
+    content_hash = compute_statement_hash(student, rows)
+    statement, created = StudentStatement.objects.get_or_create(student=student)
+    if not statement.is_current(content_hash):
+        attach_statement_pdf(statement, render_statement_pdf(student, build_statement(rows)), content_hash)
+        statement.save(update_fields=['statement_file', 'content_hash', 'generated_at'])
+    return statement
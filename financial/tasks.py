@@ -0,0 +1,63 @@
+"""
+Background jobs for the financial app.
+
+Jobs run on a small in-process thread pool once the surrounding transaction
+commits. The matching management commands process the same jobs from cron
+or a worker shell when the web process is not the right place to run them.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='financial-tasks')
+
+# Students whose statement is queued or rendering, so repeated requests queue it once
+_pending_statements = set()
+_pending_statements_lock = threading.Lock()
+
+
+def run_fee_assignment(assignment_id, batch_size=1000):
+    """Create the missing fees for a FeeAssignment"""
+    from .models import FeeAssignment
+
+    try:
+        assignment = FeeAssignment.objects.get(pk=assignment_id)
+        if not assignment.run(batch_size=batch_size):
+            logger.info(f"Fee assignment {assignment_id} is already running")
+    except Exception:
+        logger.exception(f"Fee assignment {assignment_id} failed")
+    finally:
+        connection.close()
+
+
+def enqueue_fee_assignment(assignment_id):
+    """Run a fee assignment in the background after the current transaction commits"""
+    transaction.on_commit(lambda: _executor.submit(run_fee_assignment, assignment_id))
+
+
+def run_statement_generation(student_id):
+    """Render a student's statement of account if it is out of date"""
+    from accounts.models import User
+    from .statements import generate_statement
+
+    try:
+        generate_statement(User.objects.get(pk=student_id))
+    except Exception:
+        logger.exception(f"Statement generation for student {student_id} failed")
+    finally:
+        with _pending_statements_lock:
+            _pending_statements.discard(student_id)
+        connection.close()
+
+
+def enqueue_statement(student_id):
+    """Render a student's statement in the background unless it is already queued"""
+    with _pending_statements_lock:
+        if student_id in _pending_statements:
+            return
+        _pending_statements.add(student_id)
+    _executor.submit(run_statement_generation, student_id)
@@ -12,6 +12,7 @@ urlpatterns = [
     # Receipt Management (Web Interface)
     path('receipt/<int:payment_id>/', views.view_receipt, name='view_receipt'),
     path('receipt/<int:payment_id>/download/', views.download_receipt, name='download_receipt'),
+    path('statement/download/', views.download_statement, name='download_statement'),
     
     # API Endpoints for Mobile App
     path('api/', include('financial.financial_api.urls')),
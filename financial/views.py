@@ -5,16 +5,14 @@ from django.views.generic import TemplateView
 from django.contrib import messages
 from django.db.models import Sum, Q
 from django.utils import timezone
-from django.http import HttpResponse, Http404
+from django.http import Http404
 from decimal import Decimal
 from .models import StudentFee, Payment, PaymentProvider, PaymentReceipt
-import uuid
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from io import BytesIO
+from .allocation import AllocationError, submit_payment
+from .proofs import ProofImageError, process_proof_image
+from .receipts import get_or_render_receipt, receipt_file_response, stored_pdf_response
+from .statements import get_current_statement
+from .tasks import enqueue_statement
 
 
 class FinancialDashboardView(LoginRequiredMixin, TemplateView):
@@ -33,7 +31,9 @@ class FinancialDashboardView(LoginRequiredMixin, TemplateView):
         
         # Calculate pending payments (fees that are not fully paid)
         pending_fees = student_fees.exclude(status='paid')
-        pending_payments = sum(fee.remaining_balance for fee in pending_fees)
+        pending_payments = pending_fees.aggregate(
+            total=Sum('remaining_balance')
+        )['total'] or Decimal('0.00')
         
         # Calculate paid this semester (current year)
         current_year = timezone.now().year
@@ -62,7 +62,7 @@ class FinancialDashboardView(LoginRequiredMixin, TemplateView):
         
         # Get fee breakdown for current academic year
         fee_breakdown = []
-        for fee in student_fees.filter(created_at__year=current_year):
+        for fee in student_fees.filter(created_at__year=current_year).select_related('fee_type'):
             fee_breakdown.append({
                 'name': fee.fee_type.name,
                 'amount': fee.amount,
@@ -78,7 +78,7 @@ class FinancialDashboardView(LoginRequiredMixin, TemplateView):
             'paid_this_semester': paid_this_semester,
             'recent_transactions': formatted_transactions,
             'fee_breakdown': fee_breakdown,
-            'overdue_count': pending_fees.filter(due_date__lt=timezone.now().date()).count(),
+            'overdue_count': pending_fees.filter(status='overdue').count(),
         })
         
         return context
@@ -95,10 +95,12 @@ class PayFeesView(LoginRequiredMixin, TemplateView):
         # Get outstanding fees
         outstanding_fees_qs = StudentFee.objects.filter(
             student=user
-        ).exclude(status='paid')
+        ).exclude(status='paid').select_related('fee_type')
         
         # Calculate total outstanding amount
-        outstanding_amount = sum(fee.remaining_balance for fee in outstanding_fees_qs)
+        outstanding_amount = outstanding_fees_qs.aggregate(
+            total=Sum('remaining_balance')
+        )['total'] or Decimal('0.00')
         
         # Get fee breakdown
         fee_breakdown = []
@@ -176,50 +178,32 @@ class PayFeesView(LoginRequiredMixin, TemplateView):
                 messages.info(request, 'You have no outstanding fees to pay.')
                 return redirect('financial:dashboard')
             
-            # Calculate total amount for selected fees
-            selected_fee_objects = StudentFee.objects.filter(id__in=selected_fees, student=user)
-            total_selected_amount = sum(fee.remaining_balance for fee in selected_fee_objects)
+            # Compress the transfer screenshot once, before any fee locks are taken
+            proof = None
+            if request.FILES.get('proof_image'):
+                try:
+                    proof = process_proof_image(request.FILES['proof_image'])
+                except ProofImageError as e:
+                    messages.error(request, str(e))
+                    return redirect('financial:pay_fees')
             
-            # Validate that payment amount doesn't exceed selected fees total
-            if amount > total_selected_amount:
-                messages.error(request, f'Payment amount (${amount}) cannot exceed the total of selected fees (${total_selected_amount}).')
+            # Lock the selected fees, allocate the amount by due date and create the payments together
+            try:
+                payments = submit_payment(
+                    user,
+                    payment_provider,
+                    selected_fees,
+                    amount=amount,
+                    transaction_reference=transaction_reference,
+                    sender_name=sender_name,
+                    sender_phone=sender_phone,
+                    transfer_notes=transfer_notes,
+                    proof=proof
+                )
+            except AllocationError as e:
+                messages.error(request, e.message)
                 return redirect('financial:pay_fees')
-            
-            # Create payment records for selected fees
-            payment_ids = []
-            remaining_payment = amount
-            
-            for fee_id in selected_fees:
-                try:
-                    fee = StudentFee.objects.get(id=fee_id, student=user)
-                    
-                    # Calculate how much to allocate to this fee
-                    fee_remaining = fee.remaining_balance
-                    payment_for_this_fee = min(remaining_payment, fee_remaining)
-                    
-                    if payment_for_this_fee > 0:
-                        # Create payment record with the allocated amount
-                        payment = Payment.objects.create(
-                            student=user,
-                            fee=fee,
-                            payment_provider=payment_provider,
-                            amount=payment_for_this_fee,  # Use the allocated amount
-                            transaction_reference=transaction_reference,
-                            payment_date=timezone.now(),
-                            status='pending',
-                            sender_name=sender_name,
-                            sender_phone=sender_phone,
-                            transfer_notes=transfer_notes
-                        )
-                        payment_ids.append(payment.id)
-                        remaining_payment -= payment_for_this_fee
-                        
-                        # Stop if we've allocated all the payment amount
-                        if remaining_payment <= 0:
-                            break
-                            
-                except StudentFee.DoesNotExist:
-                    continue
+            payment_ids = [payment.id for payment in payments]
             
             if payment_ids:
                 messages.success(request, f'Payment(s) submitted successfully. Payment IDs: {", ".join(map(str, payment_ids))}')
@@ -311,89 +295,40 @@ def view_receipt(request, payment_id):
 
 
 @login_required
-def generate_receipt_pdf(payment, user):
-    """Generate PDF receipt for a payment"""
-    # Get or create receipt
-    receipt, created = PaymentReceipt.objects.get_or_create(
-        payment=payment,
-        defaults={
-            'generated_by': user
-        }
-    )
-    
-    # Create PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-    
-    # Header
-    title = Paragraph("PAYMENT RECEIPT", styles['Title'])
-    story.append(title)
-    story.append(Spacer(1, 20))
-    
-    # University Info
-    university_info = Paragraph(
-        "<b>University Services Portal</b><br/>"
-        "Financial Services Department<br/>"
-        "123 University Avenue<br/>"
-        "University City, UC 12345",
-        styles['Normal']
+def download_receipt(request, payment_id):
+    """Download payment receipt as PDF"""
+    payment = get_object_or_404(
+        Payment.objects.select_related('student', 'fee__fee_type', 'payment_provider'),
+        id=payment_id,
+        student=request.user,
+        status='verified'
     )
-    story.append(university_info)
-    story.append(Spacer(1, 20))
-    
-    # Receipt Details
-    receipt_data = [
-        ['Receipt Number:', receipt.receipt_number],
-        ['Date:', payment.payment_date.strftime('%B %d, %Y')],
-        ['Student ID:', payment.student.university_id],
-        ['Student Name:', payment.student.get_full_name()],
-        ['Fee Type:', payment.fee.fee_type.name],
-        ['Amount Paid:', f'${payment.amount}'],
-        ['Payment Method:', payment.payment_provider.name],
-        ['Transaction Reference:', payment.transaction_reference or 'N/A'],
-        ['Status:', 'Verified'],
-    ]
-    
-    receipt_table = Table(receipt_data, colWidths=[2*72, 3*72])
-    receipt_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightgrey),
-    ]))
     
-    story.append(receipt_table)
-    story.append(Spacer(1, 30))
+    # Reuse the stored PDF unless the payment changed since it was rendered
+    receipt = get_or_render_receipt(payment, request.user)
     
-    # Footer
-    footer = Paragraph(
-        "<i>This is an official receipt for payment made to the University Services Portal. "
-        "Please keep this receipt for your records.</i>",
-        styles['Normal']
+    return receipt_file_response(
+        request,
+        receipt,
+        f"receipt_{receipt.receipt_number}.pdf",
+        as_attachment=True
     )
-    story.append(footer)
-    
-    # Build PDF
-    doc.build(story)
-    buffer.seek(0)
-    
-    return buffer, receipt
 
 
-def download_receipt(request, payment_id):
-    """Download payment receipt as PDF"""
-    payment = get_object_or_404(Payment, id=payment_id, student=request.user, status='verified')
-    
-    # Generate PDF using the helper function
-    buffer, receipt = generate_receipt_pdf(payment, request.user)
-    
-    # Return PDF response
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="receipt_{receipt.receipt_number}.pdf"'
+@login_required
+def download_statement(request):
+    """Download the student's statement of account as PDF"""
+    statement = get_current_statement(request.user)
+    if statement is None:
+        # Rendered in the background; the stored file is reused until a fee or payment changes
+        enqueue_statement(request.user.pk)
+        messages.info(request, 'جاري إعداد كشف الحساب، يرجى المحاولة مرة أخرى بعد لحظات.')
+        return redirect('financial:dashboard')
     
-    return response
+    return stored_pdf_response(
+        request,
+        statement.statement_file,
+        statement.content_hash,
+        f"statement_{request.user.university_id}.pdf",
+        as_attachment=True
+    )
@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from univ_services import counters
 
 
 class Notification(models.Model):
@@ -151,9 +152,8 @@ class Announcement(models.Model):
         return self.title
     
     def increment_view_count(self):
-        """Increment view count"""
-        self.view_count += 1
-        self.save(update_fields=['view_count'])
+        """Increment view count, coalesced with other views into one periodic write"""
+        counters.increment(self, 'view_count')
     
     @property
     def is_published(self):
@@ -245,6 +245,21 @@ class StaffActivity(models.Model):
     def __str__(self):
         return f"{self.staff_member.get_full_name()} - {self.get_activity_type_display()}"
 
+    @classmethod
+    def log_payment_decisions(cls, staff_member, payments, activity_type):
+        """تسجيل نشاط لكل دفعة تمت معالجتها جماعياً باستعلام إدراج واحد"""
+        verb = 'Verified' if activity_type == 'payment_verified' else 'Rejected'
+        return cls.objects.bulk_create([
+            cls(
+                staff_member=staff_member,
+                activity_type=activity_type,
+                description=f'{verb} payment of ${payment.amount} for {payment.student.get_full_name()}',
+                target_user=payment.student,
+                metadata={'payment_id': payment.pk, 'bulk': True}
+            )
+            for payment in payments
+        ])
+
 
 class WorkflowTemplate(models.Model):
     """قوالب سير العمل الشائعة للموظفين"""
@@ -0,0 +1,178 @@
+"""
+Keyset (cursor) pagination for staff panel tables.
+
+Pages are addressed by the sort key of the last (or first) row shown rather
+than by an OFFSET, so every page costs one indexed range scan and no
+COUNT(*), however deep staff page. The sort must end in a unique column
+such as ``id``, and every sort column must be non-null. An optional total
+comes from the PostgreSQL planner estimate; other databases count exactly
+and cache the result for a short while.
+"""
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Q
+
+
+# Seconds an exact count is reused on databases without planner estimates
+COUNT_CACHE_TIMEOUT = 60
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """One page of results with the cursors needed to move around it"""
+
+    def __init__(self, object_list, next_cursor, previous_cursor, params, estimated_total=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.estimated_total = estimated_total
+        self._params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _querystring(self, cursor):
+        params = self._params.copy()
+        params.pop('page', None)
+        params['cursor'] = cursor
+        return params.urlencode()
+
+    @property
+    def next_querystring(self):
+        return self._querystring(self.next_cursor) if self.has_next else ''
+
+    @property
+    def previous_querystring(self):
+        return self._querystring(self.previous_cursor) if self.has_previous else ''
+
+
+class KeysetPaginator:
+    """Paginate a queryset on a fixed ordering such as ('-created_at', '-id')"""
+
+    def __init__(self, queryset, ordering, per_page=20):
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.descending = self.ordering[0].startswith('-')
+        if any(field.startswith('-') != self.descending for field in self.ordering):
+            raise ValueError('All keyset ordering fields must share one direction')
+        self.field_names = [field.lstrip('-') for field in self.ordering]
+        self.fields = [queryset.model._meta.get_field(name) for name in self.field_names]
+
+    def encode_cursor(self, obj, direction):
+        values = [field.value_to_string(obj) for field in self.fields]
+        payload = json.dumps([direction, values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            if direction not in ('next', 'previous') or len(values) != len(self.fields):
+                raise InvalidCursor(cursor)
+            return direction, [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (ValueError, TypeError, UnicodeError) as e:
+            raise InvalidCursor(cursor) from e
+
+    def _after(self, values, forward):
+        """Rows strictly after the key in the given walking direction"""
+        # Walking forward through a descending sort means moving to smaller keys
+        lookup = 'lt' if forward == self.descending else 'gt'
+        condition = Q()
+        for i, name in enumerate(self.field_names):
+            step = Q(**{f'{name}__{lookup}': values[i]})
+            for prior, value in zip(self.field_names[:i], values[:i]):
+                step &= Q(**{prior: value})
+            condition |= step
+        return condition
+
+    def estimate_count(self):
+        """Cheap row estimate from the query planner, or a briefly cached exact count elsewhere
+
+        Without planner statistics the COUNT(*) runs at most once per
+        COUNT_CACHE_TIMEOUT for the same filtered query, not on every page.
+        """
+        connection = connections[self.queryset.db]
+        sql, params = self.queryset.order_by().query.sql_with_params()
+        if connection.vendor != 'postgresql':
+            digest = hashlib.sha256(f'{self.queryset.db}:{sql}:{params!r}'.encode('utf-8')).hexdigest()
+            cache_key = f'keyset_count:{digest}'
+            total = cache.get(cache_key)
+            if total is None:
+                total = self.queryset.count()
+                cache.set(cache_key, total, COUNT_CACHE_TIMEOUT)
+            return total
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']['Plan Rows']
+
+    def get_page(self, params, estimate_total=False):
+        """Return the page addressed by the ``cursor`` parameter in params (a QueryDict)"""
+        direction, values = 'next', None
+        cursor = params.get('cursor')
+        if cursor:
+            try:
+                direction, values = self.decode_cursor(cursor)
+            except InvalidCursor:
+                direction, values = 'next', None
+
+        forward = direction == 'next'
+        queryset = self.queryset
+        if values is not None:
+            queryset = queryset.filter(self._after(values, forward))
+        if forward:
+            queryset = queryset.order_by(*self.ordering)
+        else:
+            queryset = queryset.order_by(*[
+                name if self.descending else f'-{name}' for name in self.field_names
+            ])
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not forward:
+            rows.reverse()
+
+        # A cursor means we arrived from a neighbouring page in the opposite direction
+        if forward:
+            has_next, has_previous = has_more, values is not None
+        else:
+            has_next, has_previous = values is not None, has_more
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_next:
+                next_cursor = self.encode_cursor(rows[-1], 'next')
+            if has_previous:
+                previous_cursor = self.encode_cursor(rows[0], 'previous')
+
+        estimated_total = self.estimate_count() if estimate_total else None
+        return KeysetPage(rows, next_cursor, previous_cursor, params, estimated_total)
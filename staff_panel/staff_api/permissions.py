@@ -0,0 +1,15 @@
+from rest_framework import permissions
+
+
+class IsStaffUser(permissions.BasePermission):
+    """
+    Permission to only allow staff and admins to access staff APIs
+    """
+    message = "Only staff members can access this resource."
+    
+    def has_permission(self, request, view):
+        return (
+            request.user and 
+            request.user.is_authenticated and 
+            request.user.is_staff_member
+        )
@@ -1,9 +1,11 @@
 from django.urls import path
-from .views import staff_dashboard
+from .views import staff_dashboard, cash_flow_projection, cash_flow_projection_export
 
 app_name = 'staff_api'
 
 urlpatterns = [
     path('dashboard/', staff_dashboard, name='staff_dashboard'),
+    path('cash-flow/', cash_flow_projection, name='cash_flow_projection'),
+    path('cash-flow/export/', cash_flow_projection_export, name='cash_flow_projection_export'),
     # Add more staff API endpoints here
 ]
\ No newline at end of file
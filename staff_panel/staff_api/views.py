@@ -2,7 +2,10 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.http import HttpResponse
 from .serializers import *
+from .permissions import IsStaffUser
+import csv
 import logging
 
 logger = logging.getLogger(__name__)
@@ -18,4 +21,51 @@ def staff_dashboard(request):
     return Response({
         'success': True,
         'message': 'Staff dashboard endpoint - to be implemented'
-    }, status=status.HTTP_200_OK)
\ No newline at end of file
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsStaffUser])
+def cash_flow_projection(request):
+    """Expected weekly inflow from outstanding fees with confidence bands"""
+    from financial.projection import DEFAULT_WEEKS, MAX_WEEKS, project_cash_flow
+    
+    try:
+        weeks = int(request.query_params.get('weeks', DEFAULT_WEEKS))
+    except ValueError:
+        return Response({'error': 'weeks must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= weeks <= MAX_WEEKS:
+        return Response({'error': f'weeks must be between 1 and {MAX_WEEKS}'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        projection = project_cash_flow(weeks)
+    except Exception as e:
+        logger.error(f"Error projecting cash flow: {str(e)}")
+        return Response({'error': 'Failed to project cash flow'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return Response({
+        'success': True,
+        'weeks': weeks,
+        'total_expected': round(sum(week['expected'] for week in projection), 2),
+        'projection': projection,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsStaffUser])
+def cash_flow_projection_export(request):
+    """The cash-flow projection as a CSV download"""
+    from financial.projection import DEFAULT_WEEKS, MAX_WEEKS, project_cash_flow
+    
+    try:
+        weeks = max(1, min(int(request.query_params.get('weeks', DEFAULT_WEEKS)), MAX_WEEKS))
+    except ValueError:
+        weeks = DEFAULT_WEEKS
+    
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="cash_flow_projection_{weeks}w.csv"'
+    writer = csv.writer(response)
+    writer.writerow(['Week Start', 'Expected', 'Lower Bound', 'Upper Bound', 'Cumulative Expected'])
+    for week in project_cash_flow(weeks):
+        writer.writerow([week['week_start'], week['expected'], week['lower'], week['upper'], week['cumulative']])
+    return response
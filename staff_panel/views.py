@@ -86,16 +86,20 @@ class RequestManagementView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         from student_portal.models import ServiceRequest
+        from .pagination import KeysetPaginator
         
         # Get all requests with filters
         status_filter = self.request.GET.get('status', 'all')
-        requests = ServiceRequest.objects.select_related('student').order_by('-created_at')
+        requests = ServiceRequest.objects.select_related('student')
         
         if status_filter != 'all':
             requests = requests.filter(status=status_filter)
+        
+        # Keyset pagination keeps older requests reachable at constant cost
+        requests_page = KeysetPaginator(requests, ('-created_at', '-id'), per_page=50).get_page(self.request.GET)
             
         context.update({
-            'requests': requests[:50],  # Limit to 50 for performance
+            'requests': requests_page,
             'status_filter': status_filter,
             'status_choices': ServiceRequest.STATUS_CHOICES,
         })
@@ -192,32 +196,32 @@ class FinancialManagementView(LoginRequiredMixin, TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        from financial.models import Payment, StudentFee, FeeType
+        from financial.models import Payment, StudentFee, FeeType, DailyFinancialRollup
         from accounts.models import User
         from decimal import Decimal
         from datetime import datetime, timedelta
-        from django.db.models import Sum
+        from django.db.models import Sum, Count
         from django.utils import timezone
         
+        today = timezone.localdate()
+        week_start = today - timedelta(days=6)
+        
         # Financial statistics
-        total_revenue = Payment.objects.filter(status='verified').aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
+        revenue = DailyFinancialRollup.objects.aggregate(
+            total=Sum('verified_amount'),
+            today_total=Sum('verified_amount', filter=Q(date=today)),
+            today_count=Sum('verified_count', filter=Q(date=today)),
+        )
+        total_revenue = revenue['total'] or Decimal('0.00')
+        revenue_today = revenue['today_total'] or Decimal('0.00')
+        verified_today = revenue['today_count'] or 0
         
-        pending_payments_count = Payment.objects.filter(status='pending').count()
-        pending_payments_amount = Payment.objects.filter(status='pending').aggregate(
+        pending = Payment.objects.filter(status='pending').aggregate(
+            count=Count('id'),
             total=Sum('amount')
-        )['total'] or Decimal('0.00')
-        
-        verified_today = Payment.objects.filter(
-            status='verified',
-            verified_at__date=timezone.now().date()
-        ).count()
-        
-        revenue_today = Payment.objects.filter(
-            status='verified',
-            verified_at__date=timezone.now().date()
-        ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+        )
+        pending_payments_count = pending['count']
+        pending_payments_amount = pending['total'] or Decimal('0.00')
         
         # Outstanding fees
         outstanding_fees = StudentFee.objects.exclude(status='paid').aggregate(
@@ -230,48 +234,45 @@ class FinancialManagementView(LoginRequiredMixin, TemplateView):
         ).select_related('student', 'fee', 'fee__fee_type').order_by('-verified_at')[:10]
         
         # Payment trends (last 7 days)
-        payment_trends = []
-        daily_amounts = []
-        
-        # First pass: collect all amounts
-        for i in range(7):
-            date = timezone.now().date() - timedelta(days=i)
-            daily_revenue = Payment.objects.filter(
-                status='verified',
-                verified_at__date=date
-            ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-            daily_amounts.append(float(daily_revenue))
+        daily_totals = dict(
+            DailyFinancialRollup.objects.filter(
+                date__range=(week_start, today)
+            ).values('date').annotate(
+                total=Sum('verified_amount')
+            ).order_by().values_list('date', 'total')
+        )
+        trend_dates = [week_start + timedelta(days=i) for i in range(7)]
+        daily_amounts = [float(daily_totals.get(date) or 0) for date in trend_dates]
         
         # Calculate max for percentage calculation
         max_amount = max(daily_amounts) if daily_amounts and max(daily_amounts) > 0 else 1
         
-        # Second pass: create trends with percentages
-        for i in range(7):
-            date = timezone.now().date() - timedelta(days=i)
-            amount = daily_amounts[i]
-            percentage = (amount / max_amount) * 100 if max_amount > 0 else 0
-            
-            payment_trends.append({
+        payment_trends = [
+            {
                 'date': date.strftime('%m/%d'),
                 'amount': amount,
-                'percentage': round(percentage, 1)
-            })
-        payment_trends.reverse()
+                'percentage': round((amount / max_amount) * 100, 1)
+            }
+            for date, amount in zip(trend_dates, daily_amounts)
+        ]
         
         # Fee type breakdown
         fee_breakdown = []
         fee_types = FeeType.objects.all()
         colors = ['#3B82F6', '#10B981', '#F59E0B', '#EF4444', '#8B5CF6', '#06B6D4']  # Blue, Green, Yellow, Red, Purple, Cyan
+        type_totals = {
+            row['fee_type']: row
+            for row in DailyFinancialRollup.objects.values('fee_type').annotate(
+                total=Sum('fees_issued_amount'),
+                paid=Sum('verified_amount'),
+                count=Sum('fees_issued_count')
+            ).order_by()
+        }
         
         for i, fee_type in enumerate(fee_types):
-            total_fees = StudentFee.objects.filter(fee_type=fee_type).aggregate(
-                total=Sum('amount')
-            )['total'] or Decimal('0.00')
-            paid_fees = Payment.objects.filter(
-                fee__fee_type=fee_type,
-                status='verified'
-            ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-            fee_count = StudentFee.objects.filter(fee_type=fee_type).count()
+            totals = type_totals.get(fee_type.pk, {})
+            total_fees = totals.get('total') or Decimal('0.00')
+            paid_fees = totals.get('paid') or Decimal('0.00')
             
             fee_breakdown.append({
                 'type': fee_type.name,
@@ -279,7 +280,7 @@ class FinancialManagementView(LoginRequiredMixin, TemplateView):
                 'total': total_fees,
                 'paid': paid_fees,
                 'outstanding': total_fees - paid_fees,
-                'count': fee_count,
+                'count': totals.get('count') or 0,
                 'color': colors[i % len(colors)]
             })
         
@@ -305,6 +306,13 @@ class FinancialManagementView(LoginRequiredMixin, TemplateView):
         return context
 
 
+# Maximum number of ranked matches shown for a payment search
+PAYMENT_SEARCH_LIMIT = 50
+
+# Maximum number of payments listed in the possible duplicates view
+PAYMENT_DUPLICATES_LIMIT = 200
+
+
 class PaymentVerificationView(LoginRequiredMixin, TemplateView):
     """Verify student payments"""
     template_name = 'staff_panel/payment_verification.html'
@@ -312,7 +320,8 @@ class PaymentVerificationView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         from financial.models import Payment, PaymentProvider, FeeType
-        from django.core.paginator import Paginator
+        from financial.search import search_payments
+        from .pagination import KeysetPage, KeysetPaginator
         from datetime import datetime
         
         # Get filter parameters
@@ -337,21 +346,11 @@ class PaymentVerificationView(LoginRequiredMixin, TemplateView):
             payments = payments.filter(status='verified')
         elif status_filter == 'rejected':
             payments = payments.filter(status='rejected')
+        elif status_filter == 'duplicates':
+            pass  # Grouped below across pending and verified payments
         else:
             payments = payments.filter(status='pending')  # Default to pending
         
-        # Apply search filter
-        if search_query:
-            payments = payments.filter(
-                Q(student__first_name__icontains=search_query) |
-                Q(student__last_name__icontains=search_query) |
-                Q(student__university_id__icontains=search_query) |
-                Q(fee__fee_type__name__icontains=search_query) |
-                Q(payment_provider__name__icontains=search_query) |
-                Q(sender_name__icontains=search_query) |
-                Q(transaction_reference__icontains=search_query)
-            )
-        
         # Apply payment method filter
         if payment_method_filter:
             payments = payments.filter(payment_provider__id=payment_method_filter)
@@ -375,13 +374,19 @@ class PaymentVerificationView(LoginRequiredMixin, TemplateView):
             except ValueError:
                 pass
         
-        # Order by creation date
-        payments = payments.order_by('-created_at')
-        
-        # Pagination
-        paginator = Paginator(payments, 15)  # 15 payments per page
-        page_number = self.request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
+        if status_filter == 'duplicates':
+            # Payments reusing a transfer reference, listed group by group
+            rows = list(Payment.possible_duplicates(payments)[:PAYMENT_DUPLICATES_LIMIT])
+            page_obj = KeysetPage(rows, None, None, self.request.GET, estimated_total=len(rows))
+        elif search_query.strip():
+            # Ranked search results are shown as a single page of the best matches
+            rows = list(search_payments(payments, search_query)[:PAYMENT_SEARCH_LIMIT])
+            page_obj = KeysetPage(rows, None, None, self.request.GET, estimated_total=len(rows))
+        else:
+            # Keyset pagination by creation date
+            page_obj = KeysetPaginator(payments, ('-created_at', '-id'), per_page=15).get_page(
+                self.request.GET, estimate_total=True
+            )
         
         # Get filter options for dropdowns
         payment_providers = PaymentProvider.objects.filter(is_active=True).order_by('name')
@@ -395,7 +400,7 @@ class PaymentVerificationView(LoginRequiredMixin, TemplateView):
             'date_from': date_from,
             'date_to': date_to,
             'fee_type_filter': fee_type_filter,
-            'total_payments': paginator.count,
+            'total_payments': page_obj.estimated_total,
             'payment_providers': payment_providers,
             'fee_types': fee_types,
         })
@@ -405,6 +410,8 @@ class PaymentVerificationView(LoginRequiredMixin, TemplateView):
 @login_required
 def verify_payment(request, payment_id):
     """Verify a payment via AJAX"""
+    if not request.user.is_staff_member:
+        return JsonResponse({'status': 'error', 'message': 'الوصول مرفوض'}, status=403)
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'طريقة طلب غير صحيحة'})
     
@@ -433,7 +440,12 @@ def verify_payment(request, payment_id):
                 })
         
         # Verify the payment
-        payment.verify_payment(request.user, "Verified by staff")
+        if not payment.verify_payment(request.user, "Verified by staff"):
+            # Another staff member decided it between the check above and the lock
+            return JsonResponse({
+                'status': 'error',
+                'message': f'تمت معالجة الدفعة #{payment_id} بالفعل من قبل موظف آخر.'
+            })
         
         # Log staff activity
         StaffActivity.objects.create(
@@ -455,6 +467,8 @@ def verify_payment(request, payment_id):
 @login_required
 def reject_payment(request, payment_id):
     """Reject a payment via AJAX"""
+    if not request.user.is_staff_member:
+        return JsonResponse({'status': 'error', 'message': 'الوصول مرفوض'}, status=403)
     if request.method != 'POST':
         return JsonResponse({'status': 'error', 'message': 'طريقة طلب غير صحيحة'})
     
@@ -488,7 +502,12 @@ def reject_payment(request, payment_id):
         reason = data.get('reason', 'Rejected by staff')
         
         # Reject the payment
-        payment.reject_payment(request.user, reason)
+        if not payment.reject_payment(request.user, reason):
+            # Another staff member decided it between the check above and the lock
+            return JsonResponse({
+                'status': 'error',
+                'message': f'تمت معالجة الدفعة #{payment_id} بالفعل من قبل موظف آخر.'
+            })
         
         # Log staff activity
         StaffActivity.objects.create(
@@ -507,6 +526,63 @@ def reject_payment(request, payment_id):
         return JsonResponse({'status': 'error', 'message': f'خطأ في رفض الدفعة: {str(e)}'})
 
 
+BULK_PAYMENT_LIMIT = 1000
+
+
+@login_required
+def bulk_process_payments(request):
+    """Verify or reject many payments in one AJAX call"""
+    if not request.user.is_staff_member:
+        return JsonResponse({'status': 'error', 'message': 'الوصول مرفوض'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'status': 'error', 'message': 'طريقة طلب غير صحيحة'})
+    
+    try:
+        from financial.models import Payment
+        from .models import StaffActivity
+        import json
+        
+        data = json.loads(request.body) if request.body else {}
+        action = data.get('action')
+        if action not in ('verify', 'reject'):
+            return JsonResponse({'status': 'error', 'message': 'الإجراء يجب أن يكون verify أو reject'})
+        
+        try:
+            payment_ids = sorted({int(payment_id) for payment_id in data.get('payment_ids', [])})
+        except (TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'message': 'معرفات الدفعات غير صالحة'})
+        if not payment_ids:
+            return JsonResponse({'status': 'error', 'message': 'لم يتم تحديد أي دفعات'})
+        if len(payment_ids) > BULK_PAYMENT_LIMIT:
+            return JsonResponse({
+                'status': 'error',
+                'message': f'لا يمكن معالجة أكثر من {BULK_PAYMENT_LIMIT} دفعة في الطلب الواحد'
+            })
+        
+        if action == 'verify':
+            payments = Payment.bulk_verify(payment_ids, request.user, data.get('notes', 'Verified by staff'))
+            activity_type = 'payment_verified'
+            message = f'تم التحقق من {len(payments)} دفعة بنجاح'
+        else:
+            payments = Payment.bulk_reject(payment_ids, request.user, data.get('reason', 'Rejected by staff'))
+            activity_type = 'payment_rejected'
+            message = f'تم رفض {len(payments)} دفعة بنجاح'
+        
+        StaffActivity.log_payment_decisions(request.user, payments, activity_type)
+        
+        processed_ids = [payment.pk for payment in payments]
+        processed = set(processed_ids)
+        return JsonResponse({
+            'status': 'success',
+            'message': message,
+            'processed': processed_ids,
+            'skipped': [payment_id for payment_id in payment_ids if payment_id not in processed]
+        })
+        
+    except Exception as e:
+        return JsonResponse({'status': 'error', 'message': f'خطأ في معالجة الدفعات: {str(e)}'})
+
+
 @login_required
 def get_payment_details(request, payment_id):
     """Get payment details via AJAX"""
@@ -531,6 +607,7 @@ def get_payment_details(request, payment_id):
                 'verification_notes': payment.verification_notes or '',
                 'verified_by': payment.verified_by.get_full_name() if payment.verified_by else None,
                 'verified_at': payment.verified_at.strftime('%B %d, %Y at %I:%M %p') if payment.verified_at else None,
+                'proof_image': payment.proof_image.url if payment.proof_image else None,
             }
         })
         
@@ -566,7 +643,7 @@ class PendingPaymentsView(LoginRequiredMixin, TemplateView):
         today = timezone.now().date()
         due_soon_threshold = today + timedelta(days=7)  # Due within 7 days
         
-        overdue_count = pending_fees.filter(due_date__lt=today).count()
+        overdue_count = pending_fees.filter(status='overdue').count()
         due_soon_count = pending_fees.filter(
             due_date__gte=today,
             due_date__lte=due_soon_threshold
@@ -597,16 +674,15 @@ class FeeManagementView(LoginRequiredMixin, TemplateView):
         from financial.models import StudentFee, Payment, FeeType
         from accounts.models import User
         from django.db.models import Sum, Count, Q
-        from django.core.paginator import Paginator
+        from .pagination import KeysetPaginator
         from decimal import Decimal
         
         # Get search and filter parameters
         search_query = self.request.GET.get('search', '')
         category_filter = self.request.GET.get('category', '')
-        page_number = self.request.GET.get('page', 1)
         
         # Base queryset
-        fees_queryset = StudentFee.objects.select_related('student', 'fee_type').order_by('-due_date')
+        fees_queryset = StudentFee.objects.select_related('student', 'fee_type')
         
         # Apply search filter
         if search_query:
@@ -620,11 +696,10 @@ class FeeManagementView(LoginRequiredMixin, TemplateView):
         
         # Apply category filter
         if category_filter:
-            fees_queryset = fees_queryset.filter(fee_type__name__icontains=category_filter)
+            fees_queryset = fees_queryset.filter(fee_type__category=category_filter)
         
-        # Pagination
-        paginator = Paginator(fees_queryset, 10)  # 10 fees per page
-        fees_page = paginator.get_page(page_number)
+        # Keyset pagination by due date
+        fees_page = KeysetPaginator(fees_queryset, ('-due_date', '-id'), per_page=10).get_page(self.request.GET)
         
         # Calculate statistics
         total_fees = StudentFee.objects.count()
@@ -638,19 +713,11 @@ class FeeManagementView(LoginRequiredMixin, TemplateView):
         # Total enrolled students
         enrolled_students = User.objects.filter(user_type='student').count()
         
-        # Calculate fee category statistics
-        fee_categories = {
-            'tuition': StudentFee.objects.filter(fee_type__name__icontains='tuition').count(),
-            'library': StudentFee.objects.filter(fee_type__name__icontains='library').count(),
-            'lab': StudentFee.objects.filter(fee_type__name__icontains='lab').count(),
-            'sports': StudentFee.objects.filter(fee_type__name__icontains='sports').count(),
-            'other': StudentFee.objects.exclude(
-                Q(fee_type__name__icontains='tuition') |
-                Q(fee_type__name__icontains='library') |
-                Q(fee_type__name__icontains='lab') |
-                Q(fee_type__name__icontains='sports')
-            ).count(),
-        }
+        # Calculate fee category statistics in one grouped query
+        fee_categories = dict.fromkeys((key for key, label in FeeType.CATEGORY_CHOICES), 0)
+        fee_categories.update(
+            StudentFee.objects.values_list('fee_type__category').annotate(count=Count('id')).order_by()
+        )
         
         # Get all fee types for category filter
         fee_types = FeeType.objects.filter(is_active=True).order_by('name')
@@ -667,12 +734,11 @@ class FeeManagementView(LoginRequiredMixin, TemplateView):
             'sports_count': fee_categories['sports'],
             'other_count': fee_categories['other'],
             'fee_types': fee_types,
+            'fee_category_choices': FeeType.CATEGORY_CHOICES,
             'search_query': search_query,
             'category_filter': category_filter,
-            'has_previous': fees_page.has_previous(),
-            'has_next': fees_page.has_next(),
-            'page_number': fees_page.number,
-            'total_pages': paginator.num_pages,
+            'has_previous': fees_page.has_previous,
+            'has_next': fees_page.has_next,
         })
         return context
 
@@ -688,17 +754,30 @@ class CreateFeeView(LoginRequiredMixin, TemplateView):
         # Get all students for the dropdown
         students = User.objects.filter(user_type='student').order_by('first_name', 'last_name')
         
+        # Cohort options
+        majors = students.exclude(major='').order_by('major').values_list('major', flat=True).distinct()
+        academic_levels = students.exclude(academic_level='').order_by(
+            'academic_level'
+        ).values_list('academic_level', flat=True).distinct()
+        enrollment_years = students.exclude(enrollment_year__isnull=True).order_by(
+            '-enrollment_year'
+        ).values_list('enrollment_year', flat=True).distinct()
+        
         context.update({
             'students': students,
+            'majors': majors,
+            'academic_levels': academic_levels,
+            'enrollment_years': enrollment_years,
         })
         return context
     
     def post(self, request, *args, **kwargs):
-        from financial.models import StudentFee, FeeType
-        from accounts.models import User
+        from financial.models import FeeType, FeeAssignment
+        from financial.tasks import enqueue_fee_assignment
         from .models import StaffActivity
         from decimal import Decimal
-        from datetime import datetime
+        from datetime import date
+        from django.db import transaction
         
         # Get form data
         fee_name = request.POST.get('fee_name')
@@ -709,52 +788,53 @@ class CreateFeeView(LoginRequiredMixin, TemplateView):
         
         if fee_name and amount and due_date:
             try:
-                # Get or create fee type
-                fee_type, created = FeeType.objects.get_or_create(
-                    name=fee_name,
-                    defaults={'description': description}
-                )
-                
-                # Convert amount to decimal
-                amount_decimal = Decimal(amount)
-                
-                # Apply fee to students
-                if apply_to == 'all':
-                    students = User.objects.filter(user_type='student')
-                    for student in students:
-                        StudentFee.objects.create(
-                            student=student,
-                            fee_type=fee_type,
-                            amount=amount_decimal,
-                            due_date=due_date,
-                            description=description,
-                            created_by=request.user
-                        )
-                elif apply_to == 'specific':
+                # Build the target cohort
+                if apply_to == 'specific':
                     selected_student_ids = request.POST.getlist('selected_students')
-                    if selected_student_ids:
-                        students = User.objects.filter(id__in=selected_student_ids, user_type='student')
-                        for student in students:
-                            StudentFee.objects.create(
-                                student=student,
-                                fee_type=fee_type,
-                                amount=amount_decimal,
-                                due_date=due_date,
-                                description=description,
-                                created_by=request.user
-                            )
-                    else:
+                    if not selected_student_ids:
                         messages.error(request, 'يرجى اختيار طالب واحد على الأقل عند التطبيق على طلاب محددين.')
                         return self.get(request, *args, **kwargs)
+                    criteria = {'student_ids': selected_student_ids}
+                elif apply_to == 'cohort':
+                    criteria = {field: request.POST.get(field, '') for field in FeeAssignment.COHORT_FIELDS}
+                    if not any(criteria.values()):
+                        messages.error(request, 'يرجى تحديد التخصص أو سنة التسجيل أو المستوى الأكاديمي.')
+                        return self.get(request, *args, **kwargs)
+                else:
+                    criteria = {}
                 
-                # Log staff activity
-                StaffActivity.objects.create(
-                    staff_member=request.user,
-                    activity_type='fee_created',
-                    description=f'Created fee: {fee_name} for {apply_to} students'
-                )
+                with transaction.atomic():
+                    # Get or create fee type
+                    fee_type, created = FeeType.objects.get_or_create(
+                        name=fee_name,
+                        defaults={'description': description, 'category': FeeType.classify_name(fee_name)}
+                    )
+                    
+                    assignment, created = FeeAssignment.get_or_create_for(
+                        fee_type,
+                        Decimal(amount),
+                        date.fromisoformat(due_date),
+                        criteria,
+                        description=description,
+                        created_by=request.user
+                    )
+                    
+                    # Fees are created in the background; re-running only fills in missing students
+                    if assignment.status != 'running':
+                        enqueue_fee_assignment(assignment.pk)
+                    
+                    # Log staff activity
+                    StaffActivity.objects.create(
+                        staff_member=request.user,
+                        activity_type='fee_created',
+                        description=f'Created fee: {fee_name} for {apply_to} students',
+                        metadata={'assignment_id': assignment.pk, 'criteria': assignment.criteria}
+                    )
                 
-                messages.success(request, f'تم إنشاء الرسوم "{fee_name}" بنجاح!')
+                if created:
+                    messages.success(request, f'تم جدولة إنشاء الرسوم "{fee_name}"، وسيتم تطبيقها على الطلاب في الخلفية.')
+                else:
+                    messages.info(request, f'الرسوم "{fee_name}" مخصصة مسبقاً لهذه الفئة، وسيتم إضافتها فقط للطلاب الذين لم تُفرض عليهم بعد.')
                 return redirect('staff_panel:fee_management')
                 
             except Exception as e:
@@ -765,6 +845,28 @@ class CreateFeeView(LoginRequiredMixin, TemplateView):
             return self.get(request, *args, **kwargs)
 
 
+@login_required
+def fee_assignment_progress(request, assignment_id):
+    """Report the progress of a background fee assignment via AJAX"""
+    from financial.models import FeeAssignment
+    
+    assignment = get_object_or_404(FeeAssignment.objects.select_related('fee_type'), id=assignment_id)
+    return JsonResponse({
+        'status': 'success',
+        'assignment': {
+            'id': assignment.id,
+            'fee_type': assignment.fee_type.name,
+            'state': assignment.status,
+            'state_display': assignment.get_status_display(),
+            'total_students': assignment.total_students,
+            'processed_students': assignment.processed_students,
+            'created_fees': assignment.created_fees,
+            'progress': assignment.progress,
+            'error_message': assignment.error_message,
+        }
+    })
+
+
 # Payment Provider Management Views
 class PaymentProviderManagementView(LoginRequiredMixin, TemplateView):
     """Manage payment providers"""
@@ -1032,10 +1134,11 @@ class StudentManagementView(LoginRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         from accounts.models import User
+        from .pagination import KeysetPaginator
         
         students = User.objects.filter(
             user_type='student'
-        ).select_related('student_profile').order_by('-date_joined')
+        ).select_related('student_profile')
         
         # Search functionality
         search_query = self.request.GET.get('search', '')
@@ -1048,7 +1151,7 @@ class StudentManagementView(LoginRequiredMixin, TemplateView):
             )
         
         context.update({
-            'students': students[:100],  # Limit for performance
+            'students': KeysetPaginator(students, ('-date_joined', '-id'), per_page=100).get_page(self.request.GET),
             'search_query': search_query,
         })
         return context
@@ -1359,74 +1462,49 @@ class GenerateReportView(LoginRequiredMixin, TemplateView):
     template_name = 'staff_panel/generate_report.html'
     
     def post(self, request, *args, **kwargs):
-        from django.http import HttpResponse
-        from django.template.loader import render_to_string
+        from django.http import StreamingHttpResponse
+        from django.utils.dateparse import parse_date
         from .models import StaffActivity
-        import csv
-        from io import StringIO
+        from .reports import REPORT_COLUMNS, select_columns, report_queryset, iter_csv, gzip_stream
         
         report_type = request.POST.get('report_type')
         date_from = request.POST.get('date_from')
         date_to = request.POST.get('date_to')
+        compress = request.POST.get('compression') == 'gzip'
         
         if report_type and date_from and date_to:
             try:
-                # Generate CSV report based on type
-                output = StringIO()
-                writer = csv.writer(output)
-                
-                if report_type == 'students':
-                    from accounts.models import User
-                    writer.writerow(['University ID', 'Name', 'Email', 'Program', 'Year', 'Status'])
-                    students = User.objects.filter(user_type='student', date_joined__range=[date_from, date_to])
-                    for student in students:
-                        writer.writerow([
-                            student.university_id,
-                            student.get_full_name(),
-                            student.email,
-                            getattr(student.student_profile, 'program', 'N/A') if hasattr(student, 'student_profile') else 'N/A',
-                            getattr(student.student_profile, 'year_of_study', 'N/A') if hasattr(student, 'student_profile') else 'N/A',
-                            'Active' if student.is_active else 'Inactive'
-                        ])
+                if report_type not in REPORT_COLUMNS:
+                    messages.error(request, 'نوع التقرير غير صالح.')
+                    return self.get(request, *args, **kwargs)
+                if not parse_date(date_from) or not parse_date(date_to):
+                    messages.error(request, 'صيغة التاريخ غير صحيحة.')
+                    return self.get(request, *args, **kwargs)
                 
-                elif report_type == 'fees':
-                    from financial.models import StudentFee
-                    writer.writerow(['Student ID', 'Student Name', 'Fee Type', 'Amount', 'Due Date', 'Status'])
-                    fees = StudentFee.objects.filter(created_at__range=[date_from, date_to])
-                    for fee in fees:
-                        writer.writerow([
-                            fee.student.university_id,
-                            fee.student.get_full_name(),
-                            fee.fee_type.name,
-                            fee.amount,
-                            fee.due_date,
-                            fee.get_status_display()
-                        ])
+                columns = select_columns(report_type, request.POST.getlist('columns'))
+                if not columns:
+                    messages.error(request, 'يرجى اختيار عمود واحد على الأقل.')
+                    return self.get(request, *args, **kwargs)
                 
-                elif report_type == 'requests':
-                    from student_portal.models import ServiceRequest
-                    writer.writerow(['Request ID', 'Student', 'Service Type', 'Status', 'Created Date', 'Updated Date'])
-                    requests = ServiceRequest.objects.filter(created_at__range=[date_from, date_to])
-                    for req in requests:
-                        writer.writerow([
-                            req.id,
-                            req.student.get_full_name(),
-                            req.service_type,
-                            req.get_status_display(),
-                            req.created_at.strftime('%Y-%m-%d'),
-                            req.updated_at.strftime('%Y-%m-%d')
-                        ])
+                queryset = report_queryset(report_type, date_from, date_to)
                 
                 # Log staff activity
                 StaffActivity.objects.create(
                     staff_member=request.user,
                     activity_type='report_generated',
-                    description=f'Generated {report_type} report from {date_from} to {date_to}'
+                    description=f'Generated {report_type} report from {date_from} to {date_to}',
+                    metadata={'columns': [key for key, _, _ in columns], 'compressed': compress}
                 )
                 
-                # Return CSV response
-                response = HttpResponse(output.getvalue(), content_type='text/csv')
-                response['Content-Disposition'] = f'attachment; filename="{report_type}_report_{date_from}_to_{date_to}.csv"'
+                # Stream the CSV so large exports start immediately and use constant memory
+                filename = f'{report_type}_report_{date_from}_to_{date_to}.csv'
+                content = iter_csv(queryset, columns)
+                if compress:
+                    response = StreamingHttpResponse(gzip_stream(content), content_type='application/gzip')
+                    filename += '.gz'
+                else:
+                    response = StreamingHttpResponse(content, content_type='text/csv; charset=utf-8')
+                response['Content-Disposition'] = f'attachment; filename="{filename}"'
                 return response
                 
             except Exception as e:
@@ -1446,11 +1524,14 @@ class DocumentManagementView(LoginRequiredMixin, TemplateView):
         context = super().get_context_data(**kwargs)
         from student_portal.models import StudentDocument
         from accounts.models import User
+        from .pagination import KeysetPaginator
         
         # Get all documents with related student info
-        documents = StudentDocument.objects.select_related(
-            'student', 'issued_by'
-        ).order_by('-issued_date')[:100]
+        documents = KeysetPaginator(
+            StudentDocument.objects.select_related('student', 'issued_by'),
+            ('-issued_date', '-id'),
+            per_page=100
+        ).get_page(self.request.GET)
         
         # Get all students for the upload form
         students = User.objects.filter(
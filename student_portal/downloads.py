@@ -0,0 +1,173 @@
+"""
+Streaming responses for student document downloads.
+
+Files are never read into memory. A full download is a FileResponse, which
+servers with wsgi.file_wrapper send with sendfile(). A single byte range is
+streamed in fixed-size chunks with a 206 response, so a dropped mobile
+connection can resume where it stopped. If-Range is honoured against the
+file's ETag and Last-Modified date.
+
+When DOCUMENT_DOWNLOAD_OFFLOAD is set, Django only checks access and returns
+an X-Accel-Redirect (nginx) or X-Sendfile (Apache, lighttpd) header. The
+front proxy then serves the bytes and handles ranges itself. The redirect URI
+is percent-encoded; X-Sendfile takes a raw path, so files with non-ASCII
+paths are streamed by Django instead.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Bytes read per iteration when streaming a range
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeFileWrapper:
+    """Iterate over ``length`` bytes of a file starting at ``offset``, one chunk at a time"""
+
+    def __init__(self, file, offset, length, chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.remaining = length
+        self.chunk_size = chunk_size
+        self.file.seek(offset)
+
+    def __iter__(self):
+        try:
+            while self.remaining > 0:
+                chunk = self.file.read(min(self.chunk_size, self.remaining))
+                if not chunk:
+                    break
+                self.remaining -= len(chunk)
+                yield chunk
+        finally:
+            self.file.close()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Return (start, end) for a single satisfiable byte range, None to send the whole file,
+    or False when the range cannot be satisfied"""
+    match = RANGE_RE.match(header.replace(' ', ''))
+    if not match or (not match.group(1) and not match.group(2)):
+        # Multiple ranges and other units are answered with the whole file
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def if_range_matches(request, etag, last_modified):
+    """Whether a Range request may be answered partially under its If-Range condition"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        # Weak validators never match; only the strong ETag allows a partial reply
+        return if_range == etag
+    if_range_date = parse_http_date_safe(if_range)
+    return if_range_date is not None and int(last_modified) == if_range_date
+
+
+def offloaded_response(field_file, filename, content_type, mode):
+    """Hand the transfer to the front proxy, which also answers Range requests
+
+    Returns None when the file's location cannot be put in the header.
+    """
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'DOCUMENT_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+        # Non-ASCII header values would be MIME-encoded, which nginx cannot resolve
+        location = prefix.rstrip('/') + '/' + quote(field_file.name.lstrip('/'))
+        header = 'X-Accel-Redirect'
+    else:
+        location = field_file.path
+        if not location.isascii():
+            return None
+        header = 'X-Sendfile'
+    response = HttpResponse(content_type=content_type)
+    response[header] = location
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
+
+
+def document_file_response(request, field_file, filename=None, content_type=None):
+    """Serve a stored file as an attachment with Range, If-Range and conditional GET support
+
+    Raises FileNotFoundError when the file is missing from storage.
+    """
+    filename = filename or os.path.basename(field_file.name)
+    content_type = content_type or mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+
+    mode = getattr(settings, 'DOCUMENT_DOWNLOAD_OFFLOAD', None)
+    if mode in ('x-accel-redirect', 'x-sendfile'):
+        response = offloaded_response(field_file, filename, content_type, mode)
+        if response is not None:
+            return response
+
+    storage = field_file.storage
+    if not storage.exists(field_file.name):
+        raise FileNotFoundError(field_file.name)
+    size = storage.size(field_file.name)
+    last_modified = storage.get_modified_time(field_file.name).timestamp()
+    etag = f'"{size:x}-{int(last_modified):x}"'
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(last_modified))
+    if conditional is not None:
+        return conditional
+
+    byte_range = None
+    if request.headers.get('Range') and if_range_matches(request, etag, last_modified):
+        byte_range = parse_range(request.headers['Range'], size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    if byte_range is None:
+        response = FileResponse(
+            field_file.open('rb'),
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type
+        )
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            RangeFileWrapper(field_file.storage.open(field_file.name, 'rb'), start, end - start + 1),
+            status=206,
+            content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def starts_download(response):
+    """Whether a response begins a download, as opposed to resuming one or answering 304"""
+    if response.status_code == 206:
+        return response['Content-Range'].startswith('bytes 0-')
+    return response.status_code == 200
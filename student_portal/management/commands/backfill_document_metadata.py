@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from student_portal.models import RequestDocument, StudentDocument
+
+
+MODELS = {
+    'student': StudentDocument,
+    'request': RequestDocument,
+}
+
+
+class Command(BaseCommand):
+    help = 'Compute stored size, MIME type, extension, SHA-256 and existence for student and request documents'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model',
+            choices=list(MODELS),
+            action='append',
+            dest='models',
+            help='Only backfill this document model (repeatable, default: both)',
+        )
+        parser.add_argument(
+            '--missing-only',
+            action='store_true',
+            help='Only rows that have no stored hash yet (skips files already processed)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows read and updated per batch (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+
+        for name in options['models'] or list(MODELS):
+            model = MODELS[name]
+            documents = model.objects.all()
+            if options['missing_only']:
+                documents = documents.filter(sha256='')
+
+            processed = missing = 0
+            last_pk = 0
+            while True:
+                batch = list(documents.filter(pk__gt=last_pk).order_by('pk')[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                for document in batch:
+                    document.refresh_file_metadata()
+                    if not document.file_exists:
+                        missing += 1
+                model.objects.bulk_update(batch, model.METADATA_FIELDS)
+                processed += len(batch)
+
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {processed} rows updated, {missing} files missing')
+
+        self.stdout.write(self.style.SUCCESS('Document metadata backfill complete.'))
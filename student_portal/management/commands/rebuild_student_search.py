@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from student_portal.models import ServiceRequest, StudentDocument, SupportTicket
+from student_portal.search import clear_search_index, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search documents and full-text index behind student search'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Number of rows rewritten per batch (default: 2000)',
+        )
+        parser.add_argument(
+            '--student',
+            help='Only rebuild rows for the student with this university ID',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if not options['student']:
+                # A full rebuild also drops index rows left behind by deleted records
+                clear_search_index()
+            for model in (ServiceRequest, SupportTicket, StudentDocument):
+                queryset = model.objects.order_by('pk')
+                if options['student']:
+                    queryset = queryset.filter(student__university_id=options['student'])
+                processed = rebuild_search_index(queryset, batch_size=options['batch_size'])
+                self.stdout.write(f'{model._meta.verbose_name_plural}: {processed} rows reindexed')
+
+        self.stdout.write(self.style.SUCCESS('Student search index rebuilt.'))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-16 22:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_portal', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='servicerequest',
+            index=models.Index(fields=['created_at', 'id'], name='servicerequest_keyset_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentdocument',
+            index=models.Index(fields=['issued_date', 'id'], name='studentdocument_keyset_idx'),
+        ),
+    ]
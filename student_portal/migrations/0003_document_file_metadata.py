@@ -0,0 +1,87 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:03
+
+import mimetypes
+import os
+
+from django.db import migrations, models
+
+
+def fill_name_metadata(apps, schema_editor):
+    """Fill what can be derived from the stored file names without touching storage
+
+    Sizes and hashes are computed by the backfill_document_metadata command.
+    """
+    for model_name, file_field in (('StudentDocument', 'document_file'), ('RequestDocument', 'document')):
+        model = apps.get_model('student_portal', model_name)
+        batch = []
+        for document in model.objects.only('pk', file_field).iterator(chunk_size=1000):
+            name = getattr(document, file_field).name or ''
+            document.file_extension = os.path.splitext(name)[1].lower()[:16]
+            document.content_type = mimetypes.guess_type(name)[0] or ''
+            document.file_exists = bool(name)
+            batch.append(document)
+            if len(batch) >= 1000:
+                model.objects.bulk_update(batch, ['file_extension', 'content_type', 'file_exists'])
+                batch = []
+        model.objects.bulk_update(batch, ['file_extension', 'content_type', 'file_exists'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_portal', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestdocument',
+            name='content_type',
+            field=models.CharField(blank=True, db_index=True, max_length=100, verbose_name='نوع المحتوى'),
+        ),
+        migrations.AddField(
+            model_name='requestdocument',
+            name='file_exists',
+            field=models.BooleanField(db_index=True, default=False, help_text='هل كان الملف موجوداً في التخزين عند آخر فحص', verbose_name='الملف موجود'),
+        ),
+        migrations.AddField(
+            model_name='requestdocument',
+            name='file_extension',
+            field=models.CharField(blank=True, db_index=True, max_length=16, verbose_name='امتداد الملف'),
+        ),
+        migrations.AddField(
+            model_name='requestdocument',
+            name='file_size',
+            field=models.PositiveBigIntegerField(default=0, help_text='حجم الملف بالبايت', verbose_name='حجم الملف'),
+        ),
+        migrations.AddField(
+            model_name='requestdocument',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='بصمة SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='studentdocument',
+            name='content_type',
+            field=models.CharField(blank=True, db_index=True, max_length=100, verbose_name='نوع المحتوى'),
+        ),
+        migrations.AddField(
+            model_name='studentdocument',
+            name='file_exists',
+            field=models.BooleanField(db_index=True, default=False, help_text='هل كان الملف موجوداً في التخزين عند آخر فحص', verbose_name='الملف موجود'),
+        ),
+        migrations.AddField(
+            model_name='studentdocument',
+            name='file_extension',
+            field=models.CharField(blank=True, db_index=True, max_length=16, verbose_name='امتداد الملف'),
+        ),
+        migrations.AddField(
+            model_name='studentdocument',
+            name='file_size',
+            field=models.PositiveBigIntegerField(default=0, help_text='حجم الملف بالبايت', verbose_name='حجم الملف'),
+        ),
+        migrations.AddField(
+            model_name='studentdocument',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='بصمة SHA-256'),
+        ),
+        migrations.RunPython(fill_name_metadata, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,135 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:07
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+FTS_TABLE = 'student_portal_search_fts'
+TSVECTOR_INDEXES = {
+    'student_portal_servicerequest': 'servicerequest_search_tsv_idx',
+    'student_portal_supportticket': 'supportticket_search_tsv_idx',
+    'student_portal_studentdocument': 'studentdocument_search_tsv_idx',
+}
+KIND_CODES = {'service_request': 1, 'support_ticket': 2, 'document': 3}
+ARABIC_FOLDING = str.maketrans({
+    '\u0629': '\u0647',
+    '\u0649': '\u064a',
+    '\u0671': '\u0627',
+    '\u06cc': '\u064a',
+    '\u06a9': '\u0643',
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},
+})
+
+
+def strip_article(word):
+    for prefix in ('\u0648\u0627\u0644', '\u0627\u0644'):
+        if word.startswith(prefix) and len(word) - len(prefix) >= 3:
+            return word[len(prefix):]
+    return word
+
+
+def normalize(parts):
+    text = unicodedata.normalize('NFKD', ' '.join(part or '' for part in parts).casefold())
+    text = ''.join(char for char in text if unicodedata.category(char) != 'Mn')
+    words = text.replace('\u0640', '').translate(ARABIC_FOLDING).split()
+    return ' '.join(strip_article(word) for word in words)
+
+
+def display(model, field, value):
+    return str(dict(model._meta.get_field(field).choices).get(value, value))
+
+
+def service_request_parts(model, obj):
+    return [obj.title, obj.description, display(model, 'request_type', obj.request_type)]
+
+
+def support_ticket_parts(model, obj):
+    return [obj.subject, obj.description, display(model, 'category', obj.category)]
+
+
+def document_parts(model, obj):
+    issued_by = obj.issued_by
+    issued_by_name = f'{issued_by.first_name} {issued_by.last_name}'.strip() if issued_by else ''
+    return [
+        obj.title, obj.document_type.replace('_', ' '),
+        display(model, 'document_type', obj.document_type), issued_by_name,
+    ]
+
+
+SEARCHABLE = (
+    ('ServiceRequest', 'service_request', service_request_parts, ()),
+    ('SupportTicket', 'support_ticket', support_ticket_parts, ()),
+    ('StudentDocument', 'document', document_parts, ('issued_by',)),
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"search_document, kind UNINDEXED, object_id UNINDEXED, student_id UNINDEXED, "
+            f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+    elif vendor == 'postgresql':
+        for table, index in TSVECTOR_INDEXES.items():
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {index} ON {table} "
+                f"USING gin (to_tsvector('simple', search_document))"
+            )
+
+    for model_name, kind, build_parts, related in SEARCHABLE:
+        model = apps.get_model('student_portal', model_name)
+        batch = []
+        for obj in model.objects.select_related(*related).order_by('pk').iterator(chunk_size=2000):
+            obj.search_document = normalize(build_parts(model, obj))
+            batch.append(obj)
+            if len(batch) >= 2000:
+                model.objects.bulk_update(batch, ['search_document'])
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, ['search_document'])
+
+        if vendor == 'sqlite':
+            schema_editor.execute(
+                f'INSERT INTO {FTS_TABLE}(rowid, search_document, kind, object_id, student_id) '
+                f'SELECT id * 4 + %s, search_document, %s, id, student_id FROM {model._meta.db_table}',
+                [KIND_CODES[kind], kind]
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        for index in TSVECTOR_INDEXES.values():
+            schema_editor.execute(f'DROP INDEX IF EXISTS {index}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_portal', '0003_document_file_metadata'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servicerequest',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='studentdocument',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='supportticket',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations
+
+
+FTS_TABLE = 'student_portal_search_fts'
+SEARCHABLE = (
+    ('student_portal_servicerequest', 'service_request', 1),
+    ('student_portal_supportticket', 'support_ticket', 2),
+    ('student_portal_studentdocument', 'document', 3),
+)
+
+
+def rebuild_fts_table(schema_editor, definition, columns, student_value):
+    schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    schema_editor.execute(f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({definition})')
+    for table, kind, code in SEARCHABLE:
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE}(rowid, {columns}) '
+            f'SELECT id * 4 + %s, search_document, {student_value}, %s, id FROM {table}',
+            [code, kind]
+        )
+
+
+def index_student_token(apps, schema_editor):
+    # The student becomes an indexed sid_<id> token, so MATCH narrows to one student
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    rebuild_fts_table(
+        schema_editor,
+        "search_document, student_key, kind UNINDEXED, object_id UNINDEXED, "
+        "tokenize=\"unicode61 remove_diacritics 2 tokenchars '_'\", prefix='2 3'",
+        'search_document, student_key, kind, object_id',
+        "'sid_' || student_id",
+    )
+
+
+def unindex_student_token(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    rebuild_fts_table(
+        schema_editor,
+        "search_document, kind UNINDEXED, object_id UNINDEXED, student_id UNINDEXED, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3'",
+        'search_document, student_id, kind, object_id',
+        'student_id',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student_portal', '0004_search_document'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_student_token, unindex_student_token),
+    ]
@@ -1,12 +1,72 @@
+import hashlib
+import mimetypes
+import os
+
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from univ_services import counters
+
+
+class SearchableRecord(models.Model):
+    """نص بحث موحّد ومطبّع يُعاد بناؤه عند الحفظ
+    
+    Subclasses name their kind in SEARCH_KIND and the fields the text is
+    built from in SEARCH_FIELDS; override search_text_parts() when the text
+    needs more than those fields. See student_portal.search.
+    """
+    
+    SEARCH_KIND = None
+    SEARCH_FIELDS = ()
+    SEARCH_RELATED = ()
+    
+    # Normalized text kept in sync on save for student search
+    search_document = models.TextField(blank=True, default='', editable=False)
+    
+    class Meta:
+        abstract = True
+    
+    def search_text_parts(self):
+        """قيم حقول البحث، مع اسم العرض لحقول الاختيارات"""
+        parts = []
+        for name in self.SEARCH_FIELDS:
+            field = self._meta.get_field(name)
+            if field.choices:
+                parts.append(str(self._get_FIELD_display(field)))
+            else:
+                value = getattr(self, name)
+                parts.append(str(value) if value is not None else '')
+        return parts
+    
+    def save(self, *args, **kwargs):
+        from .search import build_search_document, index_objects
+        
+        update_fields = kwargs.get('update_fields')
+        reindex = update_fields is None or not set(update_fields).isdisjoint(self.SEARCH_FIELDS)
+        if reindex:
+            self.search_document = build_search_document(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'search_document'}
+        super().save(*args, **kwargs)
+        if reindex:
+            index_objects(self.SEARCH_KIND, [self], using=self._state.db)
+    
+    def delete(self, *args, **kwargs):
+        from .search import unindex_object
+        
+        pk, using = self.pk, self._state.db
+        result = super().delete(*args, **kwargs)
+        unindex_object(self.SEARCH_KIND, pk, using=using)
+        return result
 
 
-class ServiceRequest(models.Model):
+class ServiceRequest(SearchableRecord):
     """نموذج طلبات الخدمات الطلابية"""
     
+    SEARCH_KIND = 'service_request'
+    SEARCH_FIELDS = ('title', 'description', 'request_type')
+    
     REQUEST_TYPES = (
         ('enrollment_certificate', _('شهادة قيد')),
         ('schedule_modification', _('تعديل الجدول الدراسي')),
@@ -101,6 +161,9 @@ class ServiceRequest(models.Model):
         ordering = ['-created_at']
         verbose_name = _('طلب خدمة')
         verbose_name_plural = _('طلبات الخدمات')
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='servicerequest_keyset_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.university_id} - {self.get_request_type_display()}"
@@ -118,9 +181,123 @@ class ServiceRequest(models.Model):
         return icons.get(self.status, '📄')
 
 
-class RequestDocument(models.Model):
+class StoredFileMetadata(models.Model):
+    """بيانات الملف المحفوظة عند الرفع حتى لا تحتاج القوائم إلى الوصول لنظام الملفات
+    
+    Subclasses name their FileField in FILE_FIELD. The metadata is computed
+    from the uploaded content when a new file is saved; the
+    backfill_document_metadata command recomputes it for existing rows.
+    """
+    
+    FILE_FIELD = None
+    
+    file_size = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name=_('حجم الملف'),
+        help_text=_('حجم الملف بالبايت')
+    )
+    content_type = models.CharField(
+        max_length=100,
+        blank=True,
+        db_index=True,
+        verbose_name=_('نوع المحتوى')
+    )
+    file_extension = models.CharField(
+        max_length=16,
+        blank=True,
+        db_index=True,
+        verbose_name=_('امتداد الملف')
+    )
+    sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        verbose_name=_('بصمة SHA-256')
+    )
+    file_exists = models.BooleanField(
+        default=False,
+        db_index=True,
+        verbose_name=_('الملف موجود'),
+        help_text=_('هل كان الملف موجوداً في التخزين عند آخر فحص')
+    )
+    
+    METADATA_FIELDS = ['file_size', 'content_type', 'file_extension', 'sha256', 'file_exists']
+    
+    class Meta:
+        abstract = True
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Name the metadata was computed for; read from __dict__ so deferred loading is not triggered
+        self._metadata_file_name = self._raw_file_name() if self.pk else None
+    
+    def _raw_file_name(self):
+        value = self.__dict__.get(self.FILE_FIELD)
+        return getattr(value, 'name', value)
+    
+    @property
+    def stored_file(self):
+        return getattr(self, self.FILE_FIELD)
+    
+    def refresh_file_metadata(self):
+        """قراءة الملف مرة واحدة لحساب الحجم والبصمة والنوع والامتداد"""
+        field_file = self.stored_file
+        self.file_extension = os.path.splitext(field_file.name or '')[1].lower()[:16]
+        self.content_type = (mimetypes.guess_type(field_file.name or '')[0] or '') if field_file else ''
+        self.file_size = 0
+        self.sha256 = ''
+        self.file_exists = False
+        if not field_file:
+            return
+        
+        try:
+            # A fresh upload is read from the request; a stored file from storage
+            source = field_file.file if not field_file._committed else field_file.storage.open(field_file.name, 'rb')
+        except (FileNotFoundError, OSError):
+            return
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            source.seek(0)
+            for chunk in iter(lambda: source.read(1024 * 1024), b''):
+                digest.update(chunk)
+                size += len(chunk)
+        finally:
+            if field_file._committed:
+                source.close()
+            else:
+                source.seek(0)
+        self.file_size = size
+        self.sha256 = digest.hexdigest()
+        self.file_exists = True
+    
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or self.FILE_FIELD in update_fields:
+            field_file = self.stored_file
+            if not field_file._committed or field_file.name != self._metadata_file_name:
+                # New or replaced file: an upload is read while still in memory or a temp file
+                self.refresh_file_metadata()
+                if update_fields is not None:
+                    kwargs['update_fields'] = set(update_fields) | set(self.METADATA_FIELDS)
+        super().save(*args, **kwargs)
+        self._metadata_file_name = self.stored_file.name
+    
+    @property
+    def file_size_display(self):
+        size = self.file_size
+        if size < 1024:
+            return f"{size} B"
+        elif size < 1024 * 1024:
+            return f"{size / 1024:.1f} KB"
+        return f"{size / (1024 * 1024):.1f} MB"
+
+
+class RequestDocument(StoredFileMetadata):
     """المستندات المرفقة بطلبات الخدمات"""
     
+    FILE_FIELD = 'document'
+    
     request = models.ForeignKey(
         ServiceRequest, 
         on_delete=models.CASCADE, 
@@ -153,9 +330,15 @@ class RequestDocument(models.Model):
         return f"{self.request} - {self.document_name}"
 
 
-class StudentDocument(models.Model):
+class StudentDocument(SearchableRecord, StoredFileMetadata):
     """المستندات الرسمية الصادرة للطلاب"""
     
+    SEARCH_KIND = 'document'
+    SEARCH_FIELDS = ('title', 'document_type', 'issued_by')
+    SEARCH_RELATED = ('issued_by',)
+    
+    FILE_FIELD = 'document_file'
+    
     DOCUMENT_TYPES = (
         ('enrollment_certificate', _('شهادة قيد')),
         ('transcript', _('كشف الدرجات الرسمي')),
@@ -215,18 +398,41 @@ class StudentDocument(models.Model):
         ordering = ['-issued_date']
         verbose_name = _('مستند الطالب')
         verbose_name_plural = _('مستندات الطلاب')
+        indexes = [
+            models.Index(fields=['issued_date', 'id'], name='studentdocument_keyset_idx'),
+        ]
     
     def __str__(self):
         return f"{self.student.university_id} - {self.title}"
     
+    def search_text_parts(self):
+        issued_by = self.issued_by.get_full_name() if self.issued_by_id else ''
+        return [self.title, self.document_type.replace('_', ' '), str(self.get_document_type_display()), issued_by]
+    
     def increment_download_count(self):
-        self.download_count += 1
-        self.save()
+        """زيادة عدد التحميلات؛ تُجمع الزيادات وتُكتب دفعة واحدة"""
+        counters.increment(self, 'download_count')
 
+    @classmethod
+    def statistics_for(cls, student, recent_since):
+        """إحصائيات مستندات الطالب في استعلام تجميع شرطي واحد"""
+        aggregates = {
+            'total_documents': models.Count('id'),
+            'official_documents': models.Count('id', filter=models.Q(is_official=True)),
+            'total_downloads': models.Sum('download_count', default=0),
+            'recent_documents': models.Count('id', filter=models.Q(issued_date__gte=recent_since)),
+        }
+        for doc_type, _label in cls.DOCUMENT_TYPES:
+            aggregates[f'type_{doc_type}'] = models.Count('id', filter=models.Q(document_type=doc_type))
+        return cls.objects.filter(student=student).aggregate(**aggregates)
 
-class SupportTicket(models.Model):
+
+class SupportTicket(SearchableRecord):
     """تذاكر الدعم الفني لاستفسارات الطلاب"""
     
+    SEARCH_KIND = 'support_ticket'
+    SEARCH_FIELDS = ('subject', 'description', 'category')
+    
     CATEGORY_CHOICES = (
         ('technical', _('الدعم الفني')),
         ('academic', _('الخدمات الأكاديمية')),
@@ -0,0 +1,229 @@
+"""
+Student search over service requests, support tickets and documents.
+
+ServiceRequest, SupportTicket and StudentDocument each keep a normalized
+``search_document`` rebuilt on save. Arabic text is folded so spelling
+variants match: harakat and tatweel are removed, alef and hamza forms become
+bare alef, waw and yaa, taa marbuta becomes haa, alef maqsura becomes yaa and
+Arabic-Indic digits become ASCII digits, and a leading definite article is
+dropped so "الإفادة" and "افادة" index the same word. Queries go through the
+same normalization.
+
+On SQLite every document is mirrored into one FTS5 table together with its
+kind and a ``sid_<student id>`` token in an indexed column, so a single MATCH
+both narrows the index to one student and ranks results of all three kinds. On PostgreSQL each table has a GIN index over
+``to_tsvector('simple', search_document)`` and the kinds are ranked with
+ts_rank and merged.
+"""
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from financial.search import normalize_search_text
+
+
+SEARCH_FTS_TABLE = 'student_portal_search_fts'
+
+# Kind codes also make up the FTS rowid: object id * KIND_SLOTS + code
+SEARCH_KINDS = {
+    'service_request': 1,
+    'support_ticket': 2,
+    'document': 3,
+}
+KIND_SLOTS = 4
+
+
+def student_token(student_id):
+    """Indexed FTS5 token naming the student a document belongs to"""
+    return f'sid_{student_id}'
+
+ARABIC_FOLDING = str.maketrans({
+    'ة': 'ه',  # taa marbuta -> haa
+    'ى': 'ي',  # alef maqsura -> yaa
+    'ٱ': 'ا',  # alef wasla -> alef
+    'ی': 'ي',  # farsi yeh -> yaa
+    'ک': 'ك',  # keheh -> kaf
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+    **{chr(0x06f0 + digit): str(digit) for digit in range(10)},
+})
+
+
+# Definite article prefixes dropped from words long enough to carry one
+ARTICLE_PREFIXES = ('وال', 'ال')
+MIN_STEM_LENGTH = 3
+
+
+def _strip_article(word):
+    for prefix in ARTICLE_PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= MIN_STEM_LENGTH:
+            return word[len(prefix):]
+    return word
+
+
+def normalize_arabic_text(value):
+    """normalize_search_text plus folding of Arabic letter variants and the definite article
+
+    NFKD already splits hamza and madda off alef, waw and yaa, and the marks
+    are dropped with the other harakat.
+    """
+    text = normalize_search_text(value).translate(ARABIC_FOLDING)
+    return ' '.join(_strip_article(word) for word in text.split())
+
+
+def search_terms(query):
+    """Normalized word terms of a query"""
+    return re.findall(r'\w+', normalize_arabic_text(query))
+
+
+def build_search_document(instance):
+    """Text indexed for a searchable model instance"""
+    return normalize_arabic_text(' '.join(part or '' for part in instance.search_text_parts()))
+
+
+def _fts_rowid(kind, object_id):
+    return object_id * KIND_SLOTS + SEARCH_KINDS[kind]
+
+
+def index_objects(kind, objects, using='default'):
+    """Mirror search documents of one kind into the FTS5 table on SQLite"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not objects:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_FTS_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(objects))})',
+            [_fts_rowid(kind, obj.pk) for obj in objects]
+        )
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_FTS_TABLE}(rowid, search_document, student_key, kind, object_id) '
+            f'VALUES (%s, %s, %s, %s, %s)',
+            [
+                (_fts_rowid(kind, obj.pk), obj.search_document, student_token(obj.student_id), kind, obj.pk)
+                for obj in objects
+            ]
+        )
+
+
+def unindex_object(kind, object_id, using='default'):
+    """Remove one object from the FTS5 table on SQLite"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_FTS_TABLE} WHERE rowid = %s', [_fts_rowid(kind, object_id)])
+
+
+def clear_search_index(using='default'):
+    """Drop every row from the FTS5 table on SQLite"""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_FTS_TABLE}')
+
+
+def rebuild_search_index(queryset, batch_size=2000):
+    """Recompute search documents for a queryset of one searchable model and reindex them
+
+    Returns the number of rows processed.
+    """
+    model = queryset.model
+    processed = 0
+    batch = []
+    for obj in queryset.select_related(*model.SEARCH_RELATED).iterator(chunk_size=batch_size):
+        obj.search_document = build_search_document(obj)
+        batch.append(obj)
+        if len(batch) >= batch_size:
+            model.objects.bulk_update(batch, ['search_document'])
+            index_objects(model.SEARCH_KIND, batch, using=queryset.db)
+            processed += len(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, ['search_document'])
+        index_objects(model.SEARCH_KIND, batch, using=queryset.db)
+        processed += len(batch)
+    return processed
+
+
+def _fts_match_expression(terms, student_id=None):
+    """Every term must match the document text, each as a prefix, optionally for one student"""
+    expression = 'search_document : ({})'.format(' '.join('"{}"*'.format(term) for term in terms))
+    if student_id is not None:
+        expression = f'student_key : "{student_token(student_id)}" AND {expression}'
+    return expression
+
+
+def _tsquery_expression(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def filter_search(queryset, query):
+    """Restrict a queryset of a searchable model to rows matching every query term
+
+    The queryset keeps its own ordering, so list views can sort as before.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+
+    model = queryset.model
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT object_id FROM {SEARCH_FTS_TABLE} WHERE {SEARCH_FTS_TABLE} MATCH %s AND kind = %s',
+            [_fts_match_expression(terms), model.SEARCH_KIND]
+        ))
+    if vendor == 'postgresql':
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT id FROM {model._meta.db_table} "
+            f"WHERE to_tsvector('simple', search_document) @@ to_tsquery('simple', %s)",
+            [_tsquery_expression(terms)]
+        ))
+
+    condition = Q()
+    for term in terms:
+        condition &= Q(search_document__contains=term)
+    return queryset.filter(condition)
+
+
+def search_student_records(student, query, models, limit=20):
+    """Best matches across several searchable models for one student
+
+    Returns (model, object id, rank) tuples, highest rank first. Rows are
+    fetched by the caller, still filtered by student.
+    """
+    terms = search_terms(query)
+    if not terms or not models:
+        return []
+
+    vendor = connections['default'].vendor
+    if vendor == 'sqlite':
+        by_kind = {model.SEARCH_KIND: model for model in models}
+        with connections['default'].cursor() as cursor:
+            # bm25() is lower for better matches, so negate it for a descending rank;
+            # the student token carries no weight
+            cursor.execute(
+                f'SELECT kind, object_id, -bm25({SEARCH_FTS_TABLE}, 1.0, 0.0) AS score FROM {SEARCH_FTS_TABLE} '
+                f'WHERE {SEARCH_FTS_TABLE} MATCH %s '
+                f'AND kind IN ({", ".join(["%s"] * len(by_kind))}) '
+                f'ORDER BY score DESC LIMIT %s',
+                [_fts_match_expression(terms, student.pk), *by_kind, limit]
+            )
+            return [(by_kind[kind], object_id, rank) for kind, object_id, rank in cursor.fetchall()]
+
+    results = []
+    for model in models:
+        matches = filter_search(model.objects.filter(student=student), query)
+        if vendor == 'postgresql':
+            matches = matches.annotate(search_rank=RawSQL(
+                "ts_rank(to_tsvector('simple', search_document), to_tsquery('simple', %s))",
+                [_tsquery_expression(terms)]
+            )).order_by('-search_rank')
+            rows = matches.values_list('pk', 'search_rank')[:limit]
+        else:
+            rows = [(pk, 0.0) for pk in matches.order_by('-pk').values_list('pk', flat=True)[:limit]]
+        results.extend((model, pk, rank) for pk, rank in rows)
+    results.sort(key=lambda result: result[2], reverse=True)
+    return results[:limit]
@@ -23,10 +23,7 @@ class RequestDocumentSerializer(serializers.ModelSerializer):
         fields = ['id', 'document_name', 'uploaded_at', 'file_size', 'file_url']
     
     def get_file_size(self, obj):
-        try:
-            return obj.document.size
-        except:
-            return 0
+        return obj.file_size
     
     def get_file_url(self, obj):
         request = self.context.get('request')
@@ -119,28 +116,17 @@ class StudentDocumentSerializer(serializers.ModelSerializer):
             'id', 'document_type', 'document_type_display', 'title',
             'issued_date', 'issued_date_formatted', 'issued_by_name', 'is_official', 
             'download_count', 'file_size', 'file_size_formatted', 'download_url', 
-            'preview_url', 'file_extension', 'is_downloadable', 'status_badge'
+            'preview_url', 'file_extension', 'content_type', 'sha256', 'is_downloadable', 'status_badge'
         ]
     
+    # Size, extension and availability come from columns filled at upload time
     def get_file_size(self, obj):
-        try:
-            return obj.document_file.size if obj.document_file else 0
-        except:
-            return 0
+        return obj.file_size
     
     def get_file_size_formatted(self, obj):
-        try:
-            if not obj.document_file:
-                return "N/A"
-            size = obj.document_file.size
-            if size < 1024:
-                return f"{size} B"
-            elif size < 1024 * 1024:
-                return f"{size / 1024:.1f} KB"
-            else:
-                return f"{size / (1024 * 1024):.1f} MB"
-        except:
+        if not obj.file_exists:
             return "N/A"
+        return obj.file_size_display
     
     def get_download_url(self, obj):
         request = self.context.get('request')
@@ -166,16 +152,10 @@ class StudentDocumentSerializer(serializers.ModelSerializer):
         return None
     
     def get_file_extension(self, obj):
-        try:
-            if obj.document_file and obj.document_file.name:
-                import os
-                return os.path.splitext(obj.document_file.name)[1].lower()
-        except:
-            pass
-        return None
+        return obj.file_extension or None
     
     def get_is_downloadable(self, obj):
-        return bool(obj.document_file)
+        return obj.file_exists
     
     def get_status_badge(self, obj):
         if obj.is_official:
@@ -28,4 +28,7 @@ urlpatterns = [
     path('support-tickets/<int:ticket_id>/', views.support_ticket_detail, name='support_ticket_detail'),
     path('support-tickets/<int:ticket_id>/respond/', views.add_ticket_response, name='add_ticket_response'),
     path('ticket-categories/', views.ticket_categories, name='ticket_categories'),
+    
+    # Search
+    path('search/', views.unified_search, name='unified_search'),
 ]
\ No newline at end of file
@@ -4,11 +4,12 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from django.shortcuts import get_object_or_404
-from django.db.models import Q, Count
+from django.db.models import Count
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from datetime import timedelta
 import logging
+import os
 
 from ..models import ServiceRequest, StudentDocument, SupportTicket, TicketResponse
 from .serializers import (
@@ -20,7 +21,11 @@ from .permissions import (
     IsStudentUser, CanModifyServiceRequest, CanCancelServiceRequest, 
     CanRespondToTicket, CanAccessDocument, validate_student_access, validate_object_ownership
 )
-from .exceptions import ServiceRequestException, DocumentException, SupportTicketException
+from .exceptions import (
+    StudentPortalAPIException, ServiceRequestException, DocumentException, SupportTicketException
+)
+from ..downloads import document_file_response, starts_download
+from ..search import filter_search, search_student_records
 
 logger = logging.getLogger(__name__)
 
@@ -64,9 +69,7 @@ def service_requests(request):
             if search:
                 if len(search.strip()) < 2:
                     raise ServiceRequestException("يجب أن يكون استعلام البحث مكوناً من حرفين على الأقل")
-                requests = requests.filter(
-                    Q(title__icontains=search) | Q(description__icontains=search)
-                )
+                requests = filter_search(requests, search)
             
             # Paginate results
             paginator = StandardResultsSetPagination()
@@ -264,58 +267,31 @@ def student_documents(request):
     try:
         validate_student_access(request.user)
         
-        # DEBUG: Log user information
-        logger.info(f"[DEBUG] student_documents called for user: {request.user.id} ({request.user.username})")
-        
-        documents = StudentDocument.objects.filter(student=request.user)
-        
-        # DEBUG: Log initial document count
-        initial_count = documents.count()
-        logger.info(f"[DEBUG] Initial documents count for user {request.user.id}: {initial_count}")
-        
-        # DEBUG: Log all documents for this user
-        if initial_count > 0:
-            for doc in documents:
-                logger.info(f"[DEBUG] Document: ID={doc.id}, Type={doc.document_type}, Title={doc.title}, Official={doc.is_official}")
-        else:
-            logger.warning(f"[DEBUG] No documents found for user {request.user.id}")
-            # Check if any documents exist in the system
-            total_docs = StudentDocument.objects.count()
-            logger.info(f"[DEBUG] Total documents in system: {total_docs}")
+        # issued_by is serialized for every row, so it is joined rather than loaded per document
+        documents = StudentDocument.objects.filter(student=request.user).select_related('issued_by')
         
         # Apply filters with validation
         document_type_filter = request.GET.get('document_type')
-        logger.info(f"[DEBUG] document_type_filter: {document_type_filter}")
-        
         if document_type_filter:
             valid_types = [choice[0] for choice in StudentDocument.DOCUMENT_TYPES]
-            logger.info(f"[DEBUG] Valid document types: {valid_types}")
             if document_type_filter not in valid_types:
-                logger.error(f"[DEBUG] Invalid document type filter: {document_type_filter}")
                 raise DocumentException(f"فلتر نوع المستند غير صحيح: {document_type_filter}")
             documents = documents.filter(document_type=document_type_filter)
-            filtered_count = documents.count()
-            logger.info(f"[DEBUG] Documents after type filter '{document_type_filter}': {filtered_count}")
         
         is_official_filter = request.GET.get('is_official')
-        logger.info(f"[DEBUG] is_official_filter: {is_official_filter}")
         if is_official_filter is not None:
             documents = documents.filter(is_official=is_official_filter.lower() == 'true')
-            logger.info(f"[DEBUG] Documents after is_official filter: {documents.count()}")
         
         # Date range filtering
         date_from = request.GET.get('date_from')
         date_to = request.GET.get('date_to')
-        logger.info(f"[DEBUG] Date filters - from: {date_from}, to: {date_to}")
         
         if date_from:
             try:
                 from datetime import datetime
                 date_from_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
                 documents = documents.filter(issued_date__gte=date_from_obj)
-                logger.info(f"[DEBUG] Documents after date_from filter: {documents.count()}")
             except ValueError:
-                logger.error(f"[DEBUG] Invalid date_from format: {date_from}")
                 raise DocumentException("تنسيق تاريخ البداية غير صحيح. استخدم YYYY-MM-DD")
         
         if date_to:
@@ -323,45 +299,29 @@ def student_documents(request):
                 from datetime import datetime
                 date_to_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
                 documents = documents.filter(issued_date__lte=date_to_obj)
-                logger.info(f"[DEBUG] Documents after date_to filter: {documents.count()}")
             except ValueError:
-                logger.error(f"[DEBUG] Invalid date_to format: {date_to}")
                 raise DocumentException("تنسيق تاريخ النهاية غير صحيح. استخدم YYYY-MM-DD")
         
         # Search functionality
         search = request.GET.get('search')
-        logger.info(f"[DEBUG] Search query: {search}")
         if search:
             if len(search.strip()) < 2:
-                logger.error(f"[DEBUG] Search query too short: '{search}'")
                 raise DocumentException("يجب أن يكون استعلام البحث مكوناً من حرفين على الأقل")
-            from django.db.models import Q
-            documents = documents.filter(
-                Q(title__icontains=search) | 
-                Q(document_type__icontains=search)
-            )
-            logger.info(f"[DEBUG] Documents after search filter: {documents.count()}")
+            documents = filter_search(documents, search)
         
         # Sorting options
         sort_by = request.GET.get('sort_by', 'issued_date')
         sort_order = request.GET.get('sort_order', 'desc')
-        logger.info(f"[DEBUG] Sorting - by: {sort_by}, order: {sort_order}")
         
         valid_sort_fields = ['issued_date', 'title', 'document_type', 'download_count']
         if sort_by not in valid_sort_fields:
-            logger.error(f"[DEBUG] Invalid sort field: {sort_by}")
             raise DocumentException(f"حقل الترتيب غير صحيح. الخيارات الصحيحة: {', '.join(valid_sort_fields)}")
         
         if sort_order not in ['asc', 'desc']:
-            logger.error(f"[DEBUG] Invalid sort order: {sort_order}")
             raise DocumentException("ترتيب الفرز غير صحيح. استخدم 'asc' أو 'desc'")
         
         sort_field = sort_by if sort_order == 'asc' else f'-{sort_by}'
-        documents = documents.order_by(sort_field)
-        
-        # DEBUG: Final document count before pagination
-        final_count = documents.count()
-        logger.info(f"[DEBUG] Final documents count after all filters and sorting: {final_count}")
+        documents = documents.order_by(sort_field, '-id')
         
         # Paginate results
         paginator = StandardResultsSetPagination()
@@ -382,14 +342,13 @@ def student_documents(request):
                     'sort_order': sort_order
                 }
             }
-            logger.info(f"[DEBUG] Returning paginated response with {len(serializer.data)} documents")
             return paginator.get_paginated_response(response_data)
         
         serializer = StudentDocumentSerializer(documents, many=True, context={'request': request})
         response_data = {
             'success': True,
             'data': serializer.data,
-            'count': documents.count(),
+            'count': len(serializer.data),
             'filters': {
                 'document_type': document_type_filter,
                 'is_official': is_official_filter,
@@ -400,11 +359,9 @@ def student_documents(request):
                 'sort_order': sort_order
             }
         }
-        logger.info(f"[DEBUG] Returning non-paginated response with {len(serializer.data)} documents")
         return Response(response_data)
     
     except DocumentException as e:
-        logger.error(f"[DEBUG] DocumentException in student_documents: {e.message} (code: {e.code})")
         return Response({
             'success': False,
             'error': {
@@ -414,10 +371,7 @@ def student_documents(request):
             }
         }, status=e.code)
     except Exception as e:
-        logger.error(f"[DEBUG] Unexpected error in student_documents: {str(e)}")
-        logger.error(f"[DEBUG] Exception type: {type(e).__name__}")
-        import traceback
-        logger.error(f"[DEBUG] Traceback: {traceback.format_exc()}")
+        logger.exception(f"Unexpected error in student_documents: {str(e)}")
         return Response({
             'success': False,
             'error': {
@@ -499,32 +453,21 @@ def document_download(request, document_id):
                 }
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # Increment download count
-        document.download_count += 1
-        document.save()
-        
-        from django.http import HttpResponse, Http404
-        import os
-        import mimetypes
-        
         try:
-            file_path = document.document_file.path
-            if not os.path.exists(file_path):
-                raise Http404("ملف المستند غير موجود على الخادم")
-            
-            # Get file info
-            file_size = os.path.getsize(file_path)
-            content_type, _ = mimetypes.guess_type(file_path)
-            if not content_type:
-                content_type = 'application/octet-stream'
-            
-            # Create response with file
-            with open(file_path, 'rb') as file:
-                response = HttpResponse(file.read(), content_type=content_type)
-                response['Content-Disposition'] = f'attachment; filename="{document.title}"'
-                response['Content-Length'] = file_size
-                return response
-                
+            extension = os.path.splitext(document.document_file.name)[1]
+            filename = document.title if document.title.endswith(extension) else f"{document.title}{extension}"
+            # Streamed in chunks with Range support, or handed to the front proxy
+            response = document_file_response(request, document.document_file, filename)
+        except FileNotFoundError:
+            StudentDocument.objects.filter(pk=document.pk).update(file_exists=False)
+            return Response({
+                'success': False,
+                'error': {
+                    'code': status.HTTP_404_NOT_FOUND,
+                    'message': 'ملف المستند غير موجود على الخادم',
+                    'details': {}
+                }
+            }, status=status.HTTP_404_NOT_FOUND)
         except Exception as file_error:
             logger.error(f"File access error: {str(file_error)}")
             return Response({
@@ -535,6 +478,11 @@ def document_download(request, document_id):
                     'details': {}
                 }
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        # Resumed ranges and 304 revalidations are not counted as new downloads
+        if starts_download(response):
+            document.increment_download_count()
+        return response
     
     except StudentDocument.DoesNotExist:
         return Response({
@@ -566,16 +514,12 @@ def document_types(request):
     try:
         validate_student_access(request.user)
         
-        logger.info(f"[DEBUG] document_types called for user: {request.user.id} ({request.user.username})")
-        
         # Get document type choices from model
         types = [{
             'value': choice[0],
             'label': choice[1]
         } for choice in StudentDocument.DOCUMENT_TYPES]
         
-        logger.info(f"[DEBUG] Returning {len(types)} document types: {[t['value'] for t in types]}")
-        
         return Response({
             'success': True,
             'data': types
@@ -602,30 +546,17 @@ def document_statistics(request):
     try:
         validate_student_access(request.user)
         
-        logger.info(f"[DEBUG] document_statistics called for user: {request.user.id} ({request.user.username})")
-        
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        documents = StudentDocument.objects.filter(student=request.user)
-        
-        # Calculate statistics
-        total_documents = documents.count()
-        official_documents = documents.filter(is_official=True).count()
-        total_downloads = sum(doc.download_count for doc in documents)
-        
-        logger.info(f"[DEBUG] Statistics - Total: {total_documents}, Official: {official_documents}, Downloads: {total_downloads}")
-        
-        # Recent documents (last 30 days)
-        thirty_days_ago = timezone.now().date() - timedelta(days=30)
-        recent_documents = documents.filter(issued_date__gte=thirty_days_ago).count()
-        
-        logger.info(f"[DEBUG] Recent documents (last 30 days): {recent_documents}")
+        # Counts, downloads and the per-type breakdown in one aggregate query
+        thirty_days_ago = timezone.now() - timedelta(days=30)
+        stats = StudentDocument.statistics_for(request.user, thirty_days_ago)
+        total_documents = stats['total_documents']
+        official_documents = stats['official_documents']
+        total_downloads = stats['total_downloads']
+        recent_documents = stats['recent_documents']
         
-        # Documents by type
         documents_by_type = {}
         for doc_type, doc_type_display in StudentDocument.DOCUMENT_TYPES:
-            count = documents.filter(document_type=doc_type).count()
+            count = stats[f'type_{doc_type}']
             if count > 0:
                 documents_by_type[doc_type] = {
                     'label': doc_type_display,
@@ -633,7 +564,9 @@ def document_statistics(request):
                 }
         
         # Most downloaded documents (top 5)
-        most_downloaded = documents.order_by('-download_count')[:5]
+        most_downloaded = StudentDocument.objects.filter(
+            student=request.user
+        ).only('id', 'title', 'document_type', 'download_count').order_by('-download_count')[:5]
         most_downloaded_data = [{
             'id': doc.id,
             'title': doc.title,
@@ -641,9 +574,6 @@ def document_statistics(request):
             'download_count': doc.download_count
         } for doc in most_downloaded]
         
-        logger.info(f"[DEBUG] Documents by type: {documents_by_type}")
-        logger.info(f"[DEBUG] Most downloaded count: {len(most_downloaded_data)}")
-        
         return Response({
             'success': True,
             'data': {
@@ -682,13 +612,9 @@ def document_status_tracking(request):
         # Calculate status information
         status_data = []
         for document in documents:
+            # Availability comes from the metadata stored at upload, not a stat per document
             file_exists = bool(document.document_file)
-            try:
-                file_accessible = file_exists and document.document_file.path
-                import os
-                file_accessible = file_accessible and os.path.exists(document.document_file.path)
-            except:
-                file_accessible = False
+            file_accessible = document.file_exists
             
             status_info = {
                 'id': document.id,
@@ -706,16 +632,11 @@ def document_status_tracking(request):
                 },
                 'file_info': {
                     'has_file': file_exists,
-                    'file_size': document.document_file.size if file_exists else 0,
-                    'file_extension': None
+                    'file_size': document.file_size,
+                    'file_extension': document.file_extension or None
                 }
             }
             
-            # Get file extension
-            if file_exists and document.document_file.name:
-                import os
-                status_info['file_info']['file_extension'] = os.path.splitext(document.document_file.name)[1].lower()
-            
             status_data.append(status_info)
         
         # Summary statistics
@@ -772,13 +693,7 @@ def document_advanced_search(request):
         if query:
             if len(query) < 2:
                 raise DocumentException("Search query must be at least 2 characters long")
-            from django.db.models import Q
-            documents = documents.filter(
-                Q(title__icontains=query) | 
-                Q(document_type__icontains=query) |
-                Q(issued_by__first_name__icontains=query) |
-                Q(issued_by__last_name__icontains=query)
-            )
+            documents = filter_search(documents, query)
         
         if document_type:
             valid_types = [choice[0] for choice in StudentDocument.DOCUMENT_TYPES]
@@ -1091,9 +1006,7 @@ def support_tickets(request):
             if search:
                 if len(search.strip()) < 2:
                     raise SupportTicketException("يجب أن يكون استعلام البحث مكوناً من حرفين على الأقل")
-                tickets = tickets.filter(
-                    Q(subject__icontains=search) | Q(description__icontains=search)
-                )
+                tickets = filter_search(tickets, search)
             
             # Paginate results
             paginator = StandardResultsSetPagination()
@@ -1288,6 +1201,114 @@ def ticket_categories(request):
     return Response({'categories': categories})
 
 
+# Unified Search API View
+SEARCH_RESULT_TYPES = {
+    'service_request': ServiceRequest,
+    'support_ticket': SupportTicket,
+    'document': StudentDocument,
+}
+
+
+def _search_result(kind, obj, rank, request):
+    """Common shape for one mixed search result"""
+    from django.urls import reverse
+    
+    if kind == 'service_request':
+        title, subtitle, status_value, date = obj.title, obj.get_request_type_display(), obj.status, obj.created_at
+        url = reverse('student_api:service_request_detail', kwargs={'request_id': obj.id})
+    elif kind == 'support_ticket':
+        title, subtitle, status_value, date = obj.subject, obj.get_category_display(), obj.status, obj.created_at
+        url = reverse('student_api:support_ticket_detail', kwargs={'ticket_id': obj.id})
+    else:
+        title, subtitle, status_value, date = obj.title, obj.get_document_type_display(), None, obj.issued_date
+        url = reverse('student_api:document_detail', kwargs={'document_id': obj.id})
+    return {
+        'type': kind,
+        'id': obj.id,
+        'title': title,
+        'subtitle': subtitle,
+        'status': status_value,
+        'date': date,
+        'url': request.build_absolute_uri(url),
+        'rank': round(rank, 4),
+    }
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated, IsStudentUser])
+def unified_search(request):
+    """
+    Ranked search across the student's service requests, support tickets and documents
+    """
+    try:
+        validate_student_access(request.user)
+        
+        query = request.GET.get('q', '').strip()
+        if len(query) < 2:
+            raise StudentPortalAPIException("يجب أن يكون استعلام البحث مكوناً من حرفين على الأقل")
+        
+        types = request.GET.get('types')
+        kinds = types.split(',') if types else list(SEARCH_RESULT_TYPES)
+        invalid_kinds = [kind for kind in kinds if kind not in SEARCH_RESULT_TYPES]
+        if invalid_kinds:
+            raise StudentPortalAPIException(
+                f"نوع البحث غير صحيح. الخيارات الصحيحة: {', '.join(SEARCH_RESULT_TYPES)}"
+            )
+        
+        try:
+            limit = min(max(int(request.GET.get('limit', 20)), 1), 50)
+        except ValueError:
+            raise StudentPortalAPIException("قيمة الحد الأقصى للنتائج غير صحيحة")
+        
+        matches = search_student_records(
+            request.user, query, [SEARCH_RESULT_TYPES[kind] for kind in kinds], limit=limit
+        )
+        
+        # One query per kind that matched, still scoped to the student
+        ids_by_model = {}
+        for model, object_id, rank in matches:
+            ids_by_model.setdefault(model, []).append(object_id)
+        objects = {}
+        for model, ids in ids_by_model.items():
+            for obj in model.objects.filter(student=request.user, pk__in=ids):
+                objects[(model, obj.pk)] = obj
+        
+        results = [
+            _search_result(model.SEARCH_KIND, objects[(model, object_id)], rank, request)
+            for model, object_id, rank in matches
+            if (model, object_id) in objects
+        ]
+        return Response({
+            'success': True,
+            'data': {
+                'query': query,
+                'types': kinds,
+                'results': results,
+                'count': len(results)
+            }
+        })
+    
+    except StudentPortalAPIException as e:
+        return Response({
+            'success': False,
+            'error': {
+                'code': e.code,
+                'message': e.message,
+                'details': e.details
+            }
+        }, status=e.code)
+    except Exception as e:
+        logger.error(f"Error in unified_search: {str(e)}")
+        return Response({
+            'success': False,
+            'error': {
+                'code': status.HTTP_500_INTERNAL_SERVER_ERROR,
+                'message': 'حدث خطأ غير متوقع',
+                'details': {}
+            }
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 # Dashboard API View
 @api_view(['GET'])
 @permission_classes([IsAuthenticated, IsStudentUser])
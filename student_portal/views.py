@@ -2,7 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse, Http404
+from django.http import JsonResponse, Http404
 from django.views.decorators.http import require_http_methods
 from django.views import View
 from django.core.paginator import Paginator
@@ -10,6 +10,7 @@ from django.utils import timezone
 from django.db.models import Q
 from .models import ServiceRequest, StudentDocument, SupportTicket, RequestDocument
 from .forms import ServiceRequestForm, SupportTicketForm
+from .downloads import document_file_response, starts_download
 import json
 
 
@@ -178,19 +179,16 @@ def download_document(request, document_id):
         student=request.user
     )
     
-    # Increment download count
-    document.increment_download_count()
+    try:
+        # Streamed in chunks with Range support, or handed to the front proxy
+        response = document_file_response(request, document.document_file)
+    except FileNotFoundError:
+        StudentDocument.objects.filter(pk=document.pk).update(file_exists=False)
+        raise Http404('ملف المستند غير موجود')
     
-    # Get the original filename with extension
-    import os
-    original_filename = os.path.basename(document.document_file.name)
-    
-    # Return file response
-    response = HttpResponse(
-        document.document_file.read(), 
-        content_type='application/octet-stream'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{original_filename}"'
+    # Resumed ranges and 304 revalidations are not counted as new downloads
+    if starts_download(response):
+        document.increment_download_count()
     
     return response
 
@@ -0,0 +1,63 @@
+"""
+Opt-in per-request query diagnostics.
+
+With QUERY_DIAGNOSTICS = True every request logs how many SQL queries it ran,
+their total time and any statement executed repeatedly with different
+parameters, which usually points at a query inside a loop. Only the count and
+timing are kept for each query, so this is cheap enough to switch on in
+staging. When the setting is off the middleware removes itself at startup.
+"""
+import logging
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# A statement run at least this many times in one request is reported
+REPEATED_QUERY_THRESHOLD = 3
+
+
+class QueryRecorder:
+    """Database execute wrapper that counts and times every query"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def repeated(self):
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= REPEATED_QUERY_THRESHOLD]
+
+
+class QueryDiagnosticsMiddleware:
+    """Log the queries each request ran when QUERY_DIAGNOSTICS is enabled"""
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_DIAGNOSTICS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        logger.info(
+            f"{request.method} {request.path}: {recorder.count} queries "
+            f"in {recorder.duration * 1000:.1f} ms"
+        )
+        for sql, n in recorder.repeated():
+            logger.warning(f"{request.method} {request.path}: query ran {n} times: {sql[:300]}")
+        return response
@@ -62,6 +62,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'univ_services.query_diagnostics.QueryDiagnosticsMiddleware',
 ]
 
 ROOT_URLCONF = 'univ_services.urls'
@@ -153,6 +154,21 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Student document downloads: None streams the file from Django,
+# 'x-accel-redirect' hands it to nginx through DOCUMENT_DOWNLOAD_ACCEL_PREFIX
+# (an internal location aliased to MEDIA_ROOT), 'x-sendfile' to Apache/lighttpd
+DOCUMENT_DOWNLOAD_OFFLOAD = None
+DOCUMENT_DOWNLOAD_ACCEL_PREFIX = '/protected-media/'
+
+# Download and view counters are buffered in process and written every
+# COUNTER_FLUSH_INTERVAL seconds; COUNTERS_EXACT writes each increment at once
+COUNTER_FLUSH_INTERVAL = 10
+COUNTERS_EXACT = False
+
+# Log the number and time of SQL queries for every request, and statements
+# repeated within one request; off by default
+QUERY_DIAGNOSTICS = False
+
 # Celery Configuration
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'